@@ -0,0 +1,51 @@
+"""Image.set() による画像圧縮のスループットのベンチマーク
+
+1080pのBGR画像について、
+ImageFrame.encode() を呼び出したスレッドで圧縮した場合と、
+Image.set(compress_mode=...) でスレッドプールに圧縮させた場合の fps を比較する。
+opencv-python (cv2) またはPillowが必要。
+
+    python test/bench_image_encode.py [フレーム数] [field数]
+"""
+
+import sys
+import time
+import numpy
+import webcface.client
+from webcface.image_frame import ImageFrame, ImageColorMode, ImageCompressMode
+
+
+def main(frames: int = 40, fields: int = 4) -> None:
+    rng = numpy.random.default_rng(0)
+    # ランダムノイズは圧縮しにくすぎるので、なめらかな画像にノイズを少し足す
+    y, x = numpy.mgrid[0:1080, 0:1920]
+    base = numpy.stack([x % 256, y % 256, (x + y) % 256], axis=2).astype(numpy.uint8)
+    img = base + rng.integers(0, 8, base.shape, dtype=numpy.uint8)
+    frame = ImageFrame.from_numpy(img, ImageColorMode.BGR)
+
+    for mode in (ImageCompressMode.JPEG, ImageCompressMode.PNG):
+        n = max(frames // 10, 1) if mode == ImageCompressMode.PNG else frames
+        t = time.perf_counter()
+        for _ in range(n):
+            size = len(frame.encode(mode).buffer)
+        sync_fps = n / (time.perf_counter() - t)
+
+        wcli = webcface.client.Client("bench", auto_reconnect=False)
+        data = wcli._data_check()
+        images = [wcli.image(f"img{i}") for i in range(fields)]
+        t = time.perf_counter()
+        for k in range(n):
+            # 同じfieldに連続でsetすると古いほうは破棄されるので、複数のfieldに分ける
+            images[k % fields].set(frame, compress_mode=mode)
+        set_time = time.perf_counter() - t
+        data.image_encode_pool.shutdown(wait=True)
+        pool_fps = n / (time.perf_counter() - t)
+
+        print(f"{mode.name} ({size / 1e6:.2f} MB/frame)")
+        print(f"  encode in caller  {sync_fps:6.1f} fps")
+        print(f"  Image.set + pool  {pool_fps:6.1f} fps ({fields} fields)")
+        print(f"  set() call        {set_time / n * 1000:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:3]])
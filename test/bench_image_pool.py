@@ -0,0 +1,73 @@
+"""ImageBufferPool による画像受信のベンチマーク
+
+1080pのBGR画像のImageResを受信し、受信するたびに画像を3回読んだときの時間と、
+受信1回あたりのメモリ使用量のピークの増加 (tracemalloc) を
+enable_buffer_pool() した場合としない場合、get() で読んだ場合と acquire() で読んだ場合で比較する。
+
+    python test/bench_image_pool.py [フレーム数]
+"""
+
+import sys
+import time
+import tracemalloc
+import webcface.client
+import webcface.client_impl
+import webcface.message
+from webcface.image_frame import ImageColorMode, ImageCompressMode
+
+
+def run(frames: int, pool: bool, acquire: bool) -> None:
+    wcli = webcface.client.Client("bench", auto_reconnect=False)
+    data = wcli._data_check()
+    img = wcli.member("a").image("b")
+    img.request()
+    if pool:
+        img.enable_buffer_pool()
+    w, h = 1920, 1080
+    msg = webcface.message.pack(
+        [
+            webcface.message.ImageRes.new(
+                1,
+                "",
+                b"\0" * (w * h * 3),
+                w,
+                h,
+                ImageColorMode.BGR,
+                ImageCompressMode.RAW,
+            )
+        ]
+    )
+    webcface.client_impl.on_recv(wcli, data, msg)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    t = time.perf_counter()
+    allocated = 0
+    for _ in range(frames):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        webcface.client_impl.on_recv(wcli, data, msg)
+        for _ in range(3):
+            if acquire:
+                img.acquire().release()
+            else:
+                img.get()
+        allocated += tracemalloc.get_traced_memory()[1] - before
+    elapsed = time.perf_counter() - t
+    tracemalloc.stop()
+
+    name = ("with pool" if pool else "without pool") + (
+        " + acquire()" if acquire else " + get()"
+    )
+    print(f"  {name:26s} {elapsed / frames * 1000:7.2f} ms/frame")
+    print(f"  {'':26s} {allocated / frames / 1e6:7.2f} MB peak increase/frame")
+
+
+def main(frames: int = 50) -> None:
+    print(f"1920x1080 BGR, {frames} frames")
+    for pool, acquire in ((False, False), (True, False), (True, True)):
+        run(frames, pool, acquire)
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:2]])
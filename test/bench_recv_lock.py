@@ -0,0 +1,92 @@
+"""受信データの読み出しとon_recvのロック競合のベンチマーク
+
+別スレッドがValueResとViewResのフレームを受信し続けている間に、
+複数のスレッドがValue.get(), View.get(), Member.value_entries() で読み続けたときの
+読み出し回数を測る。
+比較のため、読み出しのたびにstoreのロックを取った場合
+(ロックなしで読むようになる前の動作) も測る。
+
+    python test/bench_recv_lock.py [読み出しスレッド数] [valueの数]
+"""
+
+import sys
+import time
+import threading
+import webcface.client
+import webcface.client_impl
+import webcface.message
+import webcface.components
+
+
+def run(readers: int, n: int, locked: bool, duration: float = 2.0) -> float:
+    wcli = webcface.client.Client("bench", auto_reconnect=False)
+    data = wcli._data_check()
+    member = wcli.member("a")
+    values = [member.value(str(i)) for i in range(n)]
+    for v in values:
+        v.request()
+    view = member.view("v")
+    view.request()
+    components = {
+        str(i): webcface.components.text(str(i))
+        .lock_tmp(data, "", "", str(i))
+        .to_view()
+        for i in range(50)
+    }
+    frame = webcface.message.pack(
+        [webcface.message.SyncInit.new_full("a", 1, "", "", "")]
+        + [webcface.message.ValueEntry.new(1, str(i)) for i in range(n)]
+        + [webcface.message.ValueRes.new(i + 1, "", [float(i)]) for i in range(n)]
+        + [webcface.message.ViewRes.new(1, "", components, list(components))]
+    )
+    webcface.client_impl.on_recv(wcli, data, frame)
+    # 2回目以降はViewの差分だけを受信する
+    frame = webcface.message.pack(
+        [webcface.message.ValueRes.new(i + 1, "", [float(i)]) for i in range(n)]
+        + [webcface.message.ViewRes.new(1, "", {"0": components["0"]}, None)]
+    )
+    stop = threading.Event()
+    sweeps = [0] * readers
+
+    def writer():
+        while not stop.is_set():
+            webcface.client_impl.on_recv(wcli, data, frame)
+
+    def reader(k: int):
+        while not stop.is_set():
+            if locked:
+                for v in values:
+                    with data.value_store.lock:
+                        v.try_get()
+                with data.view_store.lock:
+                    view.try_get()
+                with data.value_store.lock:
+                    member.value_entries()
+            else:
+                for v in values:
+                    v.try_get()
+                view.try_get()
+                member.value_entries()
+            sweeps[k] += 1
+
+    threads = [threading.Thread(target=writer)] + [
+        threading.Thread(target=reader, args=(k,)) for k in range(readers)
+    ]
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    return sum(sweeps) / duration
+
+
+def main(readers: int = 4, n: int = 200) -> None:
+    print(f"{readers} reader threads, {n} values")
+    for locked in (True, False):
+        name = "read with lock" if locked else "read without lock"
+        print(f"  {name:20s} {run(readers, n, locked):8.0f} sweeps/s")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:3]])
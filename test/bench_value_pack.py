@@ -0,0 +1,45 @@
+"""Value/ValueRes メッセージの pack/unpack のベンチマーク
+
+関節角度のような長いfloatの配列を送受信するときの速度を、
+umsgpackで要素ごとにpack/unpackした場合と比較する。
+
+    python test/bench_value_pack.py [要素数]
+"""
+
+import sys
+import timeit
+import random
+import umsgpack
+import webcface.message
+
+
+def main(n: int = 5000, number: int = 200) -> None:
+    d = [random.random() for _ in range(n)]
+    send = [webcface.message.Value.new("joint_state", d)]
+    recv = webcface.message.pack([webcface.message.ValueRes.new(1, "joint_state", d)])
+
+    def pack_plain():
+        umsgpack.packb([m for s in send for m in (s.kind, s.msg)])
+
+    def pack():
+        webcface.message.pack(send)
+
+    def unpack_plain():
+        umsgpack.unpackb(recv)
+
+    def unpack():
+        webcface.message.unpack(recv)
+
+    print(f"{n} floats, mean of {number} runs")
+    for name, f in [
+        ("pack (umsgpack)", pack_plain),
+        ("pack", pack),
+        ("unpack (umsgpack)", unpack_plain),
+        ("unpack", unpack),
+    ]:
+        t = timeit.timeit(f, number=number) / number
+        print(f"  {name:20s} {t * 1000:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:2]])
@@ -126,3 +126,183 @@ def test_canvas2d_set(data):
 
     with pytest.raises(ValueError) as e:
         Canvas2D(Field(data, "a", "b")).sync()
+
+
+def test_canvas2d_move(data):
+    with Canvas2D(Field(data, self_name, "b"), "", 100, 100) as v:
+        v.add(geometries.line((0, 0), (3, 3)), color=ViewColor.RED)
+        v.add(geometries.rect((0, 0), (3, 3)))
+    c_prev = data.canvas2d_store.data_send.pop("b")
+    ids = c_prev.ids
+    Canvas2D(Field(data, self_name, "b")).move(ids[1], (10, 20))
+    c = data.canvas2d_store.data_send["b"]
+    assert c.components[ids[1]]._origin_pos == [10, 20]
+    assert c.components[ids[0]] is c_prev.components[ids[0]]
+    assert c.base is c_prev
+    assert c.dirty == {ids[1]}
+    # 送信前にもう一度変更した場合は差分をまとめる
+    Canvas2D(Field(data, self_name, "b")).move(ids[0], (1, 2))
+    c = data.canvas2d_store.data_send["b"]
+    assert c.base is c_prev
+    assert c.dirty == {ids[0], ids[1]}
+    assert c.components[ids[1]]._origin_pos == [10, 20]
+
+    # 元のCanvas2Dオブジェクトに要素を追加してsyncしても変更は元に戻らない
+    v.add(geometries.line((0, 0), (1, 1)))
+    v.sync()
+    c = data.canvas2d_store.data_send["b"]
+    assert c.components[ids[0]]._origin_pos == [1, 2]
+    assert c.components[ids[1]]._origin_pos == [10, 20]
+
+    with pytest.raises(ValueError):
+        Canvas2D(Field(data, self_name, "b")).move("x", (0, 0))
+
+
+def test_canvas2d_layer(data):
+    called = 0
+
+    def callback(v):
+        nonlocal called
+        called += 1
+
+    Canvas2D(Field(data, self_name, "b")).on_change(callback)
+    with pytest.raises(ValueError):
+        with Canvas2D(Field(data, self_name, "b")).layer("static") as l:
+            l.add(geometries.rect((0, 0), (3, 3)))
+
+    def robots(x):
+        with Canvas2D(Field(data, self_name, "b")).layer("robot") as l:
+            l.add(geometries.circle((x, 0), 1))
+
+    with Canvas2D(Field(data, self_name, "b"), "", 100, 100).layer("static") as l:
+        l.add(geometries.rect((0, 0), (3, 3)))
+        l.add(geometries.line((0, 0), (3, 3)))
+    robots(0)
+    assert called == 2
+    c_prev = data.canvas2d_store.data_send.pop("b")
+    assert (c_prev.width, c_prev.height) == (100, 100)
+    assert c_prev.layers == {
+        "static": ["..static..0.0", "..static..0.1"],
+        "robot": ["..robot..0.0"],
+    }
+    assert c_prev.ids == ["..static..0.0", "..static..0.1", "..robot..0.0"]
+
+    # 変化していないレイヤーは何もしない
+    with Canvas2D(Field(data, self_name, "b")).layer("static") as l:
+        l.add(geometries.rect((0, 0), (3, 3)))
+        l.add(geometries.line((0, 0), (3, 3)))
+    assert "b" not in data.canvas2d_store.data_send
+    assert called == 2
+
+    robots(5)
+    c = data.canvas2d_store.data_send["b"]
+    assert called == 3
+    assert c.ids == c_prev.ids
+    assert c.base is c_prev
+    assert c.dirty == {"..robot..0.0"}
+    assert c.components["..robot..0.0"]._geometry_properties[0] == 5
+    assert c.components["..static..0.0"] is c_prev.components["..static..0.0"]
+
+
+def test_canvas2d_layer_shrink(data):
+    with Canvas2D(Field(data, self_name, "b"), "", 100, 100).layer("a") as l:
+        l.add(geometries.rect((0, 0), (3, 3)))
+        l.add(geometries.line((0, 0), (3, 3)))
+        l.add(geometries.line((1, 1), (3, 3)))
+    with Canvas2D(Field(data, self_name, "b")).layer("b") as l:
+        l.add(geometries.rect((1, 1), (3, 3)))
+    # 送信前にレイヤーの要素を減らす
+    with Canvas2D(Field(data, self_name, "b")).layer("a") as l:
+        l.add(geometries.line((0, 0), (3, 3)))
+    c = data.canvas2d_store.data_send.pop("b")
+    assert c.ids == ["..a..0.0", "..b..0.0"]
+    assert set(c.components) == {"..a..0.0", "..b..0.0"}
+    assert c.components["..a..0.0"]._geometry_type == geometries.GeometryType.LINE
+
+    # 変更してから削除した要素は差分に含めない
+    with Canvas2D(Field(data, self_name, "b")).layer("a") as l:
+        l.add(geometries.line((1, 1), (3, 3)))
+    with Canvas2D(Field(data, self_name, "b")).layer("b") as l:
+        l.add(geometries.rect((2, 2), (3, 3)))
+    with Canvas2D(Field(data, self_name, "b")).layer("a") as l:
+        pass
+    c = data.canvas2d_store.data_send["b"]
+    assert c.ids == ["..b..0.0"]
+    assert set(c.components) == {"..b..0.0"}
+    assert c.dirty == {"..b..0.0"}
+
+
+def test_canvas2d_component_lazy(data):
+    import webcface.message
+    import webcface.temporal_component
+
+    c = (
+        webcface.temporal_component.TemporalComponent(
+            canvas2d_type=Canvas2DComponentType.GEOMETRY,
+            geometry=geometries.rect((1, 2), (3, 4)),
+            origin=(5, 6),
+            color=ViewColor.RED,
+        )
+        .lock_tmp(data, "", "", "0")
+        .to_canvas2d()
+    )
+    vd = webcface.message.c2b_to_c2d({"0": c})
+    lazy = webcface.message.c2d_to_c2b(vd)["0"]
+    # プロパティを参照するまで変換しない
+    assert "_type" not in lazy.__dict__
+    assert lazy._origin_pos == [5, 6]
+    assert lazy._color == ViewColor.RED
+    assert list(lazy._geometry_properties) == list(c._geometry_properties)
+    assert lazy == c
+    assert webcface.message.c2b_to_c2d({"0": lazy})["0"] is vd["0"]
+
+
+def test_canvas2d_polygon_array(data):
+    np = pytest.importorskip("numpy")
+    import array
+    import umsgpack
+    import webcface.message
+
+    pts = np.arange(8, dtype=np.float64).reshape(4, 2)
+    g = geometries.polygon(pts)
+    assert isinstance(g._properties, array.array)
+    assert g._properties.typecode == "f"
+    assert g.numpy().tolist() == [[0, 1, 0], [2, 3, 0], [4, 5, 0], [6, 7, 0]]
+    assert g.points[1].pos == (2, 3, 0)
+
+    c = Canvas2DComponentBase(geometry_type=g.type, geometry_properties=g._properties)
+    packed = webcface.message.pack(
+        [webcface.message.Canvas2DRes.new(1, "a", 10, 10, {"0": c}, None)]
+    )
+    assert umsgpack.unpackb(packed)[1]["d"]["0"]["gp"] == g.numpy().ravel().tolist()
+    m = webcface.message.unpack(packed)[0]
+    gp = m.data_diff["0"]._geometry_properties
+    assert isinstance(gp, array.array) and gp.typecode == "f"
+    assert gp == g._properties
+
+    # packしたときのキャッシュはarray.arrayのままコピーされ、元の配列と共有しない
+    cached = webcface.message.c2b_to_c2d({"0": c})["0"]["gp"]
+    assert isinstance(cached, array.array) and cached.typecode == "f"
+    g._properties[0] = 100
+    assert cached[0] == 0
+
+
+def test_canvas2d_polygon_array_shape():
+    np = pytest.importorskip("numpy")
+    for shape in [(6,), (2, 4), (2, 1), (1, 2, 3)]:
+        with pytest.raises(ValueError):
+            geometries.polygon(np.zeros(shape))
+    assert geometries.polygon(np.zeros((2, 3))).numpy().shape == (2, 3)
+
+
+def test_canvas2d_polygon_array_without_numpy(monkeypatch):
+    import array
+    import sys
+
+    monkeypatch.setitem(sys.modules, "numpy", None)
+    # 1次元のfloat32はnumpyなしでもそのまま保持する
+    g = geometries.polygon(array.array("f", [1, 2, 3, 4, 5, 6]))
+    assert isinstance(g._properties, array.array)
+    assert g.points[1].pos == (4, 5, 6)
+    # それ以外のバッファはリストとして扱う
+    assert geometries._to_float32_array(array.array("d", [1, 2, 3])) is None
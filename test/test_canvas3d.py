@@ -0,0 +1,106 @@
+from conftest import self_name
+import pytest
+from webcface.canvas3d import Canvas3D
+import webcface.geometries as geometries
+from webcface.field import Field
+from webcface.view_base import ViewColor
+
+
+def test_canvas3d_move(data):
+    with Canvas3D(Field(data, self_name, "b")) as v:
+        v.add(geometries.line((0, 0, 0), (3, 3, 3)), color=ViewColor.RED)
+        v.add(geometries.box((0, 0, 0), (3, 3, 3)))
+    c_prev = data.canvas3d_store.data_send.pop("b")
+    ids = c_prev.ids
+    Canvas3D(Field(data, self_name, "b")).move(ids[1], (10, 20, 30))
+    c = data.canvas3d_store.data_send["b"]
+    assert c.components[ids[1]]._origin_pos == [10, 20, 30]
+    assert c.components[ids[0]] is c_prev.components[ids[0]]
+    assert c.base is c_prev
+    assert c.dirty == {ids[1]}
+    # 送信前にもう一度変更した場合は差分をまとめる
+    Canvas3D(Field(data, self_name, "b")).move(ids[0], (1, 2, 3))
+    c = data.canvas3d_store.data_send["b"]
+    assert c.base is c_prev
+    assert c.dirty == {ids[0], ids[1]}
+    assert c.components[ids[1]]._origin_pos == [10, 20, 30]
+
+    # 元のCanvas3Dオブジェクトに要素を追加してsyncしても変更は元に戻らない
+    v.add(geometries.line((0, 0, 0), (1, 1, 1)))
+    v.sync()
+    c = data.canvas3d_store.data_send["b"]
+    assert c.components[ids[0]]._origin_pos == [1, 2, 3]
+    assert c.components[ids[1]]._origin_pos == [10, 20, 30]
+
+    with pytest.raises(ValueError):
+        Canvas3D(Field(data, self_name, "b")).move("x", (0, 0, 0))
+
+
+def test_canvas3d_layer(data):
+    called = 0
+
+    def callback(v):
+        nonlocal called
+        called += 1
+
+    Canvas3D(Field(data, self_name, "b")).on_change(callback)
+
+    def robots(x):
+        with Canvas3D(Field(data, self_name, "b")).layer("robot") as l:
+            l.add(geometries.sphere((x, 0, 0), 1))
+
+    with Canvas3D(Field(data, self_name, "b")).layer("static") as l:
+        l.add(geometries.box((0, 0, 0), (3, 3, 3)))
+        l.add(geometries.line((0, 0, 0), (3, 3, 3)))
+    robots(0)
+    assert called == 2
+    c_prev = data.canvas3d_store.data_send.pop("b")
+    assert c_prev.layers == {
+        "static": ["..static..0.0", "..static..0.1"],
+        "robot": ["..robot..0.0"],
+    }
+    assert c_prev.ids == ["..static..0.0", "..static..0.1", "..robot..0.0"]
+
+    # 変化していないレイヤーは何もしない
+    with Canvas3D(Field(data, self_name, "b")).layer("static") as l:
+        l.add(geometries.box((0, 0, 0), (3, 3, 3)))
+        l.add(geometries.line((0, 0, 0), (3, 3, 3)))
+    assert "b" not in data.canvas3d_store.data_send
+    assert called == 2
+
+    robots(5)
+    c = data.canvas3d_store.data_send["b"]
+    assert called == 3
+    assert c.ids == c_prev.ids
+    assert c.base is c_prev
+    assert c.dirty == {"..robot..0.0"}
+    assert c.components["..robot..0.0"]._geometry_properties[0] == 5
+    assert c.components["..static..0.0"] is c_prev.components["..static..0.0"]
+
+
+def test_canvas3d_layer_shrink(data):
+    with Canvas3D(Field(data, self_name, "b")).layer("a") as l:
+        l.add(geometries.box((0, 0, 0), (3, 3, 3)))
+        l.add(geometries.line((0, 0, 0), (3, 3, 3)))
+        l.add(geometries.line((1, 1, 1), (3, 3, 3)))
+    with Canvas3D(Field(data, self_name, "b")).layer("b") as l:
+        l.add(geometries.box((1, 1, 1), (3, 3, 3)))
+    # 送信前にレイヤーの要素を減らす
+    with Canvas3D(Field(data, self_name, "b")).layer("a") as l:
+        l.add(geometries.line((0, 0, 0), (3, 3, 3)))
+    c = data.canvas3d_store.data_send.pop("b")
+    assert c.ids == ["..a..0.0", "..b..0.0"]
+    assert set(c.components) == {"..a..0.0", "..b..0.0"}
+    assert c.components["..a..0.0"]._geometry_type == geometries.GeometryType.LINE
+
+    # 変更してから削除した要素は差分に含めない
+    with Canvas3D(Field(data, self_name, "b")).layer("a") as l:
+        l.add(geometries.line((1, 1, 1), (3, 3, 3)))
+    with Canvas3D(Field(data, self_name, "b")).layer("b") as l:
+        l.add(geometries.box((2, 2, 2), (3, 3, 3)))
+    with Canvas3D(Field(data, self_name, "b")).layer("a") as l:
+        pass
+    c = data.canvas3d_store.data_send["b"]
+    assert c.ids == ["..b..0.0"]
+    assert set(c.components) == {"..b..0.0"}
+    assert c.dirty == {"..b..0.0"}
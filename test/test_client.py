@@ -3,6 +3,9 @@ import time
 import os
 import pytest
 import toml
+import array
+import numpy as np
+import umsgpack
 from conftest import self_name, check_sent, clear_sent, send_back
 from webcface.message import *
 from webcface.field import Field
@@ -254,6 +257,19 @@ def test_value_send(wcli):
     assert m.data == [5]
 
 
+def test_value_send_array(wcli):
+    wcli.value("a").set(np.array([1.5, 2.5, 3.5]))
+    wcli.sync()
+    m = check_sent(wcli, Value)
+    assert isinstance(m, Value)
+    assert m.field == "a"
+    assert list(m.data) == [1.5, 2.5, 3.5]
+    assert umsgpack.unpackb(pack([m])) == [
+        Value.kind_def,
+        {"f": "a", "d": [1.5, 2.5, 3.5]},
+    ]
+
+
 def test_value_req(wcli):
     called = 0
 
@@ -271,8 +287,115 @@ def test_value_req(wcli):
 
     send_back(wcli, [ValueRes.new(1, "", [1, 2, 3]), ValueRes.new(1, "c", [1, 2, 3])])
     assert called == 1
-    assert wcli._data_check().value_store.get_recv("a", "b") == [1, 2, 3]
-    assert wcli._data_check().value_store.get_recv("a", "b.c") == [1, 2, 3]
+    assert list(wcli._data_check().value_store.get_recv("a", "b")) == [1, 2, 3]
+    assert list(wcli._data_check().value_store.get_recv("a", "b.c")) == [1, 2, 3]
+    assert wcli.member("a").value("b").get_vec() == [1, 2, 3]
+
+
+def test_value_req_large(wcli):
+    wcli._data_check()._msg_first = True
+    wcli.member("a").value("b").request()
+    data = [i * 0.5 for i in range(5000)]
+    send_back(wcli, [ValueRes.new(1, "", data)])
+    v = wcli._data_check().value_store.get_recv("a", "b")
+    assert isinstance(v, array.array)
+    assert v.tolist() == data
+    assert wcli.member("a").value("b").get_array()[4999] == 2499.5
+
+    data[10] = -1
+    send_back(wcli, [ValueRes.new(1, "", data)])
+    assert wcli.member("a").value("b").get_vec() == data
+
+
+def test_value_recv_order(wcli):
+    wcli._data_check()._msg_first = True
+    wcli.member("a").value("b").request()
+    wcli.member("a").text("t").request()
+    seen = []
+    wcli.member("a").text("t").on_change(
+        lambda t: seen.append(wcli.member("a").value("b").get())
+    )
+    # valueの変更は他のメッセージのコールバックより先に反映される
+    send_back(wcli, [TextRes.new(1, "", "x"), ValueRes.new(1, "", [5])])
+    assert seen == [5]
+    # SyncInitによる初期化とValueResは受信した順に反映される
+    send_back(wcli, [SyncInit.new("a", "", ""), ValueRes.new(1, "", [6])])
+    assert wcli.member("a").value("b").get() == 6
+    send_back(wcli, [ValueRes.new(1, "", [7]), SyncInit.new("a", "", "")])
+    assert wcli._data_check().value_store.get_recv("a", "b") is None
+
+
+def test_value_request_all(wcli):
+    wcli._data_check()._msg_first = True
+    send_back(wcli, [SyncInit.new_full("a", 10, "", "", "")])
+    send_back(wcli, [ValueEntry.new(10, "j.a"), ValueEntry.new(10, "k")])
+    wcli.member("a").child("j").request_all("value")
+    m = check_sent(wcli, ValueReq)
+    assert isinstance(m, ValueReq)
+    assert m.field == "j.a"
+    assert wcli._data_check().value_store.req["a"] == {"j.a": 1}
+
+    send_back(wcli, [ValueEntry.new(10, "j.b.c"), ValueEntry.new(10, "l")])
+    assert wcli._data_check().value_store.req["a"] == {"j.a": 1, "j.b.c": 2}
+    send_back(wcli, [ValueRes.new(2, "", [5])])
+    assert wcli.member("a").value("j.b.c").get() == 5
+
+    with pytest.raises(ValueError):
+        wcli.member("a").request_all("func")
+
+
+def test_value_unrequest(wcli):
+    wcli._data_check()._msg_first = True
+    wcli.member("a").value("b").request()
+    send_back(wcli, [ValueRes.new(1, "", [1])])
+    assert wcli.member("a").value("b").get() == 1
+    wcli.member("a").value("b").unrequest()
+    assert wcli._data_check().value_store.get_recv("a", "b") is None
+    send_back(wcli, [ValueRes.new(1, "", [2])])
+    assert wcli._data_check().value_store.get_recv("a", "b") is None
+    assert wcli.member("a").value("b").try_get() is None
+    m = check_sent(wcli, ValueReq)
+    assert isinstance(m, ValueReq)
+    assert m.req_id == 1
+
+
+def test_unrequest_idle(wcli):
+    wcli._data_check()._msg_first = True
+    wcli._data_check().idle_unrequest = 0
+    wcli.member("a").value("b").request()
+    wcli.member("a").value("c").on_change(lambda v: None)
+    wcli.member("a").text("d").request()
+    wcli.sync()
+    assert wcli._data_check().value_store.req["a"] == {"c": 2}
+    assert wcli._data_check().text_store.req["a"] == {}
+
+
+def test_recv_limit(wcli):
+    wcli._data_check()._msg_first = True
+    wcli.member("a").value("b").request()
+    wcli.member("a").value("c").request()
+    send_back(wcli, [ValueRes.new(1, "", [1, 2]), ValueRes.new(2, "", [3])])
+    assert wcli.recv_memory_stats()["value"] == {"entries": 2, "bytes": 24}
+    assert wcli.recv_memory_stats()["image"] == {"entries": 0, "bytes": 0}
+    wcli.member("a").value("c").get()
+    wcli.set_recv_limit("value", max_entries=1)
+    assert wcli.recv_memory_stats()["value"] == {"entries": 1, "bytes": 8}
+    assert wcli.member("a").value("b").try_get() is None
+    with pytest.raises(ValueError):
+        wcli.set_recv_limit("func", 1)
+
+
+def test_value_history(wcli):
+    wcli._data_check()._msg_first = True
+    send_back(wcli, [SyncInit.new_full("a", 10, "", "", "")])
+    h = wcli.member("a").value("b").history(10)
+    m = check_sent(wcli, ValueReq)
+    assert isinstance(m, ValueReq)
+    send_back(wcli, [Sync.new_full(10, 1000), ValueRes.new(1, "", [1, 2])])
+    send_back(wcli, [Sync.new_full(10, 2000), ValueRes.new(1, "", [3, 4])])
+    t, v = h.get()
+    assert t.tolist() == [1.0, 2.0]
+    assert v.tolist() == [[1, 2], [3, 4]]
 
 
 def test_text_send(wcli):
@@ -320,6 +443,102 @@ def test_image_send(wcli):
     assert m.cmp_mode == ImageCompressMode.RAW
 
 
+def test_image_send_buffer(wcli):
+    img = np.full((4, 5, 3), 7, dtype=np.uint8)
+    wcli._data_check().image_store.set_send(
+        "a", ImageFrame.from_numpy(img, ImageColorMode.RGB)
+    )
+    msgs = webcface.client_impl.sync_data(wcli._data_check(), False)
+    packed = webcface.message.pack(msgs)
+    img_msg = [m for m in msgs if isinstance(m, Image)][0]
+    assert isinstance(img_msg.data, memoryview)
+    assert umsgpack.unpackb(packed)[-1]["d"] == img.tobytes()
+
+    # バイト単位でないmemoryviewも正しい長さで送る
+    a = np.arange(6, dtype=np.float32).reshape(2, 3)
+    packed = webcface.message.pack(
+        [Image.new("b", memoryview(a), 3, 2, ImageColorMode.GRAY, 0)]
+    )
+    assert umsgpack.unpackb(packed)[-1]["d"] == a.tobytes()
+
+
+def test_image_max_fps(wcli):
+    data = wcli._data_check()
+    img = wcli.image("a").set_max_fps(1)
+
+    def sent():
+        msgs = webcface.client_impl.sync_data(data, False)
+        return [m for m in msgs if isinstance(m, Image)]
+
+    img.set(ImageFrame(1, 1, b"\1", ImageColorMode.GRAY, ImageCompressMode.RAW))
+    assert len(sent()) == 1
+    img.set(ImageFrame(1, 1, b"\2", ImageColorMode.GRAY, ImageCompressMode.RAW))
+    img.set(ImageFrame(1, 1, b"\3", ImageColorMode.GRAY, ImageCompressMode.RAW))
+    assert len(sent()) == 0
+    data.image_last_send["a"] -= 1
+    m = sent()
+    assert len(m) == 1
+    assert bytes(m[0].data) == b"\3"
+    assert len(sent()) == 0
+
+
+def test_image_skip_same(wcli):
+    called = 0
+
+    def callback(v):
+        nonlocal called
+        called += 1
+
+    data = wcli._data_check()
+    img = wcli.image("a").set_skip_same()
+    img.on_change(callback)
+
+    def sent():
+        msgs = webcface.client_impl.sync_data(data, False)
+        return [bytes(m.data) for m in msgs if isinstance(m, Image)]
+
+    def frame(d):
+        return ImageFrame(1, 1, d, ImageColorMode.GRAY, ImageCompressMode.RAW)
+
+    img.set(frame(b"\1"))
+    assert sent() == [b"\1"]
+    assert called == 1
+    img.set(frame(b"\1"))
+    assert sent() == []
+    assert called == 1
+    # 送信前に別の画像をセットしてから元に戻した場合も送信しない
+    img.set(frame(b"\2"))
+    img.set(frame(b"\1"))
+    assert sent() == []
+    assert called == 1
+    img.set(frame(b"\2"))
+    assert sent() == [b"\2"]
+    assert called == 2
+
+
+def test_image_max_fps_on_change(wcli):
+    called = 0
+
+    def callback(v):
+        nonlocal called
+        called += 1
+
+    data = wcli._data_check()
+    img = wcli.image("a").set_max_fps(1)
+    img.on_change(callback)
+    img.set(ImageFrame(1, 1, b"\1", ImageColorMode.GRAY, ImageCompressMode.RAW))
+    webcface.client_impl.sync_data(data, False)
+    assert called == 1
+    # 持ち越されて送信されなかった画像ではon_changeを呼ばない
+    img.set(ImageFrame(1, 1, b"\2", ImageColorMode.GRAY, ImageCompressMode.RAW))
+    img.set(ImageFrame(1, 1, b"\3", ImageColorMode.GRAY, ImageCompressMode.RAW))
+    webcface.client_impl.sync_data(data, False)
+    assert called == 1
+    data.image_last_send["a"] -= 1
+    webcface.client_impl.sync_data(data, False)
+    assert called == 2
+
+
 def test_image_req(wcli):
     called = 0
 
@@ -379,6 +598,80 @@ def test_image_req(wcli):
     assert wcli._data_check().image_store.get_recv("a", "b.c").data == b"\0" * 75
 
 
+def test_image_buffer_pool(wcli):
+    wcli._data_check().image_store.add_req("a", "b")
+    img = wcli.member("a").image("b").enable_buffer_pool(max_buffers=1)
+
+    def recv(d):
+        send_back(
+            wcli,
+            [ImageRes.new(1, "", d, 5, 1, ImageColorMode.GRAY, ImageCompressMode.RAW)],
+        )
+
+    recv(b"\1" * 5)
+    f1 = img.acquire()
+    assert f1.data == b"\1" * 5
+    recv(b"\2" * 5)
+    f2 = img.acquire()
+    buf2 = f2.buffer.obj
+    f2.release()
+    recv(b"\3" * 5)
+    # acquireしたバッファは上書きされない
+    assert f1.data == b"\1" * 5
+    f1.release()
+    recv(b"\4" * 5)
+    # 2つめのフレームのバッファが4つめで再利用される
+    f4 = img.acquire()
+    assert f4.data == b"\4" * 5
+    assert f4.buffer.obj is buf2
+    buf4 = f4.buffer.obj
+    f4.release()
+    # get()はコピーを返すので、その後の受信で上書きされない
+    g4 = img.get()
+    assert g4.buffer.obj is not buf4
+    # 同じ画像を何度読んでもコピーは1回
+    assert img.get() is g4
+    recv(b"\5" * 5)
+    recv(b"\6" * 5)
+    assert g4.data == b"\4" * 5
+    assert img.get().data == b"\6" * 5
+
+
+def test_image_buffer_pool_evict(wcli):
+    data = wcli._data_check()
+    data.image_store.set_recv_limit(max_entries=1)
+    data.image_store.add_req("a", "b")
+    data.image_store.add_req("a", "c")
+    wcli.member("a").image("b").enable_buffer_pool()
+    wcli.member("a").image("c").enable_buffer_pool()
+    pool = data.image_buffer_pool["a"]["b"]
+    send_back(
+        wcli,
+        [
+            ImageRes.new(
+                1, "", b"\1" * 5, 5, 1, ImageColorMode.GRAY, ImageCompressMode.RAW
+            )
+        ],
+    )
+    assert pool.num_free() == 0
+    send_back(
+        wcli,
+        [
+            ImageRes.new(
+                2, "", b"\2" * 5, 5, 1, ImageColorMode.GRAY, ImageCompressMode.RAW
+            )
+        ],
+    )
+    # 上限を超えて削除されたフレームのバッファはプールに戻る
+    assert data.image_store.get_recv("a", "b") is None
+    assert pool.num_free() == 1
+    # unrequestで削除したフレームのバッファも同様
+    pool_c = data.image_buffer_pool["a"]["c"]
+    assert pool_c.num_free() == 0
+    wcli.member("a").image("c").unrequest()
+    assert pool_c.num_free() == 1
+
+
 def test_view_send(wcli):
     data = wcli._data_check()
     vdata = ViewData()
@@ -444,6 +737,53 @@ def test_view_send(wcli):
     assert m_vc(0).bg_color == ViewColor.GREEN
 
 
+def test_view_send_update(wcli):
+    data = wcli._data_check()
+    with wcli.view("a") as v:
+        for i in range(5):
+            v.add(webcface.components.text(str(i), id=str(i)))
+    webcface.client_impl.sync_data(data, False)
+    # 前回のsyncで送信していなくても差分だけを送る
+    webcface.client_impl.sync_data(data, False)
+    wcli.view("a").update("3", text="x")
+    msgs = webcface.client_impl.sync_data(data, False)
+    m = [m for m in msgs if isinstance(m, View)][0]
+    assert list(m.data.keys()) == ["3"]
+    assert m.data["3"]._text == "x"
+    assert m.ids is None
+
+    # 再接続時は全部送る
+    msgs = webcface.client_impl.sync_data(data, True)
+    m = [m for m in msgs if isinstance(m, View)][0]
+    assert len(m.data) == 5
+
+
+def test_canvas_send_unchanged(wcli):
+    import webcface.geometries as geometries
+
+    data = wcli._data_check()
+
+    def send_canvas(width):
+        with wcli.canvas2d("a", width, 10) as c2:
+            c2.add(geometries.line((0, 0), (1, 1)))
+        with wcli.canvas3d("a") as c3:
+            c3.add(geometries.line((0, 0, 0), (1, 1, 1)))
+
+    send_canvas(10)
+    webcface.client_impl.sync_data(data, False)
+    # 内容が変わっていないcanvasは何も送らない
+    send_canvas(10)
+    msgs = webcface.client_impl.sync_data(data, False)
+    assert [m for m in msgs if isinstance(m, (Canvas2D, Canvas3D))] == []
+    # サイズだけが変わった場合は送る
+    send_canvas(20)
+    msgs = webcface.client_impl.sync_data(data, False)
+    m = [m for m in msgs if isinstance(m, Canvas2D)][0]
+    assert m.width == 20
+    assert len(m.data) == 0
+    assert [m for m in msgs if isinstance(m, Canvas3D)] == []
+
+
 def test_view_req(wcli):
     called = 0
 
@@ -493,8 +833,11 @@ def test_view_req(wcli):
         .lock_tmp(wcli._data, "", "", "0")
         .to_view(),
     }
+    v_before = wcli._data_check().view_store.get_recv("a", "b")
     send_back(wcli, [ViewRes.new(1, "", v2, None)])
     assert called == 2
+    # 受信済みのデータは書き換えず新しいデータに差し替える
+    assert v_before.components["0"]._text_color == ViewColor.YELLOW
     assert len(wcli._data_check().view_store.get_recv("a", "b").components) == 3
     assert len(wcli._data_check().view_store.get_recv("a", "b").ids) == 3
     assert (
@@ -570,6 +913,7 @@ def test_log_req(wcli):
     assert (
         wcli._data_check().log_store.get_recv("a", "b").data[0].message == "a" * 100000
     )
+    log_before = wcli._data_check().log_store.get_recv("a", "b")
 
     send_back(
         wcli,
@@ -585,6 +929,7 @@ def test_log_req(wcli):
     )
     assert called == 2
     assert len(wcli._data_check().log_store.get_recv("a", "b").data) == 3
+    assert len(log_before.data) == 2
 
     webcface.Log.keep_lines = 2
     send_back(
@@ -1,5 +1,9 @@
 from conftest import self_name
 import webcface.message
+import time
+import threading
+from webcface.field import Field
+from webcface.value import Value
 
 
 def test_s2_self(s2):
@@ -14,6 +18,12 @@ def test_s2_set_send(s2):
     assert s2.data_recv[self_name]["a"] == "b"
 
 
+def test_s2_set_send_many(s2):
+    s2.set_send_many({"a": "b", "c": "d"})
+    assert s2.data_send == {"a": "b", "c": "d"}
+    assert s2.data_recv[self_name]["c"] == "d"
+
+
 def test_s2_set_recv(s2):
     s2.set_recv("a", "b", "c")
     assert s2.data_recv["a"]["b"] == "c"
@@ -44,26 +54,125 @@ def test_s2_unset_recv(s2):
 
 
 def test_s2_init_member(s2):
-    s2.entry["a"] = ["b"]
+    s2.entry["a"] = {"b": None}
     s2.data_recv["a"] = {"b": "c"}
     s2.init_member("a")
-    assert s2.entry["a"] == []
+    assert s2.entry["a"] == {}
     assert "b" not in s2.data_recv["a"]
 
 
 def test_s2_set_entry(s2):
     s2.set_entry("a", "b")
-    assert s2.entry["a"] == ["b"]
+    assert list(s2.entry["a"]) == ["b"]
+    s2.set_entry("a", "b")
+    assert list(s2.entry["a"]) == ["b"]
+
+
+def test_s2_unset_req(s2):
+    assert s2.add_req("a", "b") == 1
+    s2.data_recv["a"] = {"b": "c"}
+    assert s2.unset_req("a", "b") is True
+    assert "b" not in s2.data_recv["a"]
+    assert "b" not in s2.req["a"]
+    assert s2.get_req(1, "") == ("", "")
+    assert s2.unset_req("a", "b") is False
+    assert s2.add_req("a", "c") == 2
+    assert s2.add_req("a", "b") == 1
+    assert s2.get_req(1, "") == ("a", "b")
+
+
+def test_s2_get_idle_req(s2):
+    s2.add_req("a", "b")
+    assert s2.get_idle_req(0.0) == []
+    assert s2.get_idle_req(time.monotonic() + 1) == [("a", "b")]
+    # request_allの範囲に含まれるものは解除しない
+    s2.add_req_prefix("a", "x", True)
+    s2.add_req("a", "x.y")
+    assert s2.get_idle_req(time.monotonic() + 1) == [("a", "b")]
+
+
+def test_s2_recv_limit(s2):
+    s2.recv_sizeof = len
+    s2.add_req("a", "b")
+    s2.add_req("a", "c")
+    s2.set_recv("a", "x", "1234")
+    s2.set_recv("a", "b", "12")
+    s2.set_recv("a", "c", "123")
+    s2.set_recv(self_name, "d", "12345")
+    assert s2.get_recv_stats() == (3, 9)
+
+    # リクエストされていないものから削除
+    s2.set_recv_limit(max_entries=2)
+    assert "x" not in s2.data_recv["a"]
+    assert s2.get_recv_stats() == (2, 5)
+
+    # 最後に読まれたのが古いものをunrequest
+    s2.add_req("a", "b")
+    s2.set_recv_limit(max_bytes=3)
+    assert s2.get_recv_stats() == (1, 2)
+    assert "c" not in s2.req["a"]
+    assert s2.data_recv["a"] == {"b": "12"}
+    assert s2.data_recv[self_name] == {"d": "12345"}
+
+    s2.recv_keep = lambda m, f: True
+    s2.set_recv_limit(max_bytes=0)
+    assert s2.get_recv_stats() == (1, 2)
+
+
+def test_s2_recv_limit_lru(s2):
+    s2.recv_sizeof = len
+    s2.add_req("a", "b")
+    s2.add_req("a", "c")
+    s2.set_recv("a", "b", "1")
+    s2.set_recv("a", "b.x", "1")  # bのリクエストで受信した子のfield
+    s2.set_recv("a", "y", "1")
+    s2.set_recv("a", "c", "1")
+    s2.set_recv_limit(max_entries=3)
+    assert set(s2.data_recv["a"]) == {"b", "b.x", "c"}
+
+    # 読まれたものは後回しにする
+    s2.add_req("a", "b")
+    s2.set_recv_limit(max_entries=2)
+    assert set(s2.data_recv["a"]) == {"b", "c"}
+    s2.add_req("a", "b")
+    s2.set_recv("a", "c", "1")
+    s2.set_recv_limit(max_entries=1)
+    assert s2.data_recv["a"] == {"c": "1"}
+    assert "b" not in s2.req["a"]
+
+    # いま受信したデータは上限より大きくても削除しない
+    s2.set_recv_limit(max_bytes=2)
+    s2.set_recv("a", "c", "12345")
+    assert s2.data_recv["a"] == {"c": "12345"}
+    assert s2.req["a"]["c"] > 0
+    s2.set_recv("a", "z", "12345")
+    assert s2.data_recv["a"] == {"z": "12345"}
 
 
 def test_s2_get_members(s2):
-    s2.entry = {"a": [], "b": []}
+    s2.init_member("a")
+    s2.set_entry("b", "x")
+    assert s2.get_members() == ["a", "b"]
+    s2.init_member("a")
     assert s2.get_members() == ["a", "b"]
 
 
 def test_s2_get_entry(s2):
-    s2.entry["a"] = ["a", "b", "c"]
+    for f in ("a", "b", "c"):
+        s2.set_entry("a", f)
     assert s2.get_entry("a") == ["a", "b", "c"]
+    # エントリーが増えたらスナップショットも作り直される
+    s2.set_entry("a", "d")
+    assert s2.get_entry("a") == ["a", "b", "c", "d"]
+    s2.init_member("a")
+    assert s2.get_entry("a") == []
+
+
+def test_s2_has_entry(s2):
+    s2.set_entry("a", "b")
+    assert s2.has_entry("a", "b") is True
+    assert s2.has_entry("a", "c") is False
+    assert s2.has_entry("b", "b") is False
 
 
 def test_s2_transfer_send(s2):
@@ -108,12 +217,28 @@ def test_s2_transfer_req(s2):
 
 
 def test_s2_get_req(s2):
-    s2.req["a"] = {"b": 1, "c": 2}
+    assert s2.add_req("a", "b") == 1
+    assert s2.add_req("a", "c") == 2
     assert s2.get_req(1, "") == ("a", "b")
     assert s2.get_req(1, "c") == ("a", "b.c")
     assert s2.get_req(999, "") == ("", "")
 
 
+def test_s2_req_prefix(s2):
+    s2.add_req_prefix("a", "b", True)
+    s2.add_req_prefix("a", "c", False)
+    assert s2.match_req_prefix("a", "b.x") is True
+    assert s2.match_req_prefix("a", "b.x.y") is True
+    assert s2.match_req_prefix("a", "b") is False
+    assert s2.match_req_prefix("a", "c.x") is True
+    assert s2.match_req_prefix("a", "c.x.y") is False
+    assert s2.match_req_prefix("a", "d.x") is False
+    assert s2.match_req_prefix("b", "b.x") is False
+    s2.add_req_prefix("b", "", False)
+    assert s2.match_req_prefix("b", "x") is True
+    assert s2.match_req_prefix("b", "x.y") is False
+
+
 def test_s1_self(s1):
     assert s1.is_self(self_name)
     assert not s1.is_self("a")
@@ -222,3 +347,43 @@ def test_pop_msg(data):
     data._msg_queue = [webcface.message.Ping.new()]
     assert isinstance(data.pop_msg(), webcface.message.Ping)
     assert len(data._msg_queue) == 0
+
+
+def test_entry_index(data):
+    for f in ["a", "b.c", "b.d.e", "b.c"]:
+        data.value_store.set_entry("m", f)
+    data.text_store.set_entry("m", "b.f")
+    idx = data.entry_index
+    assert idx.children("m", "", None, False) == ["a", "b"]
+    assert idx.children("m", "b", None, True) == ["b.c", "b.d.e", "b.f"]
+    assert idx.children("m", "b", data.text_store, True) == ["b.f"]
+    assert idx.has_children("m", "b.d", None) is True
+    assert idx.has_children("m", "b.d.e", None) is False
+    assert idx.has_children("m", "b.d", data.text_store) is False
+
+    data.value_store.init_member("m")
+    assert idx.children("m", "", None, True) == ["b.f"]
+    assert idx.has_children("m", "a", None) is False
+
+
+def test_s2_read_while_locked(data):
+    data.value_store.set_recv("a", "b", [1.0])
+    data.value_store.add_req("a", "b")
+    locked = threading.Event()
+    release = threading.Event()
+
+    def writer():
+        with data.value_store.lock:
+            locked.set()
+            release.wait(5)
+
+    t = threading.Thread(target=writer)
+    t.start()
+    locked.wait(5)
+    try:
+        # on_recvなどがロックを保持していても読み出しはブロックしない
+        assert Value(Field(data, "a", "b")).get() == 1.0
+        assert data.value_store.has_entry("a", "b") is False
+    finally:
+        release.set()
+        t.join()
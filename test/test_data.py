@@ -1,7 +1,10 @@
 from conftest import self_name
 import datetime
+import array
 import pytest
+import numpy as np
 from webcface.value import Value
+from webcface.value_history import ValueHistory
 from webcface.text import Text
 from webcface.log import Log
 from webcface.field import Field
@@ -109,6 +112,68 @@ def test_value_set(data):
         Value(Field(data, "a", "b")).set(123456)
 
 
+def test_value_set_array(data):
+    Value(Field(data, self_name, "c")).set(np.array([1, 2, 3], dtype=np.float64))
+    a = data.value_store.data_send.get("c")
+    assert isinstance(a, array.array)
+    assert a.tolist() == [1.0, 2.0, 3.0]
+
+    data.value_store.data_send = {}
+    Value(Field(data, self_name, "c")).set(np.array([1, 2, 3], dtype=np.int32))
+    assert "c" not in data.value_store.data_send  # 同じデータを2度送らない
+
+    Value(Field(data, self_name, "c")).set(np.arange(6).reshape(2, 3)[:, 1:])
+    assert data.value_store.data_send.get("c").tolist() == [1.0, 2.0, 4.0, 5.0]
+
+    Value(Field(data, self_name, "c")).set(array.array("d", [5, 6]))
+    assert data.value_store.data_send.get("c").tolist() == [5.0, 6.0]
+
+    Value(Field(data, self_name, "b")).set(np.float64(3))
+    assert data.value_store.data_send.get("b") == [3.0]
+
+    with pytest.raises(TypeError) as e:
+        Value(Field(data, self_name, "b")).set("a")
+
+
+def test_value_get_array(data):
+    assert Value(Field(data, "a", "b")).try_get_array() is None
+    assert Value(Field(data, "a", "b")).get_array().shape == (0,)
+    assert data.value_store.req.get("a", {}).get("b", 0) == 1
+
+    data.value_store.data_recv["a"] = {"b": [2, 3, 4]}
+    assert Value(Field(data, "a", "b")).get_array().tolist() == [2.0, 3.0, 4.0]
+
+    Value(Field(data, self_name, "b")).set(np.array([1.0, 2.0]))
+    a = Value(Field(data, self_name, "b")).get_array()
+    assert a.tolist() == [1.0, 2.0]
+    assert not a.flags.writeable
+    assert Value(Field(data, self_name, "b")).get_vec() == [1.0, 2.0]
+    assert Value(Field(data, self_name, "b")).get() == 1.0
+
+
+def test_value_history(data):
+    h = Value(Field(data, self_name, "b")).history(3)
+    assert len(h) == 0
+    assert h.get()[0].shape == (0,)
+    for i in range(5):
+        Value(Field(data, self_name, "b")).set([i, i * 2])
+    assert len(h) == 3
+    t, v = h.get()
+    assert v.tolist() == [[2, 4], [3, 6], [4, 8]]
+    assert (t[1:] >= t[:-1]).all()
+    assert h.last(1)[1].tolist() == [[4, 8]]
+    assert h.range(start=t[1])[1].tolist() == [[3, 6], [4, 8]]
+    assert Value(Field(data, self_name, "b")).history(3) is h
+    assert Value(Field(data, self_name, "b")).history(10) is not h
+
+    h2 = ValueHistory(10)
+    h2.push(1.0, [0.0])
+    h2.push(3.0, [2.0])
+    assert h2.resample([0.0, 2.0, 4.0]).tolist() == [[0.0], [1.0], [2.0]]
+    h2.push(4.0, [1.0, 1.0])
+    assert len(h2) == 1
+
+
 def test_text_member(data):
     assert isinstance(Text(Field(data, "a", "b")).member, Member)
     assert Text(Field(data, "a", "b")).member.name == "a"
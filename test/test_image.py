@@ -2,6 +2,8 @@ from conftest import self_name
 import datetime
 import pytest
 import numpy as np
+import webcface.image_frame
+import webcface.client_impl
 from webcface.image import Image
 from webcface.image_frame import ImageFrame, ImageColorMode, ImageCompressMode
 from webcface.field import Field
@@ -78,9 +80,206 @@ def test_image_set(data):
     Image(Field(data, self_name, "b")).set(
         ImageFrame(5, 5, b"\0" * 75, ImageColorMode.RGB, ImageCompressMode.RAW)
     )
+    # (ver3.2〜) on_changeは送信したときに呼ばれる
+    assert called == 0
+    webcface.client_impl.sync_data(data, False)
     assert called == 1
 
     with pytest.raises(ValueError) as e:
         Image(Field(data, "a", "b")).set(
             ImageFrame(5, 5, b"\0" * 75, ImageColorMode.RGB, ImageCompressMode.RAW)
         )
+
+
+def test_image_frame_buffer():
+    img = np.arange(2 * 3 * 4, dtype=np.uint8).reshape(2, 3, 4)
+    f = ImageFrame.from_numpy(img, ImageColorMode.BGRA)
+    assert f.channels == 4
+    assert np.shares_memory(f.numpy(), img)
+    assert f.buffer.nbytes == 24
+    assert f.data == img.tobytes()
+
+    # 連続していない配列はコピーされる
+    f = ImageFrame.from_numpy(img[:, ::2], ImageColorMode.BGRA)
+    assert f.numpy().tolist() == img[:, ::2].tolist()
+
+    # 圧縮された画像はサイズをチェックしない
+    f = ImageFrame(10, 10, b"abc", ImageColorMode.BGR, ImageCompressMode.PNG)
+    assert f.data == b"abc"
+
+
+def test_image_frame_shared_memory():
+    shared_memory = pytest.importorskip("multiprocessing.shared_memory")
+    shm = shared_memory.SharedMemory(create=True, size=2 * 3 * 3)
+    try:
+        f = ImageFrame(3, 2, shm.buf, ImageColorMode.BGR, ImageCompressMode.RAW)
+        shm.buf[0] = 5
+        assert f.numpy()[0, 0, 0] == 5
+        del f
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def test_image_set_compress_fallback(data, monkeypatch):
+    def not_found(*args):
+        raise ModuleNotFoundError()
+
+    monkeypatch.setattr(webcface.image_frame, "_encode_cv2", not_found)
+    monkeypatch.setattr(webcface.image_frame, "_encode_pil", not_found)
+    Image(Field(data, self_name, "b")).set(
+        ImageFrame(5, 5, b"\0" * 75, ImageColorMode.RGB, ImageCompressMode.RAW),
+        compress_mode=ImageCompressMode.JPEG,
+    )
+    data.image_encode_pool.shutdown(wait=True)
+    f = data.image_store.data_send["b"]
+    assert f.compress_mode == ImageCompressMode.RAW
+    assert f.data == b"\0" * 75
+
+
+def test_image_set_compress_callback(data, monkeypatch):
+    def not_found(*args):
+        raise ModuleNotFoundError()
+
+    monkeypatch.setattr(webcface.image_frame, "_encode_cv2", not_found)
+    monkeypatch.setattr(webcface.image_frame, "_encode_pil", not_found)
+    seen = []
+    Image(Field(data, self_name, "b")).on_change(
+        lambda v: seen.append(v.get().numpy().ravel().tolist())
+    )
+    img = np.zeros((2, 2), dtype=np.uint8)
+    Image(Field(data, self_name, "b")).set(
+        ImageFrame.from_numpy(img, ImageColorMode.GRAY),
+        compress_mode=ImageCompressMode.PNG,
+    )
+    # 圧縮中に元の配列を書き換えても送信される画像は変わらない
+    img[:] = 1
+    data.image_encode_pool.shutdown(wait=True)
+    assert data.image_store.data_send["b"].data == b"\0" * 4
+    # on_changeは圧縮が終わって送信したときに呼ばれる
+    assert seen == []
+    webcface.client_impl.sync_data(data, False)
+    assert seen == [[0, 0, 0, 0]]
+
+    # shutdown後も例外にならず、呼び出したスレッドで処理される
+    Image(Field(data, self_name, "b")).set(
+        ImageFrame.from_numpy(img, ImageColorMode.GRAY),
+        compress_mode=ImageCompressMode.PNG,
+    )
+    assert data.image_store.data_send["b"].data == b"\1" * 4
+    webcface.client_impl.sync_data(data, False)
+    assert len(seen) == 2
+
+
+def test_image_set_compress(data):
+    pil_image = pytest.importorskip("PIL.Image")
+    import io
+
+    img = np.arange(4 * 6 * 3, dtype=np.uint8).reshape(4, 6, 3)
+    Image(Field(data, self_name, "b")).set(
+        ImageFrame.from_numpy(img, ImageColorMode.BGR),
+        compress_mode=ImageCompressMode.PNG,
+    )
+    data.image_encode_pool.shutdown(wait=True)
+    f = data.image_store.data_send["b"]
+    assert f.compress_mode == ImageCompressMode.PNG
+    decoded = np.asarray(pil_image.open(io.BytesIO(f.data)))
+    assert decoded[:, :, ::-1].tolist() == img.tolist()
+
+
+def test_image_frame_decode():
+    pytest.importorskip("PIL.Image")
+    img = np.arange(4 * 6 * 3, dtype=np.uint8).reshape(4, 6, 3)
+    raw = ImageFrame.from_numpy(img, ImageColorMode.BGR)
+    assert raw.decode() is raw
+    f = raw.encode(ImageCompressMode.PNG)
+    f = ImageFrame(6, 4, f.data, ImageColorMode.BGR, ImageCompressMode.PNG)
+    d = f.decode()
+    assert d.compress_mode == ImageCompressMode.RAW
+    assert d.numpy().tolist() == img.tolist()
+    # 2回目以降はキャッシュを返す
+    assert f.decode() is d
+    assert f.numpy() is not None and np.shares_memory(f.numpy(), d.numpy())
+
+    out = np.zeros((4, 6, 3), dtype=np.uint8)
+    assert np.shares_memory(f.decode(out).numpy(), out)
+    assert out.tolist() == img.tolist()
+    with pytest.raises(ValueError):
+        f.decode(np.zeros((4, 6, 4), dtype=np.uint8))
+
+    g = ImageFrame(6, 4, f.data, ImageColorMode.RGBA, ImageCompressMode.PNG)
+    assert g.numpy()[:, :, :3].tolist() == img[:, :, ::-1].tolist()
+    assert (g.numpy()[:, :, 3] == 255).all()
+
+
+def test_image_frame_resize_convert():
+    img = np.arange(4 * 6 * 3, dtype=np.uint8).reshape(4, 6, 3)
+    f = ImageFrame.from_numpy(img, ImageColorMode.BGR)
+    assert f.resize() is f
+    assert f.resize(3).numpy().tolist() == img[::2, ::2].tolist()
+    assert f.resize(height=8).numpy().shape == (8, 12, 3)
+    assert f.convert_color(ImageColorMode.BGR) is f
+    assert f.convert_color(ImageColorMode.RGB).numpy().tolist() == (
+        img[:, :, ::-1].tolist()
+    )
+    bgra = f.convert_color(ImageColorMode.BGRA).numpy()
+    assert bgra[:, :, :3].tolist() == img.tolist()
+    assert (bgra[:, :, 3] == 255).all()
+    white = ImageFrame.from_numpy(np.full((1, 1, 3), 255, np.uint8), ImageColorMode.RGB)
+    assert white.convert_color(ImageColorMode.GRAY).numpy().tolist() == [[[255]]]
+    gray = ImageFrame.from_numpy(np.full((1, 1), 7, np.uint8), ImageColorMode.GRAY)
+    assert gray.convert_color(ImageColorMode.RGBA).numpy().tolist() == [
+        [[7, 7, 7, 255]]
+    ]
+
+
+def test_image_request_self(data):
+    img = np.zeros((4, 6, 3), dtype=np.uint8)
+    Image(Field(data, self_name, "b")).set(
+        ImageFrame.from_numpy(img, ImageColorMode.BGR)
+    )
+    assert Image(Field(data, self_name, "b")).get().width == 6
+    Image(Field(data, self_name, "b")).request(width=3, color_mode=ImageColorMode.GRAY)
+    assert self_name not in data.image_store.req
+    f = Image(Field(data, self_name, "b")).get()
+    assert (f.width, f.height, f.color_mode) == (3, 2, ImageColorMode.GRAY)
+    # 同じ画像・同じリクエストでは変換結果を使いまわす
+    assert Image(Field(data, self_name, "b")).get() is f
+
+
+def test_image_request_kept_by_on_change(data):
+    img = np.zeros((4, 6, 3), dtype=np.uint8)
+    Image(Field(data, self_name, "b")).set(
+        ImageFrame.from_numpy(img, ImageColorMode.BGR)
+    )
+    Image(Field(data, self_name, "b")).request(width=2)
+    Image(Field(data, self_name, "b")).on_change(lambda v: None)
+    assert Image(Field(data, self_name, "b")).try_get().width == 2
+
+    # 他のメンバーの画像でも、on_changeやtry_getでリクエストの内容は変わらない
+    data._msg_first = True
+    Image(Field(data, "a", "b")).request(width=2)
+    assert len(data._msg_queue) == 1
+    data.clear_msg()
+    Image(Field(data, "a", "b")).on_change(lambda v: None)
+    Image(Field(data, "a", "b")).try_get()
+    assert data.image_store.req_info["a"]["b"].width == 2
+    assert len(data._msg_queue) == 0
+
+
+def test_image_request_self_compress_fallback(data, monkeypatch):
+    def not_found(*args):
+        raise ModuleNotFoundError()
+
+    monkeypatch.setattr(webcface.image_frame, "_encode_cv2", not_found)
+    monkeypatch.setattr(webcface.image_frame, "_encode_pil", not_found)
+    img = np.zeros((4, 6, 3), dtype=np.uint8)
+    Image(Field(data, self_name, "b")).set(
+        ImageFrame.from_numpy(img, ImageColorMode.BGR)
+    )
+    Image(Field(data, self_name, "b")).request(
+        width=3, compress_mode=ImageCompressMode.JPEG
+    )
+    f = Image(Field(data, self_name, "b")).get()
+    assert f.compress_mode == ImageCompressMode.RAW
+    assert (f.width, f.height) == (3, 2)
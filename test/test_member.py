@@ -94,29 +94,84 @@ def test_log(data):
 
 
 def test_values(data):
-    data.value_store.entry = {"a": ["b", "c", "d"]}
+    for f in ["b", "c", "d"]:
+        data.value_store.set_entry("a", f)
     assert len(list(Member(Field(data, "a")).values())) == 3
     assert list(Member(Field(data, "b")).values()) == []
 
 
 def test_texts(data):
-    data.text_store.entry = {"a": ["b", "c", "d"]}
+    for f in ["b", "c", "d"]:
+        data.text_store.set_entry("a", f)
     assert len(list(Member(Field(data, "a")).texts())) == 3
     assert list(Member(Field(data, "b")).texts()) == []
 
 
 def test_funcs(data):
-    data.func_store.entry = {"a": ["b", "c", "d"]}
+    for f in ["b", "c", "d"]:
+        data.func_store.set_entry("a", f)
     assert len(list(Member(Field(data, "a")).funcs())) == 3
     assert list(Member(Field(data, "b")).funcs()) == []
 
 
 def test_views(data):
-    data.view_store.entry = {"a": ["b", "c", "d"]}
+    for f in ["b", "c", "d"]:
+        data.view_store.set_entry("a", f)
     assert len(list(Member(Field(data, "a")).views())) == 3
     assert list(Member(Field(data, "b")).views()) == []
 
 
+def test_set_values(data):
+    called = 0
+
+    def callback(v):
+        nonlocal called
+        called += 1
+        assert v.name == "x.b"
+
+    m = Member(Field(data, self_name))
+    m.value("x.b").on_change(callback)
+    m.child("x").set_values({"a": 1, "b": [2, 3], "c.d": True})
+    assert data.value_store.data_send == {
+        "x.a": [1.0],
+        "x.b": [2.0, 3.0],
+        "x.c.d": [1.0],
+    }
+    assert called == 1
+
+    data.value_store.data_send = {}
+    m.child("x").set_values({"a": 1, "b": [2, 4]})
+    assert data.value_store.data_send == {"x.b": [2.0, 4.0]}  # 同じデータを2度送らない
+    assert m.value("x.b").get_vec() == [2.0, 4.0]
+    assert called == 2
+
+    with pytest.raises(TypeError):
+        m.set_values({"a": "a"})
+    with pytest.raises(ValueError):
+        Member(Field(data, "a")).set_values({"a": 1})
+
+
+def test_set_texts(data):
+    m = Member(Field(data, self_name))
+    m.set_texts({"a": "x", "b": 1, "c": True})
+    assert data.text_store.data_send == {"a": "x", "b": 1.0, "c": True}
+    assert m.text("b").get() == "1.0"
+
+
+def test_snapshot(data):
+    for f in ["x.b", "x.c", "y"]:
+        data.value_store.set_entry("a", f)
+    data.value_store.data_recv["a"] = {"x.b": [1.0], "y": [2.0, 3.0]}
+    m = Member(Field(data, "a"))
+    assert m.child("x").snapshot() == {"b": [1.0]}
+    assert data.value_store.req["a"] == {"x.b": 1, "x.c": 2}
+    assert m.snapshot(["x.b", "y", "z"]) == {"x.b": [1.0], "y": [2.0, 3.0]}
+
+    s = Member(Field(data, self_name))
+    s.set_values({"p.q": 1, "p.r": [2, 3]})
+    assert s.child("p").snapshot() == {"q": [1.0], "r": [2.0, 3.0]}
+
+
 def test_on_value_entry(data):
     called = 0
 
@@ -4,6 +4,7 @@ from webcface.view import View, ViewComponent, ViewData
 from webcface.view_base import ViewComponentType, ViewColor
 from webcface.view_base import ViewComponentBase
 import webcface.components as view
+import webcface.message
 from webcface.func import Func
 from webcface.field import Field
 from webcface.member import Member
@@ -153,3 +154,121 @@ def test_view_set(data):
 
     with pytest.raises(ValueError) as e:
         View(Field(data, "a", "b")).sync()
+
+
+def test_view_sync_unchanged(data):
+    called = 0
+
+    def callback(v):
+        nonlocal called
+        called += 1
+
+    View(Field(data, self_name, "b")).on_change(callback)
+    with View(Field(data, self_name, "b")) as v:
+        v.add("a", view.new_line())
+    assert called == 1
+    data.view_store.data_send = {}
+    # 内容が同じなら送信もon_changeもしない
+    with View(Field(data, self_name, "b")) as v:
+        v.add("a", view.new_line())
+    assert called == 1
+    assert "b" not in data.view_store.data_send
+    with View(Field(data, self_name, "b")) as v:
+        v.add("b", view.new_line())
+    assert called == 2
+    assert data.view_store.data_send["b"].components["..0.0"]._text == "b"
+
+
+def test_view_component_fingerprint(data):
+    a = view.text("a", text_color=ViewColor.RED).lock_tmp(data, "", "", "0").to_view()
+    b = view.text("a", text_color=ViewColor.RED).lock_tmp(data, "", "", "1").to_view()
+    c = view.text("a", text_color=ViewColor.BLUE).lock_tmp(data, "", "", "2").to_view()
+    assert a == b
+    assert a != c
+    assert a._fingerprint() == b._fingerprint()
+
+
+def test_view_component_msg_cache(data):
+    a = view.button("a", lambda: 1).lock_tmp(data, "", "", "0").to_view()
+    vd = webcface.message.vb_to_vd({"0": a})
+    # 2回目以降は同じdictを使いまわす
+    assert webcface.message.vb_to_vd({"0": a})["0"] is vd["0"]
+    lazy = webcface.message.vd_to_vb(vd)["0"]
+    assert "_type" not in lazy.__dict__
+    assert lazy == a
+    assert lazy._on_click_func._field == a._on_click_func._field
+    assert webcface.message.vb_to_vd({"0": lazy})["0"] is vd["0"]
+
+    # キャッシュはコンポーネントとリストを共有しない
+    b = view.select_input("a", option=["x", "y"]).lock_tmp(data, "", "", "1").to_view()
+    vd = webcface.message.vb_to_vd({"1": b})
+    b._option.append("z")
+    assert vd["1"]["io"] == ["x", "y"]
+
+
+def test_view_update(data):
+    called = 0
+
+    def callback(v):
+        nonlocal called
+        called += 1
+
+    View(Field(data, self_name, "b")).on_change(callback)
+    with View(Field(data, self_name, "b")) as v:
+        v.add(view.text("a", id="t"), view.button("f", lambda: 1))
+    v_prev = data.view_store.data_send.pop("b")
+    View(Field(data, self_name, "b")).update("t", text="c", text_color=ViewColor.RED)
+    vd = data.view_store.data_send["b"]
+    assert vd.ids == ["t", "..2.0"]
+    assert vd.components["t"]._text == "c"
+    assert vd.components["t"]._text_color == ViewColor.RED
+    assert vd.components["..2.0"] is v_prev.components["..2.0"]
+    assert vd.base is v_prev
+    assert vd.dirty == {"t"}
+    assert called == 2
+
+    # 変更後と同じ内容でsyncしても送信しない
+    data.view_store.data_send.pop("b")
+    with View(Field(data, self_name, "b")) as v2:
+        v2.add(
+            view.text("c", id="t", text_color=ViewColor.RED),
+            view.button("f", lambda: 1),
+        )
+    assert "b" not in data.view_store.data_send
+    assert called == 2
+
+    # 元のViewオブジェクトに要素を追加してsyncしても変更は元に戻らない
+    v.add(view.text("d"))
+    v.sync()
+    vd = data.view_store.data_send["b"]
+    assert vd.components["t"]._text == "c"
+    assert vd.components["t"]._text_color == ViewColor.RED
+
+    with pytest.raises(ValueError):
+        View(Field(data, self_name, "b")).update("x", text="c")
+
+
+def test_view_func_cache(data):
+    def f():
+        return 1
+
+    def g():
+        return 2
+
+    def on_change(val):
+        pass
+
+    for _ in range(2):
+        with View(Field(data, self_name, "b")) as v:
+            v.add(view.button("f", f), view.text_input("i", on_change=on_change))
+        if _ == 0:
+            info_f = data.func_store.get_recv(self_name, "..vb...2.0")
+            info_i = data.func_store.get_recv(self_name, "..vb...3.0")
+    # 同じ関数なら登録し直さない
+    assert data.func_store.get_recv(self_name, "..vb...2.0") is info_f
+    assert data.func_store.get_recv(self_name, "..vb...3.0") is info_i
+
+    with View(Field(data, self_name, "b")) as v:
+        v.add(view.button("f", g), view.text_input("i", on_change=on_change))
+    assert data.func_store.get_recv(self_name, "..vb...2.0") is not info_f
+    assert Func(Field(data, self_name, "..vb...2.0")).run() == 2
@@ -1,6 +1,7 @@
 from .member import Member
 from .field import Field
 from .value import Value
+from .value_history import ValueHistory
 from .text import Text, Variant, InputRef
 from .image import Image
 from .image_frame import ImageFrame, ImageColorMode, ImageCompressMode
@@ -28,6 +29,7 @@ __all__ = [
     "Member",
     "Field",
     "Value",
+    "ValueHistory",
     "Text",
     "Variant",
     "InputRef",
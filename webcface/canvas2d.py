@@ -1,10 +1,21 @@
-from typing import Optional, Callable, List, SupportsFloat, Union, Dict
+from typing import (
+    Optional,
+    Callable,
+    List,
+    SupportsFloat,
+    Union,
+    Dict,
+    Set,
+    Sequence,
+    Tuple,
+)
 import webcface.field
 import webcface.canvas2d_base
 import webcface.geometries
 import webcface.client_data
 import webcface.transform
 import webcface.view_base
+import webcface.canvas_layer
 import webcface.temporal_component
 
 
@@ -14,6 +25,9 @@ class Canvas2DData:
     ids: List[str]
     width: float
     height: float
+    base: "Optional[Canvas2DData]"
+    dirty: Optional[Set[str]]
+    layers: Dict[str, List[str]]
 
     def __init__(self, width: float, height: float) -> None:
         if width <= 0 or height <= 0:
@@ -23,6 +37,9 @@ class Canvas2DData:
         self.ids = []
         self.width = width
         self.height = height
+        self.base = None
+        self.dirty = None
+        self.layers = {}
 
 
 class Canvas2DComponent(webcface.canvas2d_base.Canvas2DComponentBase):
@@ -173,6 +190,12 @@ class Canvas2D:
                 ]
             )
 
+    def unrequest(self) -> None:
+        """値の受信リクエストを解除する (ver3.2〜)"""
+        self._base._data_check().canvas2d_store.unset_req(
+            self._base._member, self._base._field
+        )
+
     def try_get(self) -> "Optional[List[Canvas2DComponent]]":
         """CanvasをlistまたはNoneで返す、まだリクエストされてなければ自動でリクエストされる"""
         self.request()
@@ -199,8 +222,8 @@ class Canvas2D:
         try_get() などとは違って、実際のデータを受信しない。
         リクエストもしない。
         """
-        return self._base._field in self._base._data_check().canvas2d_store.get_entry(
-            self._base._member
+        return self._base._data_check().canvas2d_store.has_entry(
+            self._base._member, self._base._field
         )
 
     @property
@@ -273,6 +296,81 @@ class Canvas2D:
             on_change(self)
         return self
 
+    def layer(self, name: str) -> "Canvas2DLayer":
+        """Canvas2Dの一部をレイヤーとして別に作成・送信する (ver3.2〜)
+
+        * 静的な背景と毎回動く要素のように更新頻度が違う要素をレイヤーに分けると、
+          sync時に前回と同じ内容のレイヤーは送信されない。
+        * 各レイヤーの要素はレイヤーを作成した順に表示される。
+          init()してsync()したCanvas2Dの要素は名前が""のレイヤーとして扱われ、最初に表示される。
+          (ただしCanvas2D自体をinit()してsync()した場合は他のレイヤーも含めて全体が置き換えられる)
+        * 自動で割り当てられる要素のidにはレイヤー名が含まれるので、
+          あるレイヤーの要素の順番を変えても他のレイヤーの要素のidは変わらない。
+        * サイズはinit()されている場合はその値、
+          されていない場合は前回sync()したCanvas2Dのサイズを使う。
+
+        :arg name: レイヤーの名前
+        """
+        return Canvas2DLayer(self, name)
+
+    def move(
+        self,
+        id: str,
+        origin: Union[
+            "webcface.transform.Point",
+            Sequence[SupportsFloat],
+            "webcface.transform.Transform",
+            "webcface.transform.Rotation",
+            Tuple[
+                Union["webcface.transform.Point", Sequence[SupportsFloat]],
+                Union["webcface.transform.Rotation", SupportsFloat],
+            ],
+        ],
+    ) -> "Canvas2D":
+        """sync済みのCanvas2Dの要素1つの位置を変更する (ver3.2〜)
+
+        Canvas2Dを作り直さずに、次の Client.sync() でその要素だけが送信される。
+
+        :arg id: 変更する要素のid (Canvas2DComponent.id)
+        :arg origin: 新しい位置 (TemporalComponent のoriginと同じ)
+        """
+        data = self._base._set_check()
+        tf = webcface.transform.convert_to_transform(origin)
+        with data.canvas2d_store.lock:
+            prev = data.canvas2d_store.get_recv(self._base._member, self._base._field)
+            if prev is None or id not in prev.components:
+                raise ValueError(f"Canvas2D component '{id}' not found")
+            c = prev.components[id]
+            new_data = Canvas2DData(prev.width, prev.height)
+            new_data.ids = prev.ids
+            new_data.layers = prev.layers
+            new_data.components = dict(prev.components)
+            new_data.components[id] = webcface.canvas2d_base.Canvas2DComponentBase(
+                c._type,
+                list(tf.pos[:2]),
+                tf.rot[0],
+                c._color,
+                c._fill,
+                c._stroke_width,
+                c._geometry_type,
+                c._geometry_properties,
+            )
+            new_data.tmp_components = prev.tmp_components
+            data.canvas2d_store.set_send_dirty(self._base._field, prev, new_data, {id})
+        # 次にsync()したときに変更が元に戻らないよう、addした要素にも反映する
+        tmp_components = list(prev.tmp_components)
+        if self._c2data is not None and self._c2data is not prev:
+            tmp_components.extend(self._c2data.tmp_components)
+        for tc in tmp_components:
+            if tc._id == id:
+                tc._origin = tf
+        on_change = data.on_canvas2d_change.get(self._base._member, {}).get(
+            self._base._field
+        )
+        if on_change is not None:
+            on_change(self)
+        return self
+
     def add(
         self,
         *args: Union[
@@ -293,22 +391,73 @@ class Canvas2D:
         if self._c2data is None:
             raise ValueError("Canvas2D not initialized")
         assert len(args) > 0, "no components given to Canvas2D.add()"
-        for c in args:
-            if isinstance(c, webcface.temporal_component.TemporalComponent):
-                if len(kwargs) > 0:
-                    raise ValueError(
-                        f"kwargs is not allowed because {c} is already a component"
-                    )
-                self._c2data.tmp_components.append(c)
-            elif isinstance(c, webcface.geometries.Geometry):
-                self._c2data.tmp_components.append(
-                    webcface.temporal_component.TemporalComponent(
-                        canvas2d_type=webcface.canvas2d_base.Canvas2DComponentType.GEOMETRY,
-                        geometry=c,
-                        **kwargs,
-                    )
-                )
-            else:
-                raise ValueError(f"Invalid component {c}")
+        webcface.canvas_layer.append_components(
+            self._c2data.tmp_components,
+            args,
+            kwargs,
+            "canvas2d_type",
+            webcface.canvas2d_base.Canvas2DComponentType.GEOMETRY,
+        )
+        self._modified = True
+        return self
+
+
+class Canvas2DLayer(webcface.canvas_layer.CanvasLayerBase):
+    """Canvas2Dのレイヤー (ver3.2〜)
+
+    Canvas2D.layer() で取得する。
+    Canvas2Dと同様にwith構文またはadd()とsync()で内容を設定する。
+    """
+
+    _canvas: Canvas2D
+    _data_type = "c2"
+
+    def __init__(self, canvas: Canvas2D, name: str) -> None:
+        super().__init__(canvas, name)
+
+    def add(
+        self,
+        *args: Union[
+            "webcface.temporal_component.TemporalComponent",
+            "webcface.geometries.Geometry2D",
+        ],
+        **kwargs,
+    ) -> "Canvas2DLayer":
+        """要素を追加
+
+        引数は Canvas2D.add() と同じ
+        """
+        assert len(args) > 0, "no components given to Canvas2DLayer.add()"
+        webcface.canvas_layer.append_components(
+            self._tmp_components,
+            args,
+            kwargs,
+            "canvas2d_type",
+            webcface.canvas2d_base.Canvas2DComponentType.GEOMETRY,
+        )
         self._modified = True
         return self
+
+    def _component_type(
+        self, c: "webcface.temporal_component.TemporalComponent"
+    ) -> int:
+        return c._canvas2d_type
+
+    def _to_component(self, c: "webcface.temporal_component.TemporalComponent"):
+        return c.to_canvas2d()
+
+    def _store(self, data: "webcface.client_data.ClientData"):
+        return data.canvas2d_store
+
+    def _on_change(self, data: "webcface.client_data.ClientData") -> dict:
+        return data.on_canvas2d_change
+
+    def _new_data(self, prev: Optional[Canvas2DData]) -> Canvas2DData:
+        if self._canvas._c2data is not None:
+            return Canvas2DData(self._canvas._c2data.width, self._canvas._c2data.height)
+        if prev is not None:
+            return Canvas2DData(prev.width, prev.height)
+        raise ValueError("Canvas2D not initialized")
+
+    def _same_canvas(self, prev: Canvas2DData, new_data: Canvas2DData) -> bool:
+        return (prev.width, prev.height) == (new_data.width, new_data.height)
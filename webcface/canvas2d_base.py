@@ -1,5 +1,6 @@
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Union
 from enum import IntEnum
+import array
 
 
 class Canvas2DComponentType(IntEnum):
@@ -14,7 +15,9 @@ class Canvas2DComponentBase:
     _fill: int
     _stroke_width: float
     _geometry_type: int
-    _geometry_properties: List[float]
+    # (ver3.2〜) 受信したデータやnumpy配列から作成したPolygonではarray.array
+    _geometry_properties: "Union[List[float], array.array]"
+    _msg: Optional[dict]
 
     def __init__(
         self,
@@ -25,7 +28,7 @@ class Canvas2DComponentBase:
         fill: int = 0,
         stroke_width: float = 0,
         geometry_type: int = 0,
-        geometry_properties: Optional[List[float]] = None,
+        geometry_properties: "Optional[Union[List[float], array.array]]" = None,
     ) -> None:
         self._type = type
         self._origin_pos = origin_pos or []
@@ -35,6 +38,7 @@ class Canvas2DComponentBase:
         self._stroke_width = stroke_width
         self._geometry_type = geometry_type
         self._geometry_properties = geometry_properties or []
+        self._msg = None
 
     def __eq__(self, other: object) -> bool:
         return (
@@ -1,21 +1,38 @@
-from typing import Optional, Callable, List, Dict, Union
+from typing import (
+    Optional,
+    Callable,
+    List,
+    Dict,
+    Union,
+    Set,
+    Sequence,
+    Tuple,
+    SupportsFloat,
+)
 import webcface.field
 import webcface.canvas3d_base
 import webcface.geometries
 import webcface.client_data
 import webcface.transform
 import webcface.view_base
+import webcface.canvas_layer
 
 
 class Canvas3DData:
     tmp_components: "List[webcface.temporal_component.TemporalComponent]"
     components: "Dict[str, webcface.canvas3d_base.Canvas3DComponentBase]"
     ids: List[str]
+    base: "Optional[Canvas3DData]"
+    dirty: Optional[Set[str]]
+    layers: Dict[str, List[str]]
 
     def __init__(self) -> None:
         self.tmp_components = []
         self.components = {}
         self.ids = []
+        self.base = None
+        self.dirty = None
+        self.layers = {}
 
 
 class Canvas3DComponent(webcface.canvas3d_base.Canvas3DComponentBase):
@@ -159,6 +176,12 @@ class Canvas3D:
                 ]
             )
 
+    def unrequest(self) -> None:
+        """値の受信リクエストを解除する (ver3.2〜)"""
+        self._base._data_check().canvas3d_store.unset_req(
+            self._base._member, self._base._field
+        )
+
     def try_get(self) -> Optional[List[Canvas3DComponent]]:
         """CanvasをlistまたはNoneで返す、まだリクエストされてなければ自動でリクエストされる"""
         self.request()
@@ -185,8 +208,8 @@ class Canvas3D:
         try_get() などとは違って、実際のデータを受信しない。
         リクエストもしない。
         """
-        return self._base._field in self._base._data_check().canvas3d_store.get_entry(
-            self._base._member
+        return self._base._data_check().canvas3d_store.has_entry(
+            self._base._member, self._base._field
         )
 
     def __enter__(self) -> "Canvas3D":
@@ -224,6 +247,80 @@ class Canvas3D:
             on_change(self)
         return self
 
+    def layer(self, name: str) -> "Canvas3DLayer":
+        """Canvas3Dの一部をレイヤーとして別に作成・送信する (ver3.2〜)
+
+        * 静的な背景と毎回動く要素のように更新頻度が違う要素をレイヤーに分けると、
+          sync時に前回と同じ内容のレイヤーは送信されない。
+        * 各レイヤーの要素はレイヤーを作成した順に表示される。
+          init()してsync()したCanvas3Dの要素は名前が""のレイヤーとして扱われ、最初に表示される。
+          (ただしCanvas3D自体をinit()してsync()した場合は他のレイヤーも含めて全体が置き換えられる)
+        * 自動で割り当てられる要素のidにはレイヤー名が含まれるので、
+          あるレイヤーの要素の順番を変えても他のレイヤーの要素のidは変わらない。
+
+        :arg name: レイヤーの名前
+        """
+        return Canvas3DLayer(self, name)
+
+    def move(
+        self,
+        id: str,
+        origin: Union[
+            "webcface.transform.Point",
+            Sequence[SupportsFloat],
+            "webcface.transform.Transform",
+            "webcface.transform.Rotation",
+            Tuple[
+                Union["webcface.transform.Point", Sequence[SupportsFloat]],
+                Union["webcface.transform.Rotation", SupportsFloat],
+            ],
+        ],
+    ) -> "Canvas3D":
+        """sync済みのCanvas3Dの要素1つの位置を変更する (ver3.2〜)
+
+        Canvas3Dを作り直さずに、次の Client.sync() でその要素だけが送信される。
+
+        :arg id: 変更する要素のid (Canvas3DComponent.id)
+        :arg origin: 新しい位置 (TemporalComponent のoriginと同じ)
+        """
+        data = self._base._set_check()
+        tf = webcface.transform.convert_to_transform(origin)
+        with data.canvas3d_store.lock:
+            prev = data.canvas3d_store.get_recv(self._base._member, self._base._field)
+            if prev is None or id not in prev.components:
+                raise ValueError(f"Canvas3D component '{id}' not found")
+            c = prev.components[id]
+            new_data = Canvas3DData()
+            new_data.ids = prev.ids
+            new_data.layers = prev.layers
+            new_data.components = dict(prev.components)
+            new_data.components[id] = webcface.canvas3d_base.Canvas3DComponentBase(
+                c._type,
+                list(tf.pos[:3]),
+                list(tf.rot_euler()[:3]),
+                c._color,
+                c._geometry_type,
+                c._geometry_properties,
+                c._field_member,
+                c._field_field,
+                c._angles,
+            )
+            new_data.tmp_components = prev.tmp_components
+            data.canvas3d_store.set_send_dirty(self._base._field, prev, new_data, {id})
+        # 次にsync()したときに変更が元に戻らないよう、addした要素にも反映する
+        tmp_components = list(prev.tmp_components)
+        if self._c3data is not None and self._c3data is not prev:
+            tmp_components.extend(self._c3data.tmp_components)
+        for tc in tmp_components:
+            if tc._id == id:
+                tc._origin = tf
+        on_change = data.on_canvas3d_change.get(self._base._member, {}).get(
+            self._base._field
+        )
+        if on_change is not None:
+            on_change(self)
+        return self
+
     def add(
         self,
         *args: Union[
@@ -242,23 +339,13 @@ class Canvas3D:
             self.init()
         assert self._c3data is not None
         assert len(args) > 0, "no components given to Canvas3D.add()"
-        for c in args:
-            if isinstance(c, webcface.temporal_component.TemporalComponent):
-                if len(kwargs) > 0:
-                    raise ValueError(
-                        f"kwargs is not allowed because {c} is already a component"
-                    )
-                self._c3data.tmp_components.append(c)
-            elif isinstance(c, webcface.geometries.Geometry):
-                self._c3data.tmp_components.append(
-                    webcface.temporal_component.TemporalComponent(
-                        canvas3d_type=webcface.canvas3d_base.Canvas3DComponentType.GEOMETRY,
-                        geometry=c,
-                        **kwargs,
-                    )
-                )
-            else:
-                raise ValueError(f"Invalid component {c}")
+        webcface.canvas_layer.append_components(
+            self._c3data.tmp_components,
+            args,
+            kwargs,
+            "canvas3d_type",
+            webcface.canvas3d_base.Canvas3DComponentType.GEOMETRY,
+        )
         self._modified = True
         return self
 
@@ -273,3 +360,57 @@ class Canvas3D:
         .. deprecated:: ver3.0
         """
         return self.add(geometry, origin=origin, color=color)
+
+
+class Canvas3DLayer(webcface.canvas_layer.CanvasLayerBase):
+    """Canvas3Dのレイヤー (ver3.2〜)
+
+    Canvas3D.layer() で取得する。
+    Canvas3Dと同様にwith構文またはadd()とsync()で内容を設定する。
+    """
+
+    _canvas: Canvas3D
+    _data_type = "c3"
+
+    def __init__(self, canvas: Canvas3D, name: str) -> None:
+        super().__init__(canvas, name)
+
+    def add(
+        self,
+        *args: Union[
+            "webcface.temporal_component.TemporalComponent",
+            "webcface.geometries.Geometry3D",
+        ],
+        **kwargs,
+    ) -> "Canvas3DLayer":
+        """要素を追加
+
+        引数は Canvas3D.add() と同じ
+        """
+        assert len(args) > 0, "no components given to Canvas3DLayer.add()"
+        webcface.canvas_layer.append_components(
+            self._tmp_components,
+            args,
+            kwargs,
+            "canvas3d_type",
+            webcface.canvas3d_base.Canvas3DComponentType.GEOMETRY,
+        )
+        self._modified = True
+        return self
+
+    def _component_type(
+        self, c: "webcface.temporal_component.TemporalComponent"
+    ) -> int:
+        return c._canvas3d_type
+
+    def _to_component(self, c: "webcface.temporal_component.TemporalComponent"):
+        return c.to_canvas3d()
+
+    def _store(self, data: "webcface.client_data.ClientData"):
+        return data.canvas3d_store
+
+    def _on_change(self, data: "webcface.client_data.ClientData") -> dict:
+        return data.on_canvas3d_change
+
+    def _new_data(self, prev: Optional[Canvas3DData]) -> Canvas3DData:
+        return Canvas3DData()
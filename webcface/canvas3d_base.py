@@ -1,5 +1,6 @@
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Union
 from enum import IntEnum
+import array
 
 
 class Canvas3DComponentType(IntEnum):
@@ -13,10 +14,12 @@ class Canvas3DComponentBase:
     _origin_rot: List[float]
     _color: int
     _geometry_type: Optional[int]
-    _geometry_properties: List[float]
+    # (ver3.2〜) 受信したデータやnumpy配列から作成したPolygonではarray.array
+    _geometry_properties: "Union[List[float], array.array]"
     _field_member: Optional[str]
     _field_field: Optional[str]
     _angles: Dict[str, float]
+    _msg: Optional[dict]
 
     def __init__(
         self,
@@ -25,7 +28,7 @@ class Canvas3DComponentBase:
         origin_rot: Optional[List[float]] = None,
         color: int = 0,
         geometry_type: Optional[int] = None,
-        geometry_properties: Optional[List[float]] = None,
+        geometry_properties: "Optional[Union[List[float], array.array]]" = None,
         field_member: Optional[str] = None,
         field_field: Optional[str] = None,
         angles: Optional[Dict[str, float]] = None,
@@ -39,6 +42,7 @@ class Canvas3DComponentBase:
         self._field_member = field_member
         self._field_field = field_field
         self._angles = angles or {}
+        self._msg = None
 
     def __eq__(self, other: object) -> bool:
         return (
@@ -0,0 +1,169 @@
+from typing import List, Dict, Set, Sequence, Union, Any
+import abc
+import webcface.temporal_component
+import webcface.geometries
+import webcface.client_data
+
+
+def append_components(
+    tmp_components: "List[webcface.temporal_component.TemporalComponent]",
+    args: Sequence[
+        Union[
+            "webcface.temporal_component.TemporalComponent",
+            "webcface.geometries.Geometry",
+        ]
+    ],
+    kwargs: dict,
+    type_key: str,
+    geometry_type: int,
+) -> None:
+    """Canvas2D, Canvas3Dとそのレイヤーのadd()の引数をtmp_componentsに追加する
+
+    :arg type_key: Geometryを要素にするときに種類を渡すTemporalComponentの引数名
+        ("canvas2d_type" または "canvas3d_type")
+    :arg geometry_type: type_keyに渡すGEOMETRYの値
+    """
+    for c in args:
+        if isinstance(c, webcface.temporal_component.TemporalComponent):
+            if len(kwargs) > 0:
+                raise ValueError(
+                    f"kwargs is not allowed because {c} is already a component"
+                )
+            tmp_components.append(c)
+        elif isinstance(c, webcface.geometries.Geometry):
+            tmp_components.append(
+                webcface.temporal_component.TemporalComponent(
+                    **{type_key: geometry_type},
+                    geometry=c,
+                    **kwargs,
+                )
+            )
+        else:
+            raise ValueError(f"Invalid component {c}")
+
+
+class CanvasLayerBase(abc.ABC):
+    """Canvas2DLayer, Canvas3DLayerの共通部分 (ver3.2〜)
+
+    サブクラスで送信するデータの種類ごとの処理 (abstractmethod) を実装する。
+    """
+
+    _canvas: Any
+    _name: str
+    _tmp_components: "List[webcface.temporal_component.TemporalComponent]"
+    _modified: bool
+    # lock_tmp()に渡すデータの種類 ("c2" または "c3")
+    _data_type: str = ""
+
+    def __init__(self, canvas: Any, name: str) -> None:
+        self._canvas = canvas
+        self._name = name
+        self._tmp_components = []
+        self._modified = False
+
+    @property
+    def name(self) -> str:
+        """レイヤーの名前"""
+        return self._name
+
+    def __enter__(self):
+        """with構文の最初でinit"""
+        self.init()
+        return self
+
+    def init(self):
+        """このレイヤーにaddした内容を初期化する"""
+        self._tmp_components = []
+        self._modified = True
+        return self
+
+    def __exit__(self, type, value, tb) -> None:
+        """with構文の終わりに自動でsync()を呼ぶ"""
+        self.sync()
+
+    @abc.abstractmethod
+    def _component_type(
+        self, c: "webcface.temporal_component.TemporalComponent"
+    ) -> int:
+        """要素の種類 (idの番号付けに使う)"""
+
+    @abc.abstractmethod
+    def _to_component(self, c: "webcface.temporal_component.TemporalComponent"):
+        """lock_tmp()したTemporalComponentを送信する要素に変換する"""
+
+    @abc.abstractmethod
+    def _store(
+        self, data: "webcface.client_data.ClientData"
+    ) -> "webcface.client_data.SyncDataStore2":
+        """データを送信するstore"""
+
+    @abc.abstractmethod
+    def _on_change(self, data: "webcface.client_data.ClientData") -> dict:
+        """on_changeのコールバックのdict"""
+
+    @abc.abstractmethod
+    def _new_data(self, prev):
+        """送信するデータを作成する (prevは前回のデータまたはNone)"""
+
+    def _same_canvas(self, prev, new_data) -> bool:
+        """要素以外 (サイズなど) が前回と同じかどうか"""
+        return True
+
+    def sync(self):
+        """レイヤーの内容をCanvasに反映し送信可能にする
+
+        前回syncしたときとレイヤーの内容が同じ場合は何もしない。
+        """
+        base = self._canvas._base
+        data = base._set_check()
+        if not self._modified:
+            return self
+        self._modified = False
+        prefix = f"..{self._name}" if self._name != "" else ""
+        ids: List[str] = []
+        components: Dict[str, Any] = {}
+        data_idx: Dict[int, int] = {}
+        for c in self._tmp_components:
+            c_type = self._component_type(c)
+            idx = data_idx.get(c_type, 0)
+            data_idx[c_type] = idx + 1
+            c.lock_tmp(data, self._data_type, base._field, f"{prefix}..{c_type}.{idx}")
+            components[c.id] = self._to_component(c)
+            ids.append(c.id)
+        store = self._store(data)
+        with store.lock:
+            prev = store.get_recv(base._member, base._field)
+            new_data = self._new_data(prev)
+            layers: Dict[str, List[str]] = {}
+            dirty: Set[str] = set()
+            if prev is not None:
+                layers = dict(prev.layers) if prev.layers else {"": prev.ids}
+                for i, c_new in components.items():
+                    c_prev = prev.components.get(i)
+                    if c_prev is not None and c_prev == c_new:
+                        # 送信済みの要素を使いまわす
+                        components[i] = c_prev
+                    else:
+                        dirty.add(i)
+                if (
+                    len(dirty) == 0
+                    and layers.get(self._name) == ids
+                    and self._same_canvas(prev, new_data)
+                ):
+                    return self
+            layers[self._name] = ids
+            new_data.layers = layers
+            new_data.ids = [i for l_ids in layers.values() for i in l_ids]
+            # どのレイヤーにも含まれなくなった要素は残さない
+            new_data.components = {
+                i: components[i] if i in components else prev.components[i]
+                for i in new_data.ids
+            }
+            if prev is not None:
+                store.set_send_dirty(base._field, prev, new_data, dirty)
+            else:
+                store.set_send(base._field, new_data)
+        on_change = self._on_change(data).get(base._member, {}).get(base._field)
+        if on_change is not None:
+            on_change(self._canvas)
+        return self
@@ -1,7 +1,7 @@
 import threading
 import multiprocessing
 import time
-from typing import Optional, Iterable, Callable
+from typing import Optional, Iterable, Callable, Dict
 import logging
 import io
 import os
@@ -24,6 +24,8 @@ class Client(webcface.member.Member):
     :arg port: サーバーのポート
     :arg auto_reconnect: (ver2.0〜) 通信が切断された時に自動で再接続する。(デフォルト: True)
     :arg auto_sync: (ver2.1〜) 指定した間隔(秒)ごとに別スレッドで自動的に sync() をする (デフォルト: None (syncしない))
+    :arg idle_unrequest: (ver3.2〜) 指定した時間(秒)以上読まれていないデータのリクエストを sync() 時に自動で解除する
+        (デフォルト: None (解除しない))。on_change() などのコールバックが設定されているものは対象外
     """
 
     _ws: Optional[websocket.WebSocketApp]
@@ -40,6 +42,7 @@ class Client(webcface.member.Member):
         port: int = 7530,
         auto_reconnect: bool = True,
         auto_sync: Optional[float] = None,
+        idle_unrequest: Optional[float] = None,
     ) -> None:
         logger = logging.getLogger(f"webcface_internal({name})")
         handler = logging.StreamHandler()
@@ -63,6 +66,7 @@ class Client(webcface.member.Member):
         self._closing = False
 
         data = self._data_check()
+        data.idle_unrequest = idle_unrequest
 
         def on_open(ws):
             data.logger_internal.info("WebSocket Open")
@@ -166,6 +170,8 @@ class Client(webcface.member.Member):
                 self._data_check().wait_empty(timeout=1)
             if self._ws is not None:
                 self._ws.close()
+            if self._data_check().image_encode_pool is not None:
+                self._data_check().image_encode_pool.shutdown(wait=False)
 
     def start(self) -> None:
         """サーバーに接続を開始する"""
@@ -230,6 +236,8 @@ class Client(webcface.member.Member):
         if auto_start:
             self.start()
         data = self._data_check()
+        if data.idle_unrequest is not None:
+            webcface.client_impl.unrequest_idle(data, data.idle_unrequest)
         if data._msg_first:
             data.queue_msg_always(webcface.client_impl.sync_data(data, False))
         else:
@@ -282,6 +290,37 @@ class Client(webcface.member.Member):
         self._data_check().on_member_entry = func
         return func
 
+    def set_recv_limit(
+        self,
+        kind: str,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ) -> None:
+        """他のメンバーから受信したデータを保持する量の上限を設定する (ver3.2〜)
+
+        * kindには "value", "text", "image", "view", "canvas2d", "canvas3d", "log" のいずれかを指定する。
+        * 個数またはバイト数が上限を超えると、リクエストされていないデータを古い順に、
+          それでも足りなければ最後に読まれたのが古い順にリクエストを解除 (unrequest) して削除する。
+        * on_change() などのコールバックが設定されているものは削除しない。
+        * バイト数は value, text, image 以外では概算になる。
+        * Noneにすると上限なし (デフォルト)
+
+        :arg max_entries: 保持するフィールドの数の上限
+        :arg max_bytes: 保持するデータのバイト数の上限
+        """
+        self._data_check().recv_store(kind).set_recv_limit(max_entries, max_bytes)
+
+    def recv_memory_stats(self) -> Dict[str, Dict[str, int]]:
+        """他のメンバーから受信して保持しているデータの量を返す (ver3.2〜)
+
+        :return: {"value": {"entries": 個数, "bytes": 概算のバイト数}, ...} の形式
+        """
+        ret: Dict[str, Dict[str, int]] = {}
+        for kind in webcface.client_data.RECV_KINDS:
+            entries, size = self._data_check().recv_store(kind).get_recv_stats()
+            ret[kind] = {"entries": entries, "bytes": size}
+        return ret
+
     @property
     def logging_handler(self) -> logging.Handler:
         """webcfaceに出力するloggingのHandler
@@ -1,5 +1,19 @@
-from typing import TypeVar, Generic, Dict, Tuple, Optional, Callable, List, Union
+from typing import (
+    TypeVar,
+    Generic,
+    Dict,
+    Tuple,
+    Optional,
+    Callable,
+    List,
+    Union,
+    Set,
+)
 import threading
+import concurrent.futures
+import time
+import collections
+import array
 import datetime
 import logging
 import webcface.field
@@ -9,30 +23,193 @@ import webcface.log_handler
 import webcface.canvas2d_base
 import webcface.canvas3d_base
 import webcface.image_frame
+import webcface.value_history
 
 T = TypeVar("T")
 R = TypeVar("R")
 
 
+class FieldEntryNode:
+    """FieldEntryIndexの1つのノード
+
+    children: 名前をピリオドで区切った次の要素ごとの子ノード
+    kinds: このノードの名前そのものにエントリーが存在するstore
+    count: このノード以下(このノードを含む)にあるstoreごとのエントリー数
+    """
+
+    children: "Dict[str, FieldEntryNode]"
+    kinds: Set[object]
+    count: Dict[object, int]
+
+    def __init__(self) -> None:
+        self.children = {}
+        self.kinds = set()
+        self.count = {}
+
+    def has(self, kind: Optional[object]) -> bool:
+        if kind is None:
+            return len(self.count) > 0
+        return kind in self.count
+
+
+class FieldEntryIndex:
+    """メンバーごとのエントリーをフィールド名のピリオド区切りで木構造にしたもの
+
+    各SyncDataStore2で共有され、
+    children() や *_entries() を出力の数に比例する時間で列挙するのに使う。
+    storeの区別にはstoreのオブジェクト自体をkindとして使う。
+    """
+
+    root: Dict[str, FieldEntryNode]
+    lock: threading.RLock
+
+    def __init__(self) -> None:
+        self.root = {}
+        self.lock = threading.RLock()
+
+    def add(self, member: str, field: str, kind: object) -> None:
+        with self.lock:
+            if member not in self.root:
+                self.root[member] = FieldEntryNode()
+            path = [self.root[member]]
+            for s in field.split("."):
+                if s not in path[-1].children:
+                    path[-1].children[s] = FieldEntryNode()
+                path.append(path[-1].children[s])
+            if kind in path[-1].kinds:
+                return
+            path[-1].kinds.add(kind)
+            for n in path:
+                n.count[kind] = n.count.get(kind, 0) + 1
+
+    def remove_kind(self, member: str, kind: object) -> None:
+        """memberのkindのエントリーをすべて削除する"""
+        with self.lock:
+            node = self.root.get(member)
+            if node is not None:
+                self._remove_kind(node, kind)
+
+    def _remove_kind(self, node: FieldEntryNode, kind: object) -> None:
+        if kind not in node.count:
+            return
+        del node.count[kind]
+        node.kinds.discard(kind)
+        for s, c in list(node.children.items()):
+            self._remove_kind(c, kind)
+            if len(c.count) == 0:
+                del node.children[s]
+
+    def _find(self, member: str, field: str) -> Optional[FieldEntryNode]:
+        node = self.root.get(member)
+        if node is None or field == "":
+            return node
+        for s in field.split("."):
+            node = node.children.get(s)
+            if node is None:
+                return None
+        return node
+
+    def has_children(self, member: str, field: str, kind: Optional[object]) -> bool:
+        """「field.」で始まるエントリーが存在するか (fieldが空文字列の場合はすべて)"""
+        with self.lock:
+            node = self._find(member, field)
+            if node is None:
+                return False
+            return any(c.has(kind) for c in node.children.values())
+
+    def children(
+        self, member: str, field: str, kind: Optional[object], recurse: bool
+    ) -> List[str]:
+        """「field.」で始まるエントリーの名前を列挙する (fieldが空文字列の場合はすべて)
+
+        * kindがNoneの場合はすべてのstoreのエントリーを対象にする。
+        * recurseがFalseの場合は「field.」の次のピリオドの前までの名前を重複なしで返す。
+        """
+        with self.lock:
+            node = self._find(member, field)
+            ret: List[str] = []
+            if node is not None:
+                prefix_with_sep = field + "." if field != "" else ""
+                self._children(node, prefix_with_sep, kind, recurse, ret)
+            return ret
+
+    def _children(
+        self,
+        node: FieldEntryNode,
+        prefix_with_sep: str,
+        kind: Optional[object],
+        recurse: bool,
+        ret: List[str],
+    ) -> None:
+        for s, c in node.children.items():
+            if not c.has(kind):
+                continue
+            if not recurse:
+                ret.append(prefix_with_sep + s)
+                continue
+            if (kind is None and len(c.kinds) > 0) or kind in c.kinds:
+                ret.append(prefix_with_sep + s)
+            self._children(c, prefix_with_sep + s + ".", kind, recurse, ret)
+
+
 class SyncDataStore2(Generic[T, R]):
     self_member_name: str
     data_send: Dict[str, T]
     data_send_prev: Dict[str, T]
     data_recv: Dict[str, Dict[str, T]]
-    entry: Dict[str, List[str]]
+    entry: Dict[str, Dict[str, None]]
+    entry_snapshot: Dict[str, Tuple[str, ...]]
+    members_snapshot: Tuple[str, ...]
     req: Dict[str, Dict[str, int]]
     req_info: Dict[str, Dict[str, R]]
+    req_id_max: int
+    req_rev: Dict[int, Tuple[str, str]]
+    req_prefix: Dict[str, Dict[str, bool]]
+    req_inactive: Dict[str, Dict[str, int]]
+    req_last_read: Dict[str, Dict[str, float]]
+    recv_limit_entries: Optional[int]
+    recv_limit_bytes: Optional[int]
+    recv_sizeof: Callable[[T], int]
+    recv_keep: Callable[[str, str], bool]
+    recv_release: Callable[[T], None]
+    recv_lru: "collections.OrderedDict[Tuple[str, str], int]"
+    recv_unreq: "collections.OrderedDict[Tuple[str, str], None]"
+    recv_touched: Dict[Tuple[str, str], None]
+    recv_bytes: int
     lock: threading.RLock
     should_send: Callable
+    entry_index: FieldEntryIndex
 
-    def __init__(self, name: str, should_send: Optional[Callable] = None) -> None:
+    def __init__(
+        self,
+        name: str,
+        should_send: Optional[Callable] = None,
+        entry_index: Optional[FieldEntryIndex] = None,
+    ) -> None:
         self.self_member_name = name
+        self.entry_index = entry_index or FieldEntryIndex()
         self.data_send = {}
         self.data_send_prev = {}
         self.data_recv = {}
         self.entry = {}
+        self.entry_snapshot = {}
+        self.members_snapshot = ()
         self.req = {}
         self.req_info = {}
+        self.req_id_max = 0
+        self.req_rev = {}
+        self.req_prefix = {}
+        self.req_inactive = {}
+        self.req_last_read = {}
+        self.recv_limit_entries = None
+        self.recv_limit_bytes = None
+        self.recv_sizeof = lambda d: 0
+        self.recv_keep = lambda member, field: False
+        self.recv_release = lambda d: None
+        self.recv_lru = collections.OrderedDict()
+        self.recv_unreq = collections.OrderedDict()
+        self.recv_touched = {}
+        self.recv_bytes = 0
         self.lock = threading.RLock()
         self.should_send = should_send or SyncDataStore2.should_send_always
 
@@ -63,22 +240,179 @@ class SyncDataStore2(Generic[T, R]):
                 self.data_send[field] = data
             self.set_recv(self.self_member_name, field, data)
 
+    def set_send_dirty(self, field: str, prev: T, data: T, ids: Set[str]) -> None:
+        """prevの要素idsだけを変更したdataをセットする (ver3.2〜)
+
+        View, Canvasのデータ用。
+        dataのbaseとdirtyに前回送信したデータと変更した要素のidをセットし、
+        sync_dataでは全要素を比較せずdirtyの要素だけを送信できるようにする。
+        """
+        with self.lock:
+            if self.data_send.get(field) is prev:
+                # prevはまだ送信されていないので、prevの差分情報を引き継ぐ
+                if prev.dirty is None:
+                    data.base = None
+                    data.dirty = None
+                else:
+                    data.base = prev.base
+                    # 削除された要素は送信しない
+                    data.dirty = {i for i in prev.dirty | ids if i in data.components}
+            else:
+                data.base = prev
+                data.dirty = set(ids)
+            self.set_send(field, data)
+
+    def set_send_many(self, data: Dict[str, T]) -> None:
+        with self.lock:
+            recv = self.data_recv.setdefault(self.self_member_name, {})
+            for field, d in data.items():
+                if self.should_send(recv.get(field), d):
+                    self.data_send[field] = d
+                recv[field] = d
+
     def set_recv(self, member: str, field: str, data: T) -> None:
         with self.lock:
             if member not in self.data_recv:
                 self.data_recv[member] = {}
+            prev = self.data_recv[member].get(field)
             self.data_recv[member][field] = data
+            if prev is not None and prev is not data:
+                self.recv_release(prev)
+            if not self.is_self(member):
+                key = (member, field)
+                self._apply_recv_touched()
+                self.recv_bytes -= self.recv_lru.pop(key, 0)
+                size = self.recv_sizeof(data)
+                self.recv_lru[key] = size
+                self.recv_bytes += size
+                if self._is_requested(member, field):
+                    self.recv_unreq.pop(key, None)
+                else:
+                    self.recv_unreq[key] = None
+                    self.recv_unreq.move_to_end(key)
+                self._evict_recv(key)
+
+    def _is_requested(self, member: str, field: str) -> bool:
+        """fieldまたはその親のfieldがリクエストされているかどうか"""
+        req = self.req.get(member, {})
+        if req.get(field, 0) > 0:
+            return True
+        i = field.rfind(".")
+        while i >= 0:
+            if req.get(field[:i], 0) > 0:
+                return True
+            i = field.rfind(".", 0, i)
+        return self.match_req_prefix(member, field)
+
+    def _touch_recv(self, member: str, field: str) -> None:
+        """受信データが読まれたことを記録する
+
+        読み出し側はロックを取らないので、ここではdictに記録するだけにして
+        recv_lruへの反映はロックを取っている書き込み側で行う
+        """
+        self.recv_touched[(member, field)] = None
+
+    def _apply_recv_touched(self) -> None:
+        while len(self.recv_touched) > 0:
+            try:
+                key, _ = self.recv_touched.popitem()
+            except KeyError:
+                break
+            if key in self.recv_lru:
+                self.recv_lru.move_to_end(key)
+
+    def _drop_recv(self, member: str, field: str) -> None:
+        """受信したデータを削除し、recv_releaseを呼ぶ"""
+        prev = self.data_recv.get(member, {}).pop(field, None)
+        if prev is not None:
+            self.recv_release(prev)
+        self._forget_recv(member, field)
+
+    def _forget_recv(self, member: str, field: str) -> None:
+        self.recv_bytes -= self.recv_lru.pop((member, field), 0)
+        self.recv_unreq.pop((member, field), None)
+
+    def _over_recv_limit(self, entries: int, size: int) -> bool:
+        return (
+            self.recv_limit_entries is not None and entries > self.recv_limit_entries
+        ) or (self.recv_limit_bytes is not None and size > self.recv_limit_bytes)
+
+    def _evict_recv(self, keep: Optional[Tuple[str, str]] = None) -> None:
+        """受信データが上限を超えていたら古いものから削除する
+
+        リクエストされていないデータを受信した順に削除し、
+        それでも足りなければリクエスト中のものを最後に読まれたか受信した順にunset_reqする。
+        recv_keepがTrueを返すものと、いま受信したkeepは削除しない。
+        親のfieldがリクエストされているものはリクエスト中として扱う。
+        """
+        if not self._over_recv_limit(len(self.recv_lru), self.recv_bytes):
+            return
+        while len(self.recv_unreq) > 0 and self._over_recv_limit(
+            len(self.recv_lru), self.recv_bytes
+        ):
+            key, _ = self.recv_unreq.popitem(last=False)
+            if key == keep:
+                # keepは最後に追加されているので、残りはkeepだけ
+                self.recv_unreq[key] = None
+                break
+            self._drop_recv(key[0], key[1])
+        self._apply_recv_touched()
+        entries = len(self.recv_lru)
+        size = self.recv_bytes
+        victims: List[Tuple[str, str]] = []
+        for key, key_size in self.recv_lru.items():
+            if not self._over_recv_limit(entries, size):
+                break
+            if key == keep or self.recv_keep(key[0], key[1]):
+                continue
+            victims.append(key)
+            entries -= 1
+            size -= key_size
+        for member, field in victims:
+            if not self.unset_req(member, field):
+                # 親のfieldのリクエストで受信したデータ
+                self._drop_recv(member, field)
+
+    def set_recv_limit(
+        self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None
+    ) -> None:
+        with self.lock:
+            self.recv_limit_entries = max_entries
+            self.recv_limit_bytes = max_bytes
+            self._evict_recv()
+
+    def get_recv_stats(self) -> Tuple[int, int]:
+        """自分以外のメンバーから受信したデータの (個数, 概算のバイト数)"""
+        with self.lock:
+            return (len(self.recv_lru), self.recv_bytes)
 
     def add_req(self, member: str, field: str, req_data: Optional[R] = None) -> int:
+        if self.is_self(member):
+            return 0
+        if req_data is None and self.req.get(member, {}).get(field, 0) > 0:
+            # リクエスト済みの場合 (毎回のget()で呼ばれる) はロックを取らない
+            last_read = self.req_last_read.get(member)
+            if last_read is not None:
+                last_read[field] = time.monotonic()
+                self._touch_recv(member, field)
+                return 0
         with self.lock:
+            if not self.is_self(member):
+                if member not in self.req_last_read:
+                    self.req_last_read[member] = {}
+                self.req_last_read[member][field] = time.monotonic()
+                self._touch_recv(member, field)
             if not self.is_self(member) and self.req.get(member, {}).get(field, 0) == 0:
-                max_req = 0
-                for r in self.req.values():
-                    max_req = max(max_req, max(r.values()))
-                new_req = max_req + 1
+                # unset_req()したものは同じreq_idを使いまわす
+                new_req = self.req_inactive.get(member, {}).pop(field, 0)
+                if new_req == 0:
+                    self.req_id_max += 1
+                    new_req = self.req_id_max
                 if member not in self.req:
                     self.req[member] = {}
                 self.req[member][field] = new_req
+                self.req_rev[new_req] = (member, field)
+                self._cover_recv_unreq(member, field)
                 if req_data is not None:
                     if member not in self.req_info:
                         self.req_info[member] = {}
@@ -95,42 +429,116 @@ class SyncDataStore2(Generic[T, R]):
                 return self.req[member][field]
             return 0
 
+    def _cover_recv_unreq(self, member: str, field: str) -> None:
+        """新しくリクエストしたfieldとその子のfieldをrecv_unreqから外す"""
+        prefix = field + "."
+        for key in [
+            k
+            for k in self.recv_unreq
+            if k[0] == member and (k[1] == field or k[1].startswith(prefix))
+        ]:
+            del self.recv_unreq[key]
+
+    # 以下の読み出しはロックを取らない。
+    # 書き込みはすべてlockを取った上でdictの要素単位で行うので、
+    # dictの1回の参照はGILによりアトミックになり、on_recvやsync_dataの処理中でもブロックしない。
+    # 複数のフィールドを一貫した状態で読むには Field.snapshot() を使う。
+
     def get_req_info(self, member: str, field: str) -> Optional[R]:
-        with self.lock:
-            return self.req_info.get(member, {}).get(field)
+        return self.req_info.get(member, {}).get(field)
 
     def get_recv(self, member: str, field: str) -> Optional[T]:
-        with self.lock:
-            d = self.data_recv.get(member, {}).get(field)
-            return d
+        return self.data_recv.get(member, {}).get(field)
 
     def unset_recv(self, member: str, field: str) -> bool:
         with self.lock:
-            if self.data_recv.get(member, {}).get(field) is not None:
-                del self.data_recv[member][field]
+            self._drop_recv(member, field)
             if not self.is_self(member) and self.req.get(member, {}).get(field, 0) > 0:
                 self.req[member][field] = 0
                 return True
             return False
 
-    def get_members(self) -> List[str]:
+    def unset_req(self, member: str, field: str) -> bool:
+        """リクエストを解除し、受信したデータを削除する
+
+        req_idは次にadd_req()されたときのために保持しておく。
+        解除した後に受信したデータは get_req() で ("", "") になる。
+
+        (ver3.2〜) 各フィールドの unrequest() から呼ばれる。
+        プロトコルにリクエストを取り消すメッセージがないため、
+        サーバーからの送信はサーバーに再接続するまで止まらない。
+        """
         with self.lock:
-            return list(self.entry.keys())
+            req_id = self.req.get(member, {}).get(field, 0)
+            if self.is_self(member) or req_id == 0:
+                return False
+            del self.req[member][field]
+            if member not in self.req_inactive:
+                self.req_inactive[member] = {}
+            self.req_inactive[member][field] = req_id
+            self.req_info.get(member, {}).pop(field, None)
+            self.req_last_read.get(member, {}).pop(field, None)
+            self._drop_recv(member, field)
+            return True
 
-    def get_entry(self, member: str) -> List[str]:
+    def get_idle_req(self, before: float) -> List[Tuple[str, str]]:
+        """time.monotonic() が before より前から読まれていないリクエストを列挙する
+
+        add_req_prefix() の範囲に含まれるものは解除してもすぐ再度リクエストされるので除く
+        """
         with self.lock:
-            return self.entry.get(member, [])
+            ret: List[Tuple[str, str]] = []
+            for member, r in self.req.items():
+                last_read = self.req_last_read.get(member, {})
+                for field, req_id in r.items():
+                    if (
+                        req_id > 0
+                        and last_read.get(field, 0.0) < before
+                        and not self.match_req_prefix(member, field)
+                    ):
+                        ret.append((member, field))
+            return ret
+
+    def get_members(self) -> List[str]:
+        return list(self.members_snapshot)
+
+    def get_entry(self, member: str) -> List[str]:
+        """memberのエントリーの一覧
+
+        (ver3.2〜) エントリーが変わるまではtupleのスナップショットを返すのでロックを取らない。
+        変更後最初の呼び出しでだけロックを取ってスナップショットを作り直す。
+        """
+        snapshot = self.entry_snapshot.get(member)
+        if snapshot is None:
+            with self.lock:
+                snapshot = tuple(self.entry.get(member, {}))
+                self.entry_snapshot[member] = snapshot
+        return list(snapshot)
+
+    def has_entry(self, member: str, field: str) -> bool:
+        return field in self.entry.get(member, {})
 
     def init_member(self, member: str) -> None:
         with self.lock:
-            self.entry[member] = []
+            if member not in self.entry:
+                self.members_snapshot = self.members_snapshot + (member,)
+            self.entry[member] = {}
+            self.entry_snapshot[member] = ()
+            for field in list(self.data_recv.get(member, {})):
+                self._drop_recv(member, field)
             self.data_recv[member] = {}
+            self.entry_index.remove_kind(member, self)
 
     def set_entry(self, member: str, field: str) -> None:
         with self.lock:
             if member not in self.entry:
-                self.entry[member] = []
-            self.entry[member].append(field)
+                self.entry[member] = {}
+                self.members_snapshot = self.members_snapshot + (member,)
+            if field not in self.entry[member]:
+                self.entry[member][field] = None
+                # 次のget_entry()で作り直す
+                self.entry_snapshot.pop(member, None)
+                self.entry_index.add(member, field, self)
 
     def transfer_send(self, is_first: bool) -> Dict[str, T]:
         with self.lock:
@@ -166,14 +574,43 @@ class SyncDataStore2(Generic[T, R]):
 
     def get_req(self, i: int, sub_field: str) -> Tuple[str, str]:
         with self.lock:
-            for rm, r in self.req.items():
-                for rf, ri in r.items():
-                    if ri == i:
-                        if sub_field != "":
-                            return (rm, rf + "." + sub_field)
-                        else:
-                            return (rm, rf)
-            return ("", "")
+            r = self.req_rev.get(i)
+            if r is None or self.req.get(r[0], {}).get(r[1], 0) != i:
+                return ("", "")
+            if sub_field != "":
+                return (r[0], r[1] + "." + sub_field)
+            else:
+                return r
+
+    def add_req_prefix(self, member: str, field: str, recurse: bool) -> None:
+        """「field.」で始まるエントリーを自動でリクエストするようにする
+
+        fieldが空文字列の場合はすべて、
+        recurseがFalseの場合は「field.」の後にピリオドを含まないもののみ対象にする。
+        """
+        with self.lock:
+            if member not in self.req_prefix:
+                self.req_prefix[member] = {}
+            self.req_prefix[member][field] = (
+                self.req_prefix[member].get(field, False) or recurse
+            )
+
+    def match_req_prefix(self, member: str, field: str) -> bool:
+        """fieldが add_req_prefix() で指定されたいずれかの範囲に含まれるか"""
+        with self.lock:
+            prefixes = self.req_prefix.get(member)
+            if not prefixes:
+                return False
+            recurse = prefixes.get("")
+            if recurse is not None and (recurse or "." not in field):
+                return True
+            p = field.find(".")
+            while p >= 0:
+                recurse = prefixes.get(field[:p])
+                if recurse is not None and (recurse or field.find(".", p + 1) < 0):
+                    return True
+                p = field.find(".", p + 1)
+            return False
 
 
 class SyncDataStore1(Generic[T]):
@@ -272,9 +709,13 @@ class FuncResultStore:
                 self.results[caller_id] = None
 
 
+RECV_KINDS = ("value", "text", "image", "view", "canvas2d", "canvas3d", "log")
+
+
 class ClientData:
     self_member_name: str
-    value_store: SyncDataStore2[List[float], None]
+    entry_index: FieldEntryIndex
+    value_store: "SyncDataStore2[Union[List[float], array.array], None]"
     text_store: SyncDataStore2[Union[float, bool, str], None]
     image_store: (
         "SyncDataStore2[webcface.image_frame.ImageFrame, webcface.image_frame.ImageReq]"
@@ -307,6 +748,18 @@ class ClientData:
     self_member_id: Optional[int]
     sync_init_end: bool
     auto_reconnect: bool
+    idle_unrequest: Optional[float]
+    image_encode_pool: Optional[concurrent.futures.ThreadPoolExecutor]
+    image_encode_seq: Dict[str, int]
+    image_encode_lock: threading.Lock
+    image_max_fps: Dict[str, float]
+    image_last_send: Dict[str, float]
+    image_skip_same: Set[str]
+    image_pending_digest: Dict[str, int]
+    image_sent_digest: Dict[str, int]
+    image_buffer_pool: "Dict[str, Dict[str, webcface.image_frame.ImageBufferPool]]"
+    image_self_req: "Dict[str, webcface.image_frame.ImageReq]"
+    func_tmp_keys: Dict[str, object]
     on_member_entry: Optional[Callable]
     on_ping: Dict[str, Callable]
     on_value_entry: Dict[str, Callable]
@@ -319,6 +772,7 @@ class ClientData:
     on_log_entry: Dict[str, Callable]
     on_sync: Dict[str, Callable]
     on_value_change: Dict[str, Dict[str, Callable]]
+    value_history: "Dict[str, Dict[str, webcface.value_history.ValueHistory]]"
     on_text_change: Dict[str, Dict[str, Callable]]
     on_image_change: Dict[str, Dict[str, Callable]]
     on_view_change: Dict[str, Dict[str, Callable]]
@@ -330,22 +784,53 @@ class ClientData:
         self, name: str, logger_internal: logging.Logger, auto_reconnect: bool
     ) -> None:
         self.self_member_name = name
-        self.value_store = SyncDataStore2[List[float], None](
-            name, SyncDataStore2.should_send_on_change
+        self.entry_index = FieldEntryIndex()
+        self.value_store = SyncDataStore2[Union[List[float], array.array], None](
+            name, SyncDataStore2.should_send_on_change, self.entry_index
         )
         self.text_store = SyncDataStore2[Union[float, bool, str], None](
-            name, SyncDataStore2.should_send_on_change
+            name, SyncDataStore2.should_send_on_change, self.entry_index
         )
         self.image_store = SyncDataStore2[
             webcface.image_frame.ImageFrame, webcface.image_frame.ImageReq
-        ](name)
+        ](name, None, self.entry_index)
         self.func_store = SyncDataStore2[webcface.func_info.FuncInfo, None](
-            name, SyncDataStore2.should_not_send_twice
+            name, SyncDataStore2.should_not_send_twice, self.entry_index
+        )
+        self.view_store = SyncDataStore2[webcface.view.ViewData, None](
+            name, None, self.entry_index
+        )
+        self.canvas2d_store = SyncDataStore2[webcface.canvas2d.Canvas2DData, None](
+            name, None, self.entry_index
+        )
+        self.canvas3d_store = SyncDataStore2[webcface.canvas3d.Canvas3DData, None](
+            name, None, self.entry_index
+        )
+        self.log_store = SyncDataStore2[webcface.log_handler.LogData, None](
+            name, None, self.entry_index
+        )
+        self.value_store.recv_sizeof = lambda d: 8 * len(d)
+        self.value_store.recv_keep = lambda m, f: (
+            f in self.on_value_change.get(m, {}) or f in self.value_history.get(m, {})
+        )
+        self.text_store.recv_sizeof = lambda d: len(d) if isinstance(d, str) else 8
+        self.text_store.recv_keep = lambda m, f: f in self.on_text_change.get(m, {})
+        self.image_store.recv_sizeof = lambda d: len(d.buffer)
+        self.image_store.recv_keep = lambda m, f: f in self.on_image_change.get(m, {})
+        self.image_store.recv_release = lambda d: d.release()
+        # view, canvas, logはコンポーネント・行数からの概算
+        self.view_store.recv_sizeof = lambda d: 64 * len(d.components)
+        self.view_store.recv_keep = lambda m, f: f in self.on_view_change.get(m, {})
+        self.canvas2d_store.recv_sizeof = lambda d: 64 * len(d.components)
+        self.canvas2d_store.recv_keep = lambda m, f: (
+            f in self.on_canvas2d_change.get(m, {})
         )
-        self.view_store = SyncDataStore2[webcface.view.ViewData, None](name)
-        self.canvas2d_store = SyncDataStore2[webcface.canvas2d.Canvas2DData, None](name)
-        self.canvas3d_store = SyncDataStore2[webcface.canvas3d.Canvas3DData, None](name)
-        self.log_store = SyncDataStore2[webcface.log_handler.LogData, None](name)
+        self.canvas3d_store.recv_sizeof = lambda d: 64 * len(d.components)
+        self.canvas3d_store.recv_keep = lambda m, f: (
+            f in self.on_canvas3d_change.get(m, {})
+        )
+        self.log_store.recv_sizeof = lambda d: 64 * len(d.data)
+        self.log_store.recv_keep = lambda m, f: m in self.on_log_change
         self.sync_time_store = SyncDataStore1[datetime.datetime](name)
         self.func_result_store = FuncResultStore()
         self.func_listener_handlers = {}
@@ -369,6 +854,18 @@ class ClientData:
         self.self_member_id = None
         self.sync_init_end = False
         self.auto_reconnect = auto_reconnect
+        self.idle_unrequest = None
+        self.image_encode_pool = None
+        self.image_encode_seq = {}
+        self.image_encode_lock = threading.Lock()
+        self.image_max_fps = {}
+        self.image_last_send = {}
+        self.image_skip_same = set()
+        self.image_pending_digest = {}
+        self.image_sent_digest = {}
+        self.image_buffer_pool = {}
+        self.image_self_req = {}
+        self.func_tmp_keys = {}
         self.on_member_entry = None
         self.on_ping = {}
         self.on_value_entry = {}
@@ -381,6 +878,7 @@ class ClientData:
         self.on_log_entry = {}
         self.on_sync = {}
         self.on_value_change = {}
+        self.value_history = {}
         self.on_text_change = {}
         self.on_image_change = {}
         self.on_view_change = {}
@@ -388,6 +886,82 @@ class ClientData:
         self.on_canvas3d_change = {}
         self.on_log_change = {}
 
+    def set_image_send(
+        self,
+        field: str,
+        frame: "webcface.image_frame.ImageFrame",
+        digest: Optional[int],
+    ) -> None:
+        """送信する画像をセットする
+
+        digestは Image.set_skip_same() が有効な場合の元画像のハッシュで、
+        sync_dataで送信したときに image_sent_digest に移される。
+        """
+        with self.image_store.lock:
+            self.image_store.set_send(field, frame)
+            if digest is None:
+                self.image_pending_digest.pop(field, None)
+            else:
+                self.image_pending_digest[field] = digest
+
+    def encode_image(
+        self,
+        field: str,
+        frame: "webcface.image_frame.ImageFrame",
+        compress_mode: int,
+        quality: Optional[int],
+        digest: Optional[int] = None,
+    ) -> concurrent.futures.Future:
+        """画像の圧縮をスレッドプールで行い、完了したらimage_storeにセットする
+
+        * 同じfieldで後からencode_imageされたものが先に完了した場合、古いほうは破棄する。
+        * エンコーダーがない場合はRAWのまま送信する。
+        * 呼び出し元がバッファを使いまわせるよう、frameのデータはここでコピーする。
+        * digestは set_image_send() に渡す。
+        * close()後でスレッドプールが使えない場合は呼び出したスレッドで圧縮する。
+        """
+        if not isinstance(frame._data, bytes):
+            frame = webcface.image_frame.ImageFrame(
+                frame.width,
+                frame.height,
+                frame.data,
+                frame.color_mode,
+                frame.compress_mode,
+            )
+        with self.image_encode_lock:
+            if self.image_encode_pool is None:
+                self.image_encode_pool = concurrent.futures.ThreadPoolExecutor(
+                    thread_name_prefix="webcface_image_encode"
+                )
+            seq = self.image_encode_seq.get(field, 0) + 1
+            self.image_encode_seq[field] = seq
+            pool = self.image_encode_pool
+
+        def encode() -> None:
+            try:
+                encoded = frame.encode(compress_mode, quality)
+            except ModuleNotFoundError:
+                self.logger_internal.warning(
+                    "Neither cv2 nor PIL is available, sending image without compression"
+                )
+                encoded = frame
+            except Exception as e:
+                self.logger_internal.error(f"error encoding image {field}: {e}")
+                return
+            with self.image_encode_lock:
+                if self.image_encode_seq.get(field) != seq:
+                    return
+                self.set_image_send(field, encoded, digest)
+
+        try:
+            return pool.submit(encode)
+        except RuntimeError:
+            # close()でshutdownされている
+            future: concurrent.futures.Future = concurrent.futures.Future()
+            encode()
+            future.set_result(None)
+            return future
+
     def queue_first(self) -> None:
         with self._msg_cv:
             self._msg_queue.insert(0, webcface.client_impl.sync_data_first(self))
@@ -452,6 +1026,12 @@ class ClientData:
     def is_self(self, member: str) -> bool:
         return self.self_member_name == member
 
+    def recv_store(self, kind: str) -> "SyncDataStore2":
+        """RECV_KINDS のいずれかの名前からstoreを返す"""
+        if kind not in RECV_KINDS:
+            raise ValueError("Invalid data kind: " + kind)
+        return getattr(self, kind + "_store")
+
     def get_member_name_from_id(self, m_id: int) -> str:
         for k, v in self.member_ids.items():
             if v == m_id:
@@ -1,6 +1,8 @@
 import threading
 import logging
-from typing import List
+import datetime
+import time
+from typing import List, Dict, Tuple
 import webcface.client_data
 import webcface.message
 import webcface.client
@@ -16,7 +18,21 @@ def on_recv(
 ) -> None:
     sync_members: List[str] = []
     if len(message) > 0:
-        for m in webcface.message.unpack(message):
+        messages = webcface.message.unpack(message)
+        # 1回の受信に含まれるvalue_storeへの変更 (ValueResとSyncInitによる初期化) は
+        # 受信した順に、他のメッセージの処理やコールバックより先にまとめて反映し、
+        # 別スレッドから途中までしか反映されていない状態が見えないようにする
+        value_targets: Dict[int, Tuple[str, str]] = {}
+        with data.value_store.lock:
+            for m in messages:
+                if isinstance(m, webcface.message.SyncInit):
+                    data.value_store.init_member(m.member_name)
+                if isinstance(m, webcface.message.ValueRes):
+                    member, field = data.value_store.get_req(m.req_id, m.sub_field)
+                    if member != "":
+                        data.value_store.set_recv(member, field, m.data)
+                        value_targets[id(m)] = (member, field)
+        for m in messages:
             if isinstance(m, webcface.message.SyncInitEnd):
                 data.svr_name = m.svr_name
                 data.svr_version = m.ver
@@ -36,7 +52,7 @@ def on_recv(
                 data.sync_time_store.set_recv(member, m.time)
                 sync_members.append(member)
             if isinstance(m, webcface.message.SyncInit):
-                data.value_store.init_member(m.member_name)
+                # value_storeは上で初期化済み
                 data.text_store.init_member(m.member_name)
                 data.func_store.init_member(m.member_name)
                 data.view_store.init_member(m.member_name)
@@ -50,19 +66,31 @@ def on_recv(
                 if data.on_member_entry is not None:
                     data.on_member_entry(wcli.member(m.member_name))
             if isinstance(m, webcface.message.ValueRes):
-                member, field = data.value_store.get_req(m.req_id, m.sub_field)
-                data.value_store.set_recv(member, field, m.data)
+                if id(m) not in value_targets:
+                    continue  # unrequest済み
+                member, field = value_targets[id(m)]
+                history = data.value_history.get(member, {}).get(field)
+                if history is not None:
+                    sync_time = data.sync_time_store.get_recv(member)
+                    history.push(
+                        sync_time if sync_time is not None else datetime.datetime.now(),
+                        m.data,
+                    )
                 on_change = data.on_value_change.get(member, {}).get(field)
                 if on_change is not None:
                     on_change(wcli.member(member).value(field))
             if isinstance(m, webcface.message.ValueEntry):
                 member = data.get_member_name_from_id(m.member_id)
                 data.value_store.set_entry(member, m.field)
+                if data.value_store.match_req_prefix(member, m.field):
+                    wcli.member(member).value(m.field).request()
                 on_entry = data.on_value_entry.get(member)
                 if on_entry is not None:
                     on_entry(wcli.member(member).value(m.field))
             if isinstance(m, webcface.message.TextRes):
                 member, field = data.text_store.get_req(m.req_id, m.sub_field)
+                if member == "":
+                    continue  # unrequest済み
                 data.text_store.set_recv(member, field, m.data)
                 on_change = data.on_text_change.get(member, {}).get(field)
                 if on_change is not None:
@@ -70,104 +98,137 @@ def on_recv(
             if isinstance(m, webcface.message.TextEntry):
                 member = data.get_member_name_from_id(m.member_id)
                 data.text_store.set_entry(member, m.field)
+                if data.text_store.match_req_prefix(member, m.field):
+                    wcli.member(member).text(m.field).request()
                 on_entry = data.on_text_entry.get(member)
                 if on_entry is not None:
                     on_entry(wcli.member(member).text(m.field))
             if isinstance(m, webcface.message.ImageRes):
                 member, field = data.image_store.get_req(m.req_id, m.sub_field)
-                data.image_store.set_recv(
-                    member,
-                    field,
-                    webcface.image_frame.ImageFrame(
+                if member == "":
+                    continue  # unrequest済み
+                pool = data.image_buffer_pool.get(member, {}).get(field)
+                if pool is None:
+                    frame = webcface.image_frame.ImageFrame(
+                        m.width, m.height, bytes(m.data), m.color_mode, m.cmp_mode
+                    )
+                else:
+                    frame = pool.frame(
                         m.width, m.height, m.data, m.color_mode, m.cmp_mode
-                    ),
-                )
+                    )
+                # 置き換えられた古いフレームのバッファはset_recvでプールに返却される
+                data.image_store.set_recv(member, field, frame)
                 on_change = data.on_image_change.get(member, {}).get(field)
                 if on_change is not None:
                     on_change(wcli.member(member).image(field))
             if isinstance(m, webcface.message.ImageEntry):
                 member = data.get_member_name_from_id(m.member_id)
                 data.image_store.set_entry(member, m.field)
+                if data.image_store.match_req_prefix(member, m.field):
+                    wcli.member(member).image(m.field).request()
                 on_entry = data.on_image_entry.get(member)
                 if on_entry is not None:
                     on_entry(wcli.member(member).image(m.field))
             if isinstance(m, webcface.message.ViewRes):
                 member, field = data.view_store.get_req(m.req_id, m.sub_field)
+                if member == "":
+                    continue  # unrequest済み
+                # ロックを取らずに読んでいるスレッドがあるので、
+                # 受信済みのデータは書き換えず新しいデータに差し替える
                 v_prev = data.view_store.get_recv(member, field)
-                if v_prev is None:
-                    v_prev = webcface.view.ViewData()
-                    data.view_store.set_recv(member, field, v_prev)
+                v_new = webcface.view.ViewData()
+                if v_prev is not None:
+                    v_new.ids = v_prev.ids
+                    v_new.components = dict(v_prev.components)
                 if m.ids is not None:
-                    v_prev.ids = m.ids
-                for i, c in m.data_diff.items():
-                    v_prev.components[i] = c
+                    v_new.ids = m.ids
+                v_new.components.update(m.data_diff)
+                data.view_store.set_recv(member, field, v_new)
                 on_change = data.on_view_change.get(member, {}).get(field)
                 if on_change is not None:
                     on_change(wcli.member(member).view(field))
             if isinstance(m, webcface.message.ViewEntry):
                 member = data.get_member_name_from_id(m.member_id)
                 data.view_store.set_entry(member, m.field)
+                if data.view_store.match_req_prefix(member, m.field):
+                    wcli.member(member).view(m.field).request()
                 on_entry = data.on_view_entry.get(member)
                 if on_entry is not None:
                     on_entry(wcli.member(member).view(m.field))
             if isinstance(m, webcface.message.Canvas2DRes):
                 member, field = data.canvas2d_store.get_req(m.req_id, m.sub_field)
+                if member == "":
+                    continue  # unrequest済み
                 c2_prev = data.canvas2d_store.get_recv(member, field)
-                if c2_prev is None:
-                    c2_prev = webcface.canvas2d.Canvas2DData(1.0, 1.0)
-                    data.canvas2d_store.set_recv(member, field, c2_prev)
-                c2_prev.width = m.width
-                c2_prev.height = m.height
+                c2_new = webcface.canvas2d.Canvas2DData(1.0, 1.0)
+                c2_new.width = m.width
+                c2_new.height = m.height
+                if c2_prev is not None:
+                    c2_new.ids = c2_prev.ids
+                    c2_new.components = dict(c2_prev.components)
                 if m.ids is not None:
-                    c2_prev.ids = m.ids
-                for i, c2 in m.data_diff.items():
-                    c2_prev.components[i] = c2
+                    c2_new.ids = m.ids
+                c2_new.components.update(m.data_diff)
+                data.canvas2d_store.set_recv(member, field, c2_new)
                 on_change = data.on_canvas2d_change.get(member, {}).get(field)
                 if on_change is not None:
                     on_change(wcli.member(member).canvas2d(field))
             if isinstance(m, webcface.message.Canvas2DEntry):
                 member = data.get_member_name_from_id(m.member_id)
                 data.canvas2d_store.set_entry(member, m.field)
+                if data.canvas2d_store.match_req_prefix(member, m.field):
+                    wcli.member(member).canvas2d(m.field).request()
                 on_entry = data.on_canvas2d_entry.get(member)
                 if on_entry is not None:
                     on_entry(wcli.member(member).canvas2d(m.field))
             if isinstance(m, webcface.message.Canvas3DRes):
                 member, field = data.canvas3d_store.get_req(m.req_id, m.sub_field)
+                if member == "":
+                    continue  # unrequest済み
                 c3_prev = data.canvas3d_store.get_recv(member, field)
-                if c3_prev is None:
-                    c3_prev = webcface.canvas3d.Canvas3DData()
-                    data.canvas3d_store.set_recv(member, field, c3_prev)
+                c3_new = webcface.canvas3d.Canvas3DData()
+                if c3_prev is not None:
+                    c3_new.ids = c3_prev.ids
+                    c3_new.components = dict(c3_prev.components)
                 if m.ids is not None:
-                    c3_prev.ids = m.ids
-                for i, c3 in m.data_diff.items():
-                    c3_prev.components[i] = c3
+                    c3_new.ids = m.ids
+                c3_new.components.update(m.data_diff)
+                data.canvas3d_store.set_recv(member, field, c3_new)
                 on_change = data.on_canvas3d_change.get(member, {}).get(field)
                 if on_change is not None:
                     on_change(wcli.member(member).canvas3d(field))
             if isinstance(m, webcface.message.Canvas3DEntry):
                 member = data.get_member_name_from_id(m.member_id)
                 data.canvas3d_store.set_entry(member, m.field)
+                if data.canvas3d_store.match_req_prefix(member, m.field):
+                    wcli.member(member).canvas3d(m.field).request()
                 on_entry = data.on_canvas3d_entry.get(member)
                 if on_entry is not None:
                     on_entry(wcli.member(member).canvas3d(m.field))
             if isinstance(m, webcface.message.LogRes):
                 member, field = data.log_store.get_req(m.req_id, m.sub_field)
-                log_data = data.log_store.get_recv(member, field)
-                if log_data is None:
-                    log_data = webcface.log_handler.LogData()
-                    data.log_store.set_recv(member, field, log_data)
-                log_data.data.extend(m.log)
+                if member == "":
+                    continue  # unrequest済み
+                log_prev = data.log_store.get_recv(member, field)
+                log_data = webcface.log_handler.LogData()
+                if log_prev is not None:
+                    log_data.data = log_prev.data + m.log
+                else:
+                    log_data.data = list(m.log)
                 if (
                     webcface.Log.keep_lines >= 0
                     and len(log_data.data) > webcface.Log.keep_lines
                 ):
                     del log_data.data[: -webcface.Log.keep_lines]
+                data.log_store.set_recv(member, field, log_data)
                 on_change = data.on_log_change.get(member)
                 if on_change is not None:
                     on_change(wcli.member(member).log())
             if isinstance(m, webcface.message.LogEntry):
                 member = data.get_member_name_from_id(m.member_id)
                 data.log_store.set_entry(member, m.field)
+                if data.log_store.match_req_prefix(member, m.field):
+                    wcli.member(member).log(m.field).request()
                 on_entry = data.on_log_entry.get(member)
                 if on_entry is not None:
                     on_entry(wcli.member(member).log(m.field))
@@ -241,6 +302,34 @@ def on_recv(
                 on_sync(wcli.member(member))
 
 
+def unrequest_idle(data: webcface.client_data.ClientData, timeout: float) -> None:
+    """timeout秒以上読まれていないデータのリクエストを解除する
+
+    on_change() や Value.history() で使われているものは対象外
+    """
+    before = time.monotonic() - timeout
+    stores = [
+        (data.value_store, data.on_value_change),
+        (data.text_store, data.on_text_change),
+        (data.image_store, data.on_image_change),
+        (data.view_store, data.on_view_change),
+        (data.canvas2d_store, data.on_canvas2d_change),
+        (data.canvas3d_store, data.on_canvas3d_change),
+    ]
+    for store, on_change in stores:
+        for member, field in store.get_idle_req(before):
+            if field in on_change.get(member, {}):
+                continue
+            if store is data.value_store and field in data.value_history.get(
+                member, {}
+            ):
+                continue
+            store.unset_req(member, field)
+    for member, field in data.log_store.get_idle_req(before):
+        if member not in data.on_log_change:
+            data.log_store.unset_req(member, field)
+
+
 def sync_data_first(
     data: webcface.client_data.ClientData,
 ) -> List[webcface.message.MessageBase]:
@@ -302,27 +391,74 @@ def sync_data(
     with data.text_store.lock:
         for k, v2 in data.text_store.transfer_send(is_first).items():
             msgs.append(webcface.message.Text.new(k, v2))
+    image_sent: List[str] = []
     with data.image_store.lock:
+        now = time.monotonic()
+        image_deferred = {}
+        image_pending = set(data.image_store.data_send)
         for k, v8 in data.image_store.transfer_send(is_first).items():
+            max_fps = data.image_max_fps.get(k)
+            if (
+                not is_first
+                and max_fps is not None
+                and now - data.image_last_send.get(k, 0.0) < 1 / max_fps
+            ):
+                # 次のsync()まで送信を遅らせる (その間にsetされたら古いほうは送らない)
+                image_deferred[k] = v8
+                continue
+            data.image_last_send[k] = now
+            if k in image_pending:
+                image_sent.append(k)
+                digest = data.image_pending_digest.pop(k, None)
+                if digest is None:
+                    data.image_sent_digest.pop(k, None)
+                else:
+                    data.image_sent_digest[k] = digest
             msgs.append(
                 webcface.message.Image.new(
-                    k, v8.data, v8.width, v8.height, v8.color_mode, v8.compress_mode
+                    k, v8.buffer, v8.width, v8.height, v8.color_mode, v8.compress_mode
                 )
             )
+        data.image_store.data_send.update(image_deferred)
+    # on_changeは実際に送信した画像についてだけ呼ぶ
+    for k in image_sent:
+        on_change = data.on_image_change.get(data.self_member_name, {}).get(k)
+        if on_change is not None:
+            on_change(webcface.Image(webcface.Field(data, data.self_member_name, k)))
     with data.view_store.lock:
         view_send_prev = data.view_store.get_send_prev(is_first)
         view_send = data.view_store.transfer_send(is_first)
         for k, v4 in view_send.items():
             v_prev = view_send_prev.get(k)
             v_diff = {}
-            for i in v4.ids:
-                if (
-                    v_prev is None
-                    or i not in v_prev.components
-                    or v_prev.components[i] != v4.components[i]
-                ):
+            if not is_first and v4.dirty is not None and v4.base is not None:
+                # update()で変更した要素だけを送る
+                for i in v4.dirty:
                     v_diff[i] = v4.components[i]
+                v_prev = v4.base
+            elif (
+                v_prev is not None
+                and v_prev.fingerprint is not None
+                and v4.fingerprint is not None
+                and v_prev.fingerprint[0] == v4.fingerprint[0]
+            ):
+                # idsが同じならfingerprintのtupleどうしを比較する
+                for i, fp_prev, fp in zip(
+                    v4.ids, v_prev.fingerprint[1], v4.fingerprint[1]
+                ):
+                    if fp_prev != fp:
+                        v_diff[i] = v4.components[i]
+            else:
+                for i in v4.ids:
+                    if (
+                        v_prev is None
+                        or i not in v_prev.components
+                        or v_prev.components[i] != v4.components[i]
+                    ):
+                        v_diff[i] = v4.components[i]
             ids_changed = v_prev is None or v_prev.ids != v4.ids
+            if len(v_diff) == 0 and not ids_changed:
+                continue
             msgs.append(
                 webcface.message.View.new(k, v_diff, (v4.ids if ids_changed else None))
             )
@@ -332,14 +468,28 @@ def sync_data(
         for k, v5 in canvas2d_send.items():
             c2_prev = canvas2d_send_prev.get(k)
             c2_diff = {}
-            for i in v5.ids:
-                if (
-                    c2_prev is None
-                    or i not in c2_prev.components
-                    or c2_prev.components[i] != v5.components[i]
-                ):
+            if not is_first and v5.dirty is not None and v5.base is not None:
+                # move()で変更した要素だけを送る
+                for i in v5.dirty:
                     c2_diff[i] = v5.components[i]
+                c2_prev = v5.base
+            else:
+                for i in v5.ids:
+                    if (
+                        c2_prev is None
+                        or i not in c2_prev.components
+                        or c2_prev.components[i] != v5.components[i]
+                    ):
+                        c2_diff[i] = v5.components[i]
             ids_changed = c2_prev is None or c2_prev.ids != v5.ids
+            if (
+                len(c2_diff) == 0
+                and not ids_changed
+                and c2_prev is not None
+                and c2_prev.width == v5.width
+                and c2_prev.height == v5.height
+            ):
+                continue
             msgs.append(
                 webcface.message.Canvas2D.new(
                     k, v5.width, v5.height, c2_diff, (v5.ids if ids_changed else None)
@@ -351,14 +501,22 @@ def sync_data(
         for k, v6 in canvas3d_send.items():
             c3_prev = canvas3d_send_prev.get(k)
             c3_diff = {}
-            for i in v6.ids:
-                if (
-                    c3_prev is None
-                    or i not in c3_prev.components
-                    or c3_prev.components[i] != v6.components[i]
-                ):
+            if not is_first and v6.dirty is not None and v6.base is not None:
+                # move()で変更した要素だけを送る
+                for i in v6.dirty:
                     c3_diff[i] = v6.components[i]
+                c3_prev = v6.base
+            else:
+                for i in v6.ids:
+                    if (
+                        c3_prev is None
+                        or i not in c3_prev.components
+                        or c3_prev.components[i] != v6.components[i]
+                    ):
+                        c3_diff[i] = v6.components[i]
             ids_changed = c3_prev is None or c3_prev.ids != v6.ids
+            if len(c3_diff) == 0 and not ids_changed:
+                continue
             msgs.append(
                 webcface.message.Canvas3D.new(
                     k, c3_diff, (v6.ids if ids_changed else None)
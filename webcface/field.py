@@ -1,4 +1,6 @@
-from typing import Optional, Iterable, SupportsFloat, List
+from typing import Optional, Iterable, SupportsFloat, List, Dict, Union
+import array
+import datetime
 import webcface.client_data
 import webcface.value
 import webcface.text
@@ -129,21 +131,124 @@ class Field(FieldBase):
         """FuncListenerオブジェクトを生成(ver3.1〜 / ver3.0までMemberクラスのメソッド)"""
         return webcface.func_listener.FuncListener(self.child(field))
 
-    def _entries(self, entries: List[str], store, recurse=True):
-        prefix_with_sep = self._field + "." if self._field != "" else ""
-        for e in store.get_entry(self._member):
-            if self._field == "" or e.startswith(prefix_with_sep):
-                if not recurse and "." in e[len(prefix_with_sep) :]:
-                    e = e[: e.find(".", len(prefix_with_sep))]
-                if e not in entries:
-                    entries.append(e)
-
-    def _has_entries(self, store) -> bool:
-        prefix_with_sep = self._field + "." if self._field != "" else ""
-        for e in store.get_entry(self._member):
-            if self._field == "" or e.startswith(prefix_with_sep):
-                return True
-        return False
+    def set_values(
+        self,
+        data: "Dict[str, Union[List[SupportsFloat], SupportsFloat, numpy.ndarray]]",
+    ) -> "Field":
+        """複数のValueにまとめて値をセットする (ver3.2〜)
+
+        * dataのキーは「(thisの名前).(キー)」としてValueの名前になる。
+        * 各値は Value.set() と同様に変換される。
+        * value_storeのロックを1回だけ取得してすべての値をセットするので、
+          多数のValueを毎周期セットする場合に Value.set() を繰り返すより高速。
+        * on_change() のコールバックはすべての値をセットした後に呼ばれる。
+        """
+        d = self._set_check()
+        values = {
+            self.child(k)._field: webcface.value.to_value_data(v)
+            for k, v in data.items()
+        }
+        d.value_store.set_send_many(values)
+        histories = d.value_history.get(self._member, {})
+        on_changes = d.on_value_change.get(self._member, {})
+        if len(histories) > 0 or len(on_changes) > 0:
+            now = datetime.datetime.now()
+            for f, v in values.items():
+                history = histories.get(f)
+                if history is not None:
+                    history.push(now, v)
+                on_change = on_changes.get(f)
+                if on_change is not None:
+                    on_change(webcface.value.Value(Field(self._data, self._member, f)))
+        return self
+
+    def set_texts(self, data: "Dict[str, Union[SupportsFloat, bool, str]]") -> "Field":
+        """複数のTextにまとめて値をセットする (ver3.2〜)
+
+        * dataのキーは「(thisの名前).(キー)」としてTextの名前になる。
+        * 各値は Variant.set() と同様に変換される。
+        * on_change() のコールバックはすべての値をセットした後に呼ばれる。
+        """
+        d = self._set_check()
+        texts = {
+            self.child(k)._field: webcface.text.to_text_data(v) for k, v in data.items()
+        }
+        d.text_store.set_send_many(texts)
+        on_changes = d.on_text_change.get(self._member, {})
+        if len(on_changes) > 0:
+            for f in texts.keys():
+                on_change = on_changes.get(f)
+                if on_change is not None:
+                    on_change(webcface.text.Variant(Field(self._data, self._member, f)))
+        return self
+
+    def request_all(self, kind: str, recurse: bool = True) -> None:
+        """「(thisの名前).(追加の名前)」で公開されているデータをすべてリクエストする (ver3.2〜)
+
+        * kindには "value", "text", "image", "view", "canvas2d", "canvas3d", "log" のいずれかを指定する。
+        * 現在のエントリーに加えて、これ以降に追加されたエントリーも受信した時点で自動でリクエストされる。
+        * recurseがFalseの場合、(追加の名前)にさらにピリオドが含まれるものは対象にしない。
+        * thisの名前が空文字列の場合はそのメンバーのすべてのデータが対象になる。
+        """
+        store = self._data_check().recv_store(kind)
+        store.add_req_prefix(self._member, self._field, recurse)
+        prefix_len = len(self._field) + 1 if self._field != "" else 0
+        for e in self._entries(store):
+            if recurse or "." not in e[prefix_len:]:
+                getattr(Field(self._data, self._member, e), kind)("").request()
+
+    def snapshot(
+        self, fields: "Optional[Iterable[str]]" = None
+    ) -> "Dict[str, List[float]]":
+        """複数のValueの値をまとめて取得する (ver3.2〜)
+
+        * value_storeのロックを1回だけ取得してすべての値をコピーするので、
+          受信したデータの途中までが反映された状態を読むことはない。
+        * fieldsには「(thisの名前).(名前)」の(名前)の部分を指定する。
+          Noneの場合は「(thisの名前).」で始まるすべてのValueを対象とする。
+        * 戻り値のキーはfieldsで指定した名前、値は Value.get_vec() と同じ形式になる。
+          まだ受信していない値は含まれない。
+        * まだリクエストされてなければ自動でリクエストされる
+        """
+        d = self._data_check()
+        reqs: List[webcface.message.MessageBase] = []
+        ret: Dict[str, List[float]] = {}
+        with d.value_store.lock:
+            if fields is None:
+                names = self._entries(d.value_store)
+                names_set = set(names)
+                prefix_with_sep = self._field + "." if self._field != "" else ""
+                for e in d.value_store.data_recv.get(self._member, {}).keys():
+                    if (
+                        self._field == ""
+                        or e == self._field
+                        or e.startswith(prefix_with_sep)
+                    ) and e not in names_set:
+                        names.append(e)
+                        names_set.add(e)
+                keys = [
+                    "" if e == self._field else e[len(prefix_with_sep) :] for e in names
+                ]
+            else:
+                keys = list(fields)
+                names = [self.child(k)._field for k in keys]
+            for n in names:
+                req = d.value_store.add_req(self._member, n)
+                if req > 0:
+                    reqs.append(webcface.message.ValueReq.new(self._member, n, req))
+            recv = d.value_store.data_recv.get(self._member, {})
+            for k, n in zip(keys, names):
+                v = recv.get(n)
+                if v is not None:
+                    ret[k] = v.tolist() if isinstance(v, array.array) else list(v)
+        if len(reqs) > 0:
+            d.queue_msg_req(reqs)
+        return ret
+
+    def _entries(self, store) -> List[str]:
+        return self._data_check().entry_index.children(
+            self._member, self._field, store, True
+        )
 
     def children(self, recurse=False) -> "Iterable[webcface.field.Field]":
         """「(thisの名前).(追加の名前)」で公開されているデータをすべて取得する (ver3.1〜)
@@ -152,74 +257,53 @@ class Field(FieldBase):
         * recurseがFalseの場合、名前にさらにピリオドが含まれる場合はその前までの名前を返す。
         * 同名で複数のデータが存在する場合も1回のみカウントする。
         """
-        entries: List[str] = []
-        self._entries(entries, self._data_check().value_store, recurse)
-        self._entries(entries, self._data_check().text_store, recurse)
-        self._entries(entries, self._data_check().image_store, recurse)
-        self._entries(entries, self._data_check().func_store, recurse)
-        self._entries(entries, self._data_check().view_store, recurse)
-        self._entries(entries, self._data_check().canvas2d_store, recurse)
-        self._entries(entries, self._data_check().canvas3d_store, recurse)
-        self._entries(entries, self._data_check().log_store, recurse)
+        entries = self._data_check().entry_index.children(
+            self._member, self._field, None, recurse
+        )
         return map(lambda n: Field(self._data, self._member, n), entries)
 
     def has_children(self) -> bool:
         """「(thisの名前).(追加の名前)」で公開されているデータが1つ以上あればtrue (ver3.1〜)"""
-        return (
-            self._has_entries(self._data_check().value_store)
-            or self._has_entries(self._data_check().text_store)
-            or self._has_entries(self._data_check().image_store)
-            or self._has_entries(self._data_check().func_store)
-            or self._has_entries(self._data_check().view_store)
-            or self._has_entries(self._data_check().canvas2d_store)
-            or self._has_entries(self._data_check().canvas3d_store)
-            or self._has_entries(self._data_check().log_store)
+        return self._data_check().entry_index.has_children(
+            self._member, self._field, None
         )
 
     def value_entries(self) -> "Iterable[webcface.value.Value]":
         """「(thisの名前).(追加の名前)」で公開されているvalueをすべて取得する (ver3.1〜 / ver3.0までMemberクラスのメソッド)"""
-        entries: List[str] = []
-        self._entries(entries, self._data_check().value_store, True)
+        entries = self._entries(self._data_check().value_store)
         return map(lambda n: webcface.value.Value(self, n), entries)
 
     def text_entries(self) -> "Iterable[webcface.text.Text]":
         """「(thisの名前).(追加の名前)」で公開されているtextをすべて取得する (ver3.1〜 / ver3.0までMemberクラスのメソッド)"""
-        entries: List[str] = []
-        self._entries(entries, self._data_check().text_store, True)
+        entries = self._entries(self._data_check().text_store)
         return map(lambda n: webcface.text.Text(self, n), entries)
 
     def image_entries(self) -> "Iterable[webcface.image.Image]":
         """「(thisの名前).(追加の名前)」で公開されているimageをすべて取得する (ver3.1〜 / ver3.0までMemberクラスのメソッド)"""
-        entries: List[str] = []
-        self._entries(entries, self._data_check().image_store, True)
+        entries = self._entries(self._data_check().image_store)
         return map(lambda n: webcface.image.Image(self, n), entries)
 
     def view_entries(self) -> "Iterable[webcface.view.View]":
         """「(thisの名前).(追加の名前)」で公開されているviewをすべて取得する (ver3.1〜 / ver3.0までMemberクラスのメソッド)"""
-        entries: List[str] = []
-        self._entries(entries, self._data_check().view_store, True)
+        entries = self._entries(self._data_check().view_store)
         return map(lambda n: webcface.view.View(self, n), entries)
 
     def func_entries(self) -> "Iterable[webcface.func.Func]":
         """「(thisの名前).(追加の名前)」で公開されているfuncをすべて取得する (ver3.1〜 / ver3.0までMemberクラスのメソッド)"""
-        entries: List[str] = []
-        self._entries(entries, self._data_check().func_store, True)
+        entries = self._entries(self._data_check().func_store)
         return map(lambda n: webcface.func.Func(self, n), entries)
 
     def canvas2d_entries(self) -> "Iterable[webcface.canvas2d.Canvas2D]":
         """「(thisの名前).(追加の名前)」で公開されているcanvas2dをすべて取得する (ver3.1〜 / ver3.0までMemberクラスのメソッド)"""
-        entries: List[str] = []
-        self._entries(entries, self._data_check().canvas2d_store, True)
+        entries = self._entries(self._data_check().canvas2d_store)
         return map(lambda n: webcface.canvas2d.Canvas2D(self, n), entries)
 
     def canvas3d_entries(self) -> "Iterable[webcface.canvas3d.Canvas3D]":
         """「(thisの名前).(追加の名前)」で公開されているcanvas3dをすべて取得する (ver3.1〜 / ver3.0までMemberクラスのメソッド)"""
-        entries: List[str] = []
-        self._entries(entries, self._data_check().canvas3d_store, True)
+        entries = self._entries(self._data_check().canvas3d_store)
         return map(lambda n: webcface.canvas3d.Canvas3D(self, n), entries)
 
     def log_entries(self) -> "Iterable[webcface.log.Log]":
         """「(thisの名前).(追加の名前)」で公開されているlogをすべて取得する (ver3.1〜 / ver2.1〜3.0までMemberクラスのメソッド)"""
-        entries: List[str] = []
-        self._entries(entries, self._data_check().log_store, True)
+        entries = self._entries(self._data_check().log_store)
         return map(lambda n: webcface.log.Log(self, n), entries)
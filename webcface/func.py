@@ -62,8 +62,8 @@ class Func:
         (ver2.0〜)
 
         """
-        return self._base._field in self._base._data_check().func_store.get_entry(
-            self._base._member
+        return self._base._data_check().func_store.has_entry(
+            self._base._member, self._base._field
         )
 
     def set(
@@ -1,7 +1,13 @@
-from typing import List, Union, SupportsFloat, Sequence, Tuple
+from typing import List, Union, SupportsFloat, Sequence, Tuple, Optional
 from enum import IntEnum
+import array
 import webcface.transform
 
+try:
+    import numpy
+except ModuleNotFoundError:
+    pass
+
 __all__ = [
     "GeometryType",
     "Geometry",
@@ -37,13 +43,61 @@ class GeometryType(IntEnum):
     POLYGON = 7
 
 
+def _to_float32_array(data) -> "Optional[array.array]":
+    """numpy配列などバッファプロトコルに対応したオブジェクトを
+    座標(x, y, z)を並べたarray('f')に変換する
+
+    (N, 2) の配列はz=0として扱う。
+    バッファプロトコルに対応していない場合、
+    またはnumpyがなく1次元のfloat32以外のバッファの場合はNoneを返す。
+
+    :raise ValueError: 配列の形が (N, 2) または (N, 3) でない場合
+    """
+    if isinstance(data, (str, bytes, bytearray)):
+        return None
+    try:
+        mv = memoryview(data)
+    except TypeError:
+        return None
+    a = array.array("f")
+    if mv.format == "f" and mv.ndim == 1 and mv.c_contiguous:
+        a.frombytes(mv.cast("B"))
+        return a
+    try:
+        import numpy
+    except ModuleNotFoundError:
+        return None
+
+    pts = numpy.asarray(data, dtype=numpy.float32)
+    if pts.ndim != 2 or pts.shape[1] not in (2, 3):
+        raise ValueError(
+            f"points must be an array of shape (N, 2) or (N, 3), got {pts.shape}"
+        )
+    if pts.shape[1] == 2:
+        pts3 = numpy.zeros((pts.shape[0], 3), dtype=numpy.float32)
+        pts3[:, :2] = pts
+        pts = pts3
+    a.frombytes(memoryview(numpy.ascontiguousarray(pts)).cast("B"))
+    return a
+
+
 class Geometry:
     _geometry_type: int
-    _properties: List[float]
-
-    def __init__(self, geometry_type: int, properties: Sequence[SupportsFloat]) -> None:
+    # (ver3.2〜) numpy配列から作成した場合や受信したデータの場合は
+    # array.array (float32なら'f', float64なら'd') になる
+    _properties: "Union[List[float], array.array]"
+
+    def __init__(
+        self,
+        geometry_type: int,
+        properties: "Union[Sequence[SupportsFloat], array.array]",
+    ) -> None:
         self._geometry_type = geometry_type
-        self._properties = [float(p) for p in properties]
+        # array.array (ver3.2〜) は要素ごとにfloatに変換せずそのまま保持する
+        if isinstance(properties, array.array):
+            self._properties = properties
+        else:
+            self._properties = [float(p) for p in properties]
 
     @property
     def type(self) -> int:
@@ -119,10 +173,43 @@ class Polygon(Geometry):
             points.append(webcface.transform.Point(self._properties[i : i + 3]))
         return points
 
+    def numpy(self) -> "numpy.ndarray":
+        """頂点の座標を (N, 3) のnumpy配列で返す (ver3.2〜)
+
+        * Pointオブジェクトを作らないので点の数が多い場合は points より速い。
+        * array-backedなPolygonの場合はコピーせずに内部のデータを参照する。
+        * numpyが必要。
+        """
+        import numpy
+
+        if isinstance(self._properties, array.array):
+            dtype = numpy.float32 if self._properties.typecode == "f" else numpy.float64
+            a = numpy.frombuffer(self._properties, dtype=dtype)
+        else:
+            a = numpy.array(self._properties, dtype=numpy.float64)
+        a = a.reshape(-1, 3)
+        a.flags.writeable = False
+        return a
+
 
 def polygon(
-    points: "Sequence[Union[webcface.transform.Point, Sequence[SupportsFloat]]]",
+    points: "Union[Sequence[Union[webcface.transform.Point, Sequence[SupportsFloat]]], numpy.ndarray]",
 ) -> Polygon:
+    """多角形 (点列) のGeometryを作成する
+
+    (ver3.2〜) pointsに (N, 3) または (N, 2) のnumpy配列を渡すと、
+    要素ごとのPointやfloatを作らずにfloat32のarrayとして保持し、
+    送信時もそのままpackされる。
+    点群や軌跡など点の数が多い場合はこちらを使うとよい。
+    numpyがない場合は1次元のfloat32のバッファ (座標を並べたもの) のみ
+    そのまま保持し、それ以外は通常の点のリストとして扱う。
+
+    :raise ValueError: numpy配列の形が (N, 2) または (N, 3) でない場合
+    """
+    if not isinstance(points, (list, tuple)):
+        a = _to_float32_array(points)
+        if a is not None:
+            return Polygon(a)
     props: List[float] = []
     for p in points:
         if not isinstance(p, webcface.transform.Point):
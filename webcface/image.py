@@ -1,4 +1,5 @@
 from typing import Optional, Callable
+import zlib
 import webcface.field
 import webcface.member
 import webcface.message
@@ -34,8 +35,9 @@ class Image:
         コールバックの引数にはImageオブジェクトが渡される。
 
         まだ値をリクエストされてなければ自動でリクエストされる
+        (request() で指定した変換は上書きしない)
         """
-        self.request()
+        self._try_request()
         data = self._base._data_check()
         if self._base._member not in data.on_image_change:
             data.on_image_change[self._base._member] = {}
@@ -76,10 +78,19 @@ class Image:
             * png → 0〜9 (大きいほうが圧縮後のサイズが小さい)
             * webp → 1〜100 (大きいほうが高品質)
         :param frame_rate: 画像を受信する頻度 (指定しない場合元画像が更新されるたびに受信する)
+
+        (ver3.2〜) 自分自身の画像に対してリクエストした場合は、
+        try_get() や get() で取得するときにこのクライアント内で同じ変換を行う。
+        (frame_rateは無視される)
+        変換結果は画像ごとにキャッシュされる。
         """
         img_req = webcface.image_frame.ImageReq(
             width, height, color_mode, compress_mode, quality, frame_rate
         )
+        data = self._base._data_check()
+        if data.is_self(self._base._member):
+            data.image_self_req[self._base._field] = img_req
+            return
         req = self._base._data_check().image_store.add_req(
             self._base._member, self._base._field, img_req
         )
@@ -95,36 +106,194 @@ class Image:
                 ]
             )
 
-    def try_get(self) -> "Optional[webcface.image_frame.ImageFrame]":
-        """画像を返す、まだリクエストされてなければ自動でリクエストされる"""
-        self.request()
-        return self._base._data_check().image_store.get_recv(
+    def unrequest(self) -> None:
+        """画像の受信リクエストを解除する (ver3.2〜)"""
+        self._base._data_check().image_store.unset_req(
             self._base._member, self._base._field
         )
 
+    def try_get(self) -> "Optional[webcface.image_frame.ImageFrame]":
+        """画像を返す、まだリクエストされてなければ自動でリクエストされる
+
+        (ver3.2〜) enable_buffer_pool() している場合は受信した画像ごとに1回コピーが発生する。
+        コピーを避けたい場合は acquire() を使うこと。
+        """
+        data = self._base._data_check()
+        if data.is_self(self._base._member):
+            v = data.image_store.get_recv(self._base._member, self._base._field)
+            img_req = data.image_self_req.get(self._base._field)
+            if v is not None and img_req is not None:
+                v = v.apply_request(img_req)
+            return v
+        v = self._acquire_recv()
+        if v is None or v._pooled is None:
+            return v
+        # プールのバッファは後で上書きされるのでコピーして返す。
+        # コピーは受信した画像ごとに1回だけ作り、同じ画像を読む間は使いまわす
+        ret = v._copied
+        if ret is None:
+            ret = webcface.image_frame.ImageFrame(
+                v.width, v.height, bytes(v.buffer), v.color_mode, v.compress_mode
+            )
+            v._copied = ret
+        v.release()
+        return ret
+
+    def _acquire_recv(self) -> "Optional[webcface.image_frame.ImageFrame]":
+        """受信した画像をretainして返す
+
+        get_recvしてからretainするまでの間に
+        次の画像を受信してバッファがプールに戻されていたら取得しなおす。
+        """
+        data = self._base._data_check()
+        self._try_request()
+        while True:
+            v = data.image_store.get_recv(self._base._member, self._base._field)
+            if v is None or v._try_retain():
+                return v
+
     def get(self) -> "webcface.image_frame.ImageFrame":
         """画像を返す、まだリクエストされてなければ自動でリクエストされる"""
         v = self.try_get()
         return v if v is not None else webcface.image_frame.ImageFrame(0, 0, b"", 0, 0)
 
+    def acquire(self) -> "Optional[webcface.image_frame.ImageFrame]":
+        """try_get() と同様に画像を返すが、
+        enable_buffer_pool() している場合はコピーせずにプールのバッファをそのまま返す (ver3.2〜)
+
+        返したImageFrameの release() を呼ぶまでそのバッファは再利用されない。
+        使い終わったら必ず release() すること。
+        """
+        data = self._base._data_check()
+        if data.is_self(self._base._member):
+            return self.try_get()
+        return self._acquire_recv()
+
+    def enable_buffer_pool(self, max_buffers: int = 4) -> "Image":
+        """受信した画像のバッファを使いまわすようにする (ver3.2〜)
+
+        * 受信のたびに新しいbytesを確保する代わりに、
+          使い終わったバッファに上書きする。
+        * プールを使う場合は受信した画像を acquire() で取得し、
+          使い終わったら release() すること。コピーは発生せず、
+          release() されるまでそのバッファは次の受信に使われない。
+        * try_get(), get() も使えるが、プールのバッファは後で上書きされるので
+          受信した画像ごとに1回コピーしたImageFrameを返す (同じ画像を何度読んでもコピーは1回)。
+          これではプールを使わない場合と同程度の確保が発生するので、
+          プールの効果を得るには acquire() を使うこと。
+
+        :arg max_buffers: プールに保持しておく空きバッファの最大数
+        """
+        data = self._base._data_check()
+        data.image_buffer_pool.setdefault(self._base._member, {})[self._base._field] = (
+            webcface.image_frame.ImageBufferPool(max_buffers)
+        )
+        return self
+
     def exists(self) -> bool:
         """このフィールドにデータが存在すればtrue
 
         try_get() などとは違って、実際のデータを受信しない。
         リクエストもしない。
         """
-        return self._base._field in self._base._data_check().image_store.get_entry(
-            self._base._member
+        return self._base._data_check().image_store.has_entry(
+            self._base._member, self._base._field
         )
 
-    def set(self, data: "webcface.image_frame.ImageFrame") -> "Image":
-        """画像をセットする"""
-        self._base._set_check().image_store.set_send(self._base._field, data)
-        on_change = (
-            self._base._data_check()
-            .on_image_change.get(self._base._member, {})
-            .get(self._base._field)
-        )
-        if on_change is not None:
-            on_change(self)
+    def set(
+        self,
+        data: "webcface.image_frame.ImageFrame",
+        compress_mode: Optional[int] = None,
+        quality: Optional[int] = None,
+    ) -> "Image":
+        """画像をセットする
+
+        (ver3.2〜) compress_modeにJPEG, PNG, WEBPを指定すると、
+        送信前に別スレッドで圧縮される。
+        圧縮が完了するまでは送信されず、圧縮中に次の画像がセットされた場合は古いほうは送信されない。
+        圧縮にはopencv-python (cv2) またはPillowが必要で、
+        どちらもない場合は圧縮せずに送信される。
+        圧縮する場合、画像データはset()の中でコピーされるので
+        set()から戻った後は元のバッファを書き換えてよい。
+
+        (ver3.2〜) on_changeはset()の中ではなく、
+        Client.sync() で実際に送信したときにsync()を呼んだスレッドで呼ばれる。
+        圧縮中や set_max_fps() で送信が持ち越されている間に次の画像がセットされ、
+        送信されなかった画像に対しては呼ばれない。
+
+        圧縮しない場合、bytes以外のバッファから作成したImageFrameはコピーせずに保持されるので、
+        送信 (Client.sync()) が完了するまで元のバッファを書き換えないこと。
+
+        (ver3.2〜) set_skip_same() が有効な場合、前回送信したのと同じ画像であれば
+        圧縮も送信もしない (on_changeも呼ばれない)。
+
+        :arg compress_mode: ImageCompressMode (Noneの場合RAW)
+        :arg quality: 圧縮のパラメータ (request() を参照)
+        """
+        data_check = self._base._set_check()
+        field = self._base._field
+        digest: Optional[int] = None
+        if field in data_check.image_skip_same:
+            digest = hash(
+                (
+                    zlib.crc32(data.buffer),
+                    data.width,
+                    data.height,
+                    data.color_mode,
+                    data.compress_mode,
+                    compress_mode,
+                    quality,
+                )
+            )
+            with data_check.image_encode_lock, data_check.image_store.lock:
+                if data_check.image_sent_digest.get(field) == digest:
+                    # 送信済みの画像に戻ったので、圧縮中・送信待ちの画像も破棄する
+                    if field in data_check.image_encode_seq:
+                        data_check.image_encode_seq[field] += 1
+                    data_check.image_store.data_send.pop(field, None)
+                    data_check.image_pending_digest.pop(field, None)
+                    return self
+        if (
+            compress_mode is not None
+            and compress_mode != webcface.image_frame.ImageCompressMode.RAW
+            and data.compress_mode == webcface.image_frame.ImageCompressMode.RAW
+        ):
+            data_check.encode_image(field, data, compress_mode, quality, digest)
+        else:
+            with data_check.image_encode_lock:
+                # 圧縮中の古い画像が後から送信されないようにする
+                if field in data_check.image_encode_seq:
+                    data_check.image_encode_seq[field] += 1
+                data_check.set_image_send(field, data, digest)
+        return self
+
+    def set_max_fps(self, fps: Optional[float]) -> "Image":
+        """画像を送信する頻度の上限を設定する (ver3.2〜)
+
+        * 前回の送信から 1/fps 秒以上経っていない場合、
+          sync() してもその画像は送信されず次回以降のsync()に持ち越される。
+          持ち越している間に次の画像がセットされた場合、古いほうは送信されない。
+        * on_change は実際に送信したときに呼ばれるので、同様に制限される。
+        * Noneを指定すると制限を解除する。
+        """
+        data = self._base._set_check()
+        if fps is None:
+            data.image_max_fps.pop(self._base._field, None)
+        else:
+            if fps <= 0:
+                raise ValueError("fps must be positive")
+            data.image_max_fps[self._base._field] = float(fps)
+        return self
+
+    def set_skip_same(self, enable: bool = True) -> "Image":
+        """前回送信したのと同じ画像をセットしたとき無視するようにする (ver3.2〜)
+
+        * 画像データのcrc32で比較するため、set()のたびに画像全体を1回読む。
+        * 同じ画像の場合は圧縮・送信・on_changeの呼び出しをすべてスキップする。
+        """
+        data = self._base._set_check()
+        if enable:
+            data.image_skip_same.add(self._base._field)
+        else:
+            data.image_skip_same.discard(self._base._field)
         return self
@@ -1,5 +1,6 @@
-from typing import Optional
+from typing import Optional, Union, List, Tuple
 from enum import IntEnum
+import threading
 
 try:
     import numpy
@@ -27,23 +28,79 @@ class ImageFrame:
 
     * 8bitのグレースケール, BGR, BGRAフォーマットのみを扱う
     * 画像受信時にはjpegやpngなどにエンコードされたデータが入ることもある
+    * (ver3.2〜) dataにはbytesのほかnumpy配列やmemoryviewなど
+      バッファプロトコルに対応したオブジェクトを渡すことができ、コピーせずに保持する。
+      その場合送信が完了するまで元のバッファを書き換えないこと。
+    * 同じホスト上のプロセス間で画像を受け渡す場合、
+      multiprocessing.shared_memory.SharedMemory の buf をそのまま渡せばコピーは発生しない。
+      ImageFrameが残っている間は SharedMemory.close() できない (BufferError) ので注意。
+      webcfaceの通信自体はすべてサーバーを経由するため、共有メモリは使われない。
     """
 
     _width: int
     _height: int
-    _data: bytes
+    _data: Union[bytes, memoryview]
     _color_mode: int
     _cmp_mode: int
+    _decoded: "Optional[ImageFrame]"
+    _pooled: "Optional[_PooledBuffer]"
+    _copied: "Optional[ImageFrame]"
+    _converted: "Optional[Tuple[ImageReq, ImageFrame]]"
 
     def __init__(
-        self, width: int, height: int, data: bytes, color_mode: int, compress_mode: int
+        self,
+        width: int,
+        height: int,
+        data: "Union[bytes, bytearray, memoryview, numpy.ndarray]",
+        color_mode: int,
+        compress_mode: int,
     ) -> None:
         self._width = width
         self._height = height
-        self._data = data
+        if isinstance(data, bytes):
+            self._data = data
+        else:
+            mv = memoryview(data)
+            if not mv.c_contiguous:
+                import numpy
+
+                mv = memoryview(numpy.ascontiguousarray(mv))
+            self._data = mv.cast("B")
         self._color_mode = color_mode
         self._cmp_mode = compress_mode
-        assert width * height * self.channels == len(data)
+        self._decoded = None
+        self._pooled = None
+        self._copied = None
+        self._converted = None
+        if compress_mode == ImageCompressMode.RAW:
+            assert width * height * self.channels == len(self._data)
+
+    def _try_retain(self) -> bool:
+        pooled = self._pooled
+        if pooled is None:
+            return True
+        return pooled.pool._try_retain(pooled)
+
+    def retain(self) -> "ImageFrame":
+        """ImageBufferPool のバッファを使っている場合、
+        release() されるまでバッファが再利用されないようにする (ver3.2〜)
+
+        それ以外の場合は何もしない。
+        """
+        pooled = self._pooled
+        if pooled is not None:
+            pooled.pool._retain(pooled)
+        return self
+
+    def release(self) -> None:
+        """retain() したバッファを返却する (ver3.2〜)
+
+        retain() と同じ回数呼ぶこと。
+        返却後このImageFrameのデータは次に受信した画像で上書きされる可能性がある。
+        """
+        pooled = self._pooled
+        if pooled is not None:
+            pooled.pool._release(pooled)
 
     def empty(self) -> bool:
         """画像が空かどうかを返す"""
@@ -69,9 +126,9 @@ class ImageFrame:
         if self._color_mode == ImageColorMode.RGB:
             return 3
         if self._color_mode == ImageColorMode.BGRA:
-            return 3
+            return 4
         if self._color_mode == ImageColorMode.RGBA:
-            return 3
+            return 4
         raise ValueError("Unknown color format")
 
     @property
@@ -98,8 +155,21 @@ class ImageFrame:
 
         compress_modeがRAWの場合、height * width * channels
         要素の画像データ。 それ以外の場合、圧縮された画像のデータ
+
+        bytes以外のバッファから作成した場合はここでコピーが発生するので、
+        コピーが不要な場合は buffer を使うこと
+        """
+        if isinstance(self._data, bytes):
+            return self._data
+        return self._data.tobytes()
+
+    @property
+    def buffer(self) -> memoryview:
+        """画像データをコピーせずに参照するmemoryview (ver3.2〜)
+
+        内容は data と同じ
         """
-        return self._data
+        return memoryview(self._data)
 
     @staticmethod
     def from_numpy(img: "numpy.ndarray", color_mode: int) -> "ImageFrame":
@@ -109,6 +179,9 @@ class ImageFrame:
         color_mode がBGR,RGBの場合 (height, width, 3),
         color_mode がBGRA,RGBAの場合 (height, width, 4)
         のuint8配列のみが使用可能
+
+        (ver3.2〜) 配列が連続したメモリ上にある場合はコピーせずに参照する。
+        送信が完了するまで(sync()するまで)配列を書き換えないこと。
         """
         import numpy
 
@@ -132,11 +205,89 @@ class ImageFrame:
         return ImageFrame(
             img.shape[1],
             img.shape[0],
-            img.tobytes(),
+            numpy.ascontiguousarray(img),
             color_mode,
             ImageCompressMode.RAW,
         )
 
+    def encode(self, compress_mode: int, quality: Optional[int] = None) -> "ImageFrame":
+        """画像を圧縮したImageFrameを返す (ver3.2〜)
+
+        * opencv-python (cv2) があればそれを使い、なければPillowを使う。
+          どちらもない場合はModuleNotFoundError
+        * すでに圧縮されている画像やRAWを指定した場合はそのまま返す
+
+        :arg compress_mode: ImageCompressMode のJPEG, PNG, WEBPのいずれか
+        :arg quality: 圧縮のパラメータ (Image.request() を参照)
+        """
+        if (
+            compress_mode == ImageCompressMode.RAW
+            or self._cmp_mode != ImageCompressMode.RAW
+        ):
+            return self
+        img = self.numpy()
+        try:
+            buf = _encode_cv2(img, self._color_mode, compress_mode, quality)
+        except ModuleNotFoundError:
+            buf = _encode_pil(img, self._color_mode, compress_mode, quality)
+        return ImageFrame(
+            self._width, self._height, buf, self._color_mode, compress_mode
+        )
+
+    def decode(self, out: "Optional[numpy.ndarray]" = None) -> "ImageFrame":
+        """圧縮された画像をデコードしたImageFrameを返す (ver3.2〜)
+
+        * opencv-python (cv2) があればそれを使い、なければPillowを使う。
+          どちらもない場合はModuleNotFoundError
+        * 結果はこのImageFrameにキャッシュされ、2回目以降はデコードしない。
+        * デコード後の画像は width, height, color_mode に合わせて変換される。
+        * compress_mode がRAWの場合はそのまま返す
+
+        :arg out: (height, width, channels) のuint8配列を指定すると、
+            その配列にデコードした結果を書き込み、その配列を参照するImageFrameを返す。
+            この場合結果はキャッシュされない。
+            cv2もPillowも呼び出し側のバッファに直接デコードすることはできないため、
+            デコーダー内部での確保は避けられず、outへのコピーが1回発生する。
+            (cv2で色の変換が必要な場合は変換結果をoutに直接書き込む。)
+            毎回の戻り値の配列の確保とその後のコピーを省くためのもの。
+        """
+        import numpy
+
+        if out is not None and out.shape != (self._height, self._width, self.channels):
+            raise ValueError(
+                f"out must have shape {(self._height, self._width, self.channels)}"
+            )
+        if out is not None and out.dtype != numpy.uint8:
+            raise ValueError("out must have dtype uint8")
+        decoded = self._decoded
+        if self._cmp_mode == ImageCompressMode.RAW:
+            decoded = self
+        if decoded is not None:
+            if out is None:
+                return decoded
+            numpy.copyto(out, decoded.numpy())
+            return ImageFrame(
+                self._width, self._height, out, self._color_mode, ImageCompressMode.RAW
+            )
+        try:
+            img = _decode_cv2(self._data, self._color_mode, out)
+        except ModuleNotFoundError:
+            img = _decode_pil(self._data, self._color_mode, out)
+        if img.shape[0] != self._height or img.shape[1] != self._width:
+            raise ValueError(
+                f"decoded image size {img.shape[1]}x{img.shape[0]} does not match "
+                f"{self._width}x{self._height}"
+            )
+        if out is not None:
+            return ImageFrame(
+                self._width, self._height, out, self._color_mode, ImageCompressMode.RAW
+            )
+        decoded = ImageFrame(
+            self._width, self._height, img, self._color_mode, ImageCompressMode.RAW
+        )
+        self._decoded = decoded
+        return decoded
+
     def numpy(self) -> "numpy.ndarray":
         """numpy配列に変換する
 
@@ -145,18 +296,346 @@ class ImageFrame:
         color_mode がBGRA,RGBAの場合 (height, width, 4)
         のuint8配列を返す
 
-        compress_mode がRAWでない場合はエラー
+        (ver3.2〜) データをコピーせずに参照する配列を返す。
+        compress_mode がRAWでない場合は decode() した結果を返す
+        (以前はエラーだった)
         """
         import numpy
 
-        assert (
-            self._cmp_mode == ImageCompressMode.RAW
-        ), "compressed image is not supported"
-
+        if self._cmp_mode != ImageCompressMode.RAW:
+            return self.decode().numpy()
         return numpy.frombuffer(self._data, dtype=numpy.uint8).reshape(
             self._height, self._width, self.channels
         )
 
+    def resize(
+        self, width: Optional[int] = None, height: Optional[int] = None
+    ) -> "ImageFrame":
+        """画像をリサイズしたImageFrameを返す (ver3.2〜)
+
+        * 最近傍補間を使う。
+        * width, height のどちらかのみがNoneの場合縦横比を保ってリサイズし、
+          どちらもNoneの場合やサイズが変わらない場合はそのまま返す
+        * 圧縮されている場合は decode() してからリサイズする
+        """
+        import numpy
+
+        if width is None and height is None:
+            return self
+        if width is None:
+            width = max(1, round(self._width * height / self._height))
+        if height is None:
+            height = max(1, round(self._height * width / self._width))
+        if width == self._width and height == self._height:
+            return self
+        img = self.numpy()
+        rows = (numpy.arange(height) * self._height) // height
+        cols = (numpy.arange(width) * self._width) // width
+        return ImageFrame(
+            width,
+            height,
+            img[rows[:, None], cols[None, :]],
+            self._color_mode,
+            ImageCompressMode.RAW,
+        )
+
+    def convert_color(self, color_mode: int) -> "ImageFrame":
+        """色の並び順を変換したImageFrameを返す (ver3.2〜)
+
+        * カラーからGRAYへの変換は 0.299R + 0.587G + 0.114B
+        * アルファチャンネルを追加する場合は255で埋める
+        * color_mode が同じ場合はそのまま返す
+        * 圧縮されている場合は decode() してから変換する
+        """
+        import numpy
+
+        if color_mode == self._color_mode:
+            return self
+        img = self.numpy()
+        src = self._color_mode
+        if src == ImageColorMode.GRAY:
+            rgb = numpy.repeat(img, 3, axis=2)
+            alpha = None
+        else:
+            if src == ImageColorMode.BGR or src == ImageColorMode.BGRA:
+                rgb = img[:, :, 2::-1]
+            else:
+                rgb = img[:, :, :3]
+            alpha = img[:, :, 3:4] if self.channels == 4 else None
+        if color_mode == ImageColorMode.GRAY:
+            rgb16 = rgb.astype(numpy.uint16)
+            gray = rgb16[:, :, 0] * 77
+            gray += rgb16[:, :, 1] * 150
+            gray += rgb16[:, :, 2] * 29
+            out = (gray >> 8).astype(numpy.uint8)[:, :, None]
+        else:
+            if color_mode == ImageColorMode.BGR or color_mode == ImageColorMode.BGRA:
+                rgb = rgb[:, :, ::-1]
+            if color_mode == ImageColorMode.BGR or color_mode == ImageColorMode.RGB:
+                out = numpy.ascontiguousarray(rgb)
+            else:
+                out = numpy.empty((self._height, self._width, 4), dtype=numpy.uint8)
+                out[:, :, :3] = rgb
+                out[:, :, 3:4] = 255 if alpha is None else alpha
+        return ImageFrame(
+            self._width, self._height, out, color_mode, ImageCompressMode.RAW
+        )
+
+    def apply_request(self, req: "ImageReq") -> "ImageFrame":
+        """Image.request() で指定したのと同じ変換をこのクライアント内で行う (ver3.2〜)
+
+        * サイズ、色、圧縮を req に合わせて変換する。frame_rate は無視する。
+        * 結果はこのImageFrameにキャッシュされ、同じreqで再度呼んだ場合は変換しない。
+        * 圧縮に必要なライブラリ (cv2, Pillow) がない場合は圧縮せずに返す。
+        """
+        cached = self._converted
+        if cached is not None and cached[0] == req:
+            return cached[1]
+        frame = self
+        if req.width is not None or req.height is not None:
+            frame = frame.resize(req.width, req.height)
+        if req.color_mode is not None:
+            frame = frame.convert_color(req.color_mode)
+        if req.compress_mode is not None:
+            if frame._cmp_mode != req.compress_mode:
+                try:
+                    frame = frame.decode().encode(req.compress_mode, req.quality)
+                except ModuleNotFoundError:
+                    # Image.set() と同様、圧縮できない場合は非圧縮のまま返す
+                    pass
+        self._converted = (req, frame)
+        return frame
+
+
+def _encode_cv2(img: "numpy.ndarray", color_mode: int, compress_mode: int, quality):
+    import cv2
+
+    if color_mode == ImageColorMode.RGB:
+        img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+    elif color_mode == ImageColorMode.RGBA:
+        img = cv2.cvtColor(img, cv2.COLOR_RGBA2BGRA)
+    params = []
+    if compress_mode == ImageCompressMode.JPEG:
+        ext = ".jpg"
+        if quality is not None:
+            params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+    elif compress_mode == ImageCompressMode.PNG:
+        ext = ".png"
+        if quality is not None:
+            params = [cv2.IMWRITE_PNG_COMPRESSION, int(quality)]
+    elif compress_mode == ImageCompressMode.WEBP:
+        ext = ".webp"
+        if quality is not None:
+            params = [cv2.IMWRITE_WEBP_QUALITY, int(quality)]
+    else:
+        raise ValueError("Unknown compress mode")
+    ok, buf = cv2.imencode(ext, img, params)
+    if not ok:
+        raise RuntimeError("failed to encode image")
+    return buf
+
+
+def _encode_pil(img: "numpy.ndarray", color_mode: int, compress_mode: int, quality):
+    import io
+    from PIL import Image as PILImage
+
+    if color_mode == ImageColorMode.GRAY:
+        pil_img = PILImage.fromarray(img.reshape(img.shape[0], img.shape[1]), "L")
+    elif color_mode == ImageColorMode.BGR:
+        pil_img = PILImage.fromarray(img[:, :, ::-1], "RGB")
+    elif color_mode == ImageColorMode.BGRA:
+        pil_img = PILImage.fromarray(img[:, :, [2, 1, 0, 3]], "RGBA")
+    elif color_mode == ImageColorMode.RGB:
+        pil_img = PILImage.fromarray(img, "RGB")
+    else:
+        pil_img = PILImage.fromarray(img, "RGBA")
+    out = io.BytesIO()
+    if compress_mode == ImageCompressMode.JPEG:
+        if pil_img.mode == "RGBA":
+            pil_img = pil_img.convert("RGB")
+        pil_img.save(out, "JPEG", quality=quality if quality is not None else 75)
+    elif compress_mode == ImageCompressMode.PNG:
+        pil_img.save(out, "PNG", compress_level=quality if quality is not None else 6)
+    elif compress_mode == ImageCompressMode.WEBP:
+        pil_img.save(out, "WEBP", quality=quality if quality is not None else 80)
+    else:
+        raise ValueError("Unknown compress mode")
+    return out.getbuffer()
+
+
+def _store_decoded(img: "numpy.ndarray", out: "Optional[numpy.ndarray]"):
+    """デコード結果をoutに書き込む、outがNoneなら連続した配列にして返す"""
+    import numpy
+
+    if out is None:
+        return numpy.ascontiguousarray(img)
+    if img.shape != out.shape:
+        raise ValueError("decoded image size does not match")
+    numpy.copyto(out, img)
+    return out
+
+
+def _decode_cv2(
+    data, color_mode: int, out: "Optional[numpy.ndarray]" = None
+) -> "numpy.ndarray":
+    import cv2
+    import numpy
+
+    buf = numpy.frombuffer(data, dtype=numpy.uint8)
+    if color_mode == ImageColorMode.GRAY:
+        img = cv2.imdecode(buf, cv2.IMREAD_GRAYSCALE)
+    elif color_mode == ImageColorMode.BGR or color_mode == ImageColorMode.RGB:
+        img = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+    else:
+        img = cv2.imdecode(buf, cv2.IMREAD_UNCHANGED)
+    if img is None:
+        raise RuntimeError("failed to decode image")
+    if color_mode == ImageColorMode.GRAY:
+        return _store_decoded(img.reshape(img.shape[0], img.shape[1], 1), out)
+    if color_mode == ImageColorMode.BGR:
+        return _store_decoded(img, out)
+    if out is not None and out.shape[:2] != img.shape[:2]:
+        raise ValueError("decoded image size does not match")
+    # 色の変換が必要な場合は変換結果を直接outに書き込む
+    if color_mode == ImageColorMode.RGB:
+        return cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=out)
+    if len(img.shape) == 2:
+        code = (
+            cv2.COLOR_GRAY2RGBA
+            if color_mode == ImageColorMode.RGBA
+            else cv2.COLOR_GRAY2BGRA
+        )
+        return cv2.cvtColor(img, code, dst=out)
+    if img.shape[2] == 3:
+        code = (
+            cv2.COLOR_BGR2RGBA
+            if color_mode == ImageColorMode.RGBA
+            else cv2.COLOR_BGR2BGRA
+        )
+        return cv2.cvtColor(img, code, dst=out)
+    if color_mode == ImageColorMode.RGBA:
+        return cv2.cvtColor(img, cv2.COLOR_BGRA2RGBA, dst=out)
+    return _store_decoded(img, out)
+
+
+def _decode_pil(
+    data, color_mode: int, out: "Optional[numpy.ndarray]" = None
+) -> "numpy.ndarray":
+    import io
+    import numpy
+    from PIL import Image as PILImage
+
+    pil_img = PILImage.open(io.BytesIO(data))
+    if color_mode == ImageColorMode.GRAY:
+        img = numpy.asarray(pil_img.convert("L"))
+        return _store_decoded(img.reshape(img.shape[0], img.shape[1], 1), out)
+    if color_mode == ImageColorMode.BGR or color_mode == ImageColorMode.RGB:
+        img = numpy.asarray(pil_img.convert("RGB"))
+    else:
+        img = numpy.asarray(pil_img.convert("RGBA"))
+    # チャンネルの並べ替えはoutへの書き込みと同時に行う
+    if color_mode == ImageColorMode.BGR:
+        return _store_decoded(img[:, :, ::-1], out)
+    if color_mode == ImageColorMode.BGRA:
+        return _store_decoded(img[:, :, [2, 1, 0, 3]], out)
+    return _store_decoded(img, out)
+
+
+class _PooledBuffer:
+    pool: "ImageBufferPool"
+    buf: bytearray
+    refs: int
+
+    def __init__(self, pool: "ImageBufferPool", buf: bytearray) -> None:
+        self.pool = pool
+        self.buf = buf
+        self.refs = 0
+
+
+class ImageBufferPool:
+    """受信した画像データのバッファを使いまわすプール (ver3.2〜)
+
+    * frame() で作成したImageFrameは参照カウントを1つ持った状態で返り、
+      全ての参照が release() されるとバッファはプールに戻り次の frame() で上書きされる。
+    * 受信したフレームの参照はimage_storeが持っていて、
+      次のフレームで置き換えられたときや unrequest() などで削除されたときに release() される。
+    * 空いているバッファがない場合やサイズが足りない場合は新しく確保する。
+      返却されたバッファは max_buffers 個まで保持し、それ以上は破棄する。
+    * release() されないまま捨てられたImageFrameのバッファは単に再利用されない。
+    """
+
+    max_buffers: int
+    _free: List[bytearray]
+    _lock: threading.Lock
+
+    def __init__(self, max_buffers: int = 4) -> None:
+        self.max_buffers = max_buffers
+        self._free = []
+        self._lock = threading.Lock()
+
+    def _acquire(self, size: int) -> bytearray:
+        with self._lock:
+            for i, buf in enumerate(self._free):
+                if len(buf) >= size:
+                    return self._free.pop(i)
+        # 圧縮画像はフレームごとにサイズが変わるので余裕を持たせる
+        return bytearray(size + size // 4)
+
+    def _acquire_exact(self, size: int) -> bytearray:
+        with self._lock:
+            for i, buf in enumerate(self._free):
+                if len(buf) == size:
+                    return self._free.pop(i)
+        return bytearray(size)
+
+    def _retain(self, pooled: _PooledBuffer) -> None:
+        with self._lock:
+            pooled.refs += 1
+
+    def _try_retain(self, pooled: _PooledBuffer) -> bool:
+        """まだプールに返却されていなければretainしてTrueを返す"""
+        with self._lock:
+            if pooled.refs <= 0:
+                return False
+            pooled.refs += 1
+            return True
+
+    def _release(self, pooled: _PooledBuffer) -> None:
+        with self._lock:
+            if pooled.refs <= 0:
+                return
+            pooled.refs -= 1
+            if pooled.refs == 0 and len(self._free) < self.max_buffers:
+                self._free.append(pooled.buf)
+
+    def frame(
+        self,
+        width: int,
+        height: int,
+        data: Union[bytes, memoryview],
+        color_mode: int,
+        compress_mode: int,
+    ) -> ImageFrame:
+        """dataをプールのバッファにコピーしてImageFrameを作成する"""
+        size = len(data)
+        if compress_mode == ImageCompressMode.RAW:
+            buf = self._acquire_exact(size)
+        else:
+            buf = self._acquire(size)
+        view = memoryview(buf)[:size]
+        # bytearrayへのスライス代入は一時コピーを作るのでmemoryview経由で書き込む
+        view[:] = data
+        pooled = _PooledBuffer(self, buf)
+        pooled.refs = 1
+        frame = ImageFrame(width, height, view, color_mode, compress_mode)
+        frame._pooled = pooled
+        return frame
+
+    def num_free(self) -> int:
+        """プールに保持している空きバッファの数"""
+        with self._lock:
+            return len(self._free)
+
 
 class ImageReq:
     width: Optional[int]
@@ -63,6 +63,12 @@ class Log:
                 ]
             )
 
+    def unrequest(self) -> None:
+        """値の受信リクエストを解除する (ver3.2〜)"""
+        self._base._data_check().log_store.unset_req(
+            self._base._member, self._base._field
+        )
+
     def try_get(self) -> "Optional[List[webcface.log_handler.LogLine]]":
         """ログをlistまたはNoneで返す、まだリクエストされてなければ自動でリクエストされる"""
         self.request()
@@ -97,8 +103,8 @@ class Log:
         try_get() などとは違って、実際のデータを受信しない。
         リクエストもしない。
         """
-        return self._base._field in self._base._data_check().log_store.get_entry(
-            self._base._member
+        return self._base._data_check().log_store.has_entry(
+            self._base._member, self._base._field
         )
 
     def append(
@@ -1,5 +1,10 @@
-from typing import Dict, List, Union, Optional
+from typing import Dict, List, Union, Optional, Tuple, Callable
 import datetime
+import struct
+import sys
+import array
+import copy
+import io
 import umsgpack
 import webcface.func_info
 import webcface.view_base
@@ -11,6 +16,12 @@ import webcface.image_frame
 
 class MessageBase:
     kind_def = -1
+    # float64の配列としてまとめてpack/unpackするフィールド
+    float_array_keys: Tuple[str, ...] = ()
+    # 受信時にコピーせずmemoryviewとして読むbinフィールド
+    bin_keys: Tuple[str, ...] = ()
+    # "d"の各要素のmapのうちfloatの配列としてまとめてpack/unpackするフィールド
+    component_float_array_keys: Tuple[str, ...] = ()
     kind: int
     msg: dict
 
@@ -151,12 +162,13 @@ class Sync(MessageBase):
 
 class Value(MessageBase):
     kind_def = 0
+    float_array_keys = ("d",)
 
     def __init__(self, msg: dict) -> None:
         super().__init__(self.kind_def, msg)
 
     @staticmethod
-    def new(f: str, d: List[float]) -> "Value":
+    def new(f: str, d: "Union[List[float], array.array]") -> "Value":
         return Value({"f": f, "d": d})
 
     @property
@@ -164,7 +176,7 @@ class Value(MessageBase):
         return self.msg["f"]
 
     @property
-    def data(self) -> List[float]:
+    def data(self) -> "Union[List[float], array.array]":
         return self.msg["d"]
 
 
@@ -193,6 +205,7 @@ class ValueReq(MessageBase):
 
 class ValueRes(MessageBase):
     kind_def = 60
+    float_array_keys = ("d",)
 
     def __init__(self, msg: dict) -> None:
         super().__init__(self.kind_def, msg)
@@ -324,7 +337,9 @@ class Image(MessageBase):
         super().__init__(self.kind_def, msg)
 
     @staticmethod
-    def new(f: str, d: bytes, w: int, h: int, l: int, p: int) -> "Image":
+    def new(
+        f: str, d: Union[bytes, memoryview], w: int, h: int, l: int, p: int
+    ) -> "Image":
         return Image({"f": f, "d": d, "h": h, "w": w, "l": l, "p": p})
 
     @property
@@ -415,6 +430,7 @@ class ImageReq(MessageBase):
 
 class ImageRes(MessageBase):
     kind_def = 65
+    bin_keys = ("d",)
 
     def __init__(self, msg: dict) -> None:
         super().__init__(self.kind_def, msg)
@@ -432,7 +448,8 @@ class ImageRes(MessageBase):
         return self.msg["f"]
 
     @property
-    def data(self) -> bytes:
+    def data(self) -> Union[bytes, memoryview]:
+        """受信したメッセージの場合は受信データを参照するmemoryview"""
         return self.msg["d"]
 
     @property
@@ -471,56 +488,95 @@ class ImageEntry(MessageBase):
         return self.msg["f"]
 
 
+class _LazyComponent:
+    """受信したdictを保持し、最初にプロパティを参照したときに _decode で変換する
+
+    View, Canvas2D, Canvas3Dのコンポーネントクラスと一緒に継承して使う。
+    """
+
+    _msg: dict
+    _decode: Callable[[dict], object]
+
+    def __init__(self, d: dict) -> None:
+        self._msg = d
+
+    def __getattr__(self, name: str):
+        # インスタンスにない属性を参照したときだけ呼ばれる
+        if name.startswith("__") or "_msg" not in self.__dict__:
+            raise AttributeError(name)
+        d = self._msg
+        self.__dict__.update(type(self)._decode(d).__dict__)
+        self._msg = d
+        return object.__getattribute__(self, name)
+
+
 def vb_to_vd(vb: "Dict[str, webcface.view_base.ViewComponentBase]") -> dict:
-    """ViewComponentBaseクラスからメッセージに変換"""
+    """ViewComponentBaseクラスからメッセージに変換
+
+    (ver3.2〜) 変換したdictはコンポーネントにキャッシュされ、
+    同じコンポーネントを再度送信するときは使いまわす。
+    コンポーネントのリストを後から書き換えてもキャッシュが変わらないようにコピーする。
+    """
     vd = {}
     for i, b in vb.items():
-        vd[i] = {
-            "t": b._type,
-            "x": b._text,
-            "L": None if b._on_click_func is None else b._on_click_func._member,
-            "l": None if b._on_click_func is None else b._on_click_func._field,
-            "R": None if b._text_ref is None else b._text_ref._member,
-            "r": None if b._text_ref is None else b._text_ref._field,
-            "c": b._text_color,
-            "b": b._bg_color,
-            "im": b._min,
-            "ix": b._max,
-            "is": b._step,
-            "io": b._option,
-            "w": b._width,
-            "h": b._height,
-        }
+        d = b._msg
+        if d is None:
+            d = {
+                "t": b._type,
+                "x": b._text,
+                "L": None if b._on_click_func is None else b._on_click_func._member,
+                "l": None if b._on_click_func is None else b._on_click_func._field,
+                "R": None if b._text_ref is None else b._text_ref._member,
+                "r": None if b._text_ref is None else b._text_ref._field,
+                "c": b._text_color,
+                "b": b._bg_color,
+                "im": b._min,
+                "ix": b._max,
+                "is": b._step,
+                "io": list(b._option),
+                "w": b._width,
+                "h": b._height,
+            }
+            b._msg = d
+        vd[i] = d
     return vd
 
 
+def _vd_to_vb_one(d: dict) -> "webcface.view_base.ViewComponentBase":
+    return webcface.view_base.ViewComponentBase(
+        type=d["t"],
+        text=d["x"],
+        on_click=(
+            None
+            if d.get("L") is None or d.get("l") is None
+            else webcface.field.FieldBase(d["L"], d["l"])
+        ),
+        text_ref=(
+            None
+            if d.get("R") is None or d.get("r") is None
+            else webcface.field.FieldBase(d["R"], d["r"])
+        ),
+        text_color=d["c"],
+        bg_color=d["b"],
+        min=d.get("im"),
+        max=d.get("ix"),
+        step=d.get("is"),
+        option=d.get("io"),
+        width=d.get("w", 0),
+        height=d.get("h", 0),
+    )
+
+
+class _LazyViewComponentBase(_LazyComponent, webcface.view_base.ViewComponentBase):
+    _decode = staticmethod(_vd_to_vb_one)
+
+
 def vd_to_vb(vd: dict) -> "Dict[str, webcface.view_base.ViewComponentBase]":
-    """メッセージからViewComponentBaseクラスに変換"""
-    vb = {}
-    for i, d in vd.items():
-        vb[i] = webcface.view_base.ViewComponentBase(
-            type=d["t"],
-            text=d["x"],
-            on_click=(
-                None
-                if d.get("L") is None or d.get("l") is None
-                else webcface.field.FieldBase(d["L"], d["l"])
-            ),
-            text_ref=(
-                None
-                if d.get("R") is None or d.get("r") is None
-                else webcface.field.FieldBase(d["R"], d["r"])
-            ),
-            text_color=d["c"],
-            bg_color=d["b"],
-            min=d.get("im"),
-            max=d.get("ix"),
-            step=d.get("is"),
-            option=d.get("io"),
-            width=d.get("w", 0),
-            height=d.get("h", 0),
-        )
-    return vb
+    """メッセージからViewComponentBaseクラスに変換
+
+    (ver3.2〜) 各要素の変換は最初にプロパティを参照したときまで遅延される
+    """
+    return {i: _LazyViewComponentBase(d) for i, d in vd.items()}
 
 
 class View(MessageBase):
@@ -625,41 +681,61 @@ class ViewEntry(MessageBase):
 
 
 def c2b_to_c2d(vb: "Dict[str, webcface.canvas2d_base.Canvas2DComponentBase]") -> dict:
-    """Canvas2dComponentBaseクラスからメッセージに変換"""
+    """Canvas2dComponentBaseクラスからメッセージに変換
+
+    (ver3.2〜) 変換したdictはコンポーネントにキャッシュされる。
+    リストはコピーして保持する。
+    """
     vd = {}
     for i, b in vb.items():
-        vd[i] = {
-            "t": b._type,
-            "op": b._origin_pos,
-            "or": b._origin_rot,
-            "c": b._color,
-            "f": b._fill,
-            "s": b._stroke_width,
-            "gt": b._geometry_type,
-            "gp": b._geometry_properties,
-        }
+        d = b._msg
+        if d is None:
+            d = {
+                "t": b._type,
+                "op": list(b._origin_pos),
+                "or": b._origin_rot,
+                "c": b._color,
+                "f": b._fill,
+                "s": b._stroke_width,
+                "gt": b._geometry_type,
+                # array.arrayの場合はfloat32のままpackできるようarray.arrayでコピーする
+                "gp": copy.copy(b._geometry_properties),
+            }
+            b._msg = d
+        vd[i] = d
     return vd
 
 
+def _c2d_to_c2b_one(d: dict) -> "webcface.canvas2d_base.Canvas2DComponentBase":
+    return webcface.canvas2d_base.Canvas2DComponentBase(
+        type=d["t"],
+        origin_pos=d["op"],
+        origin_rot=d["or"],
+        color=d["c"],
+        fill=d["f"],
+        stroke_width=d["s"],
+        geometry_type=d["gt"],
+        geometry_properties=d["gp"],
+    )
+
+
+class _LazyCanvas2DComponentBase(
+    _LazyComponent, webcface.canvas2d_base.Canvas2DComponentBase
+):
+    _decode = staticmethod(_c2d_to_c2b_one)
+
+
 def c2d_to_c2b(vd: dict) -> "Dict[str, webcface.canvas2d_base.Canvas2DComponentBase]":
-    """メッセージからCanvas2DComponentBaseクラスに変換"""
-    vb = {}
-    for i, d in vd.items():
-        vb[i] = webcface.canvas2d_base.Canvas2DComponentBase(
-            type=d["t"],
-            origin_pos=d["op"],
-            origin_rot=d["or"],
-            color=d["c"],
-            fill=d["f"],
-            stroke_width=d["s"],
-            geometry_type=d["gt"],
-            geometry_properties=d["gp"],
-        )
-    return vb
+    """メッセージからCanvas2DComponentBaseクラスに変換
+
+    (ver3.2〜) 各要素の変換は最初にプロパティを参照したときまで遅延される
+    """
+    return {i: _LazyCanvas2DComponentBase(d) for i, d in vd.items()}
 
 
 class Canvas2D(MessageBase):
     kind_def = 10
+    component_float_array_keys = ("gp",)
 
     def __init__(self, msg: dict) -> None:
         super().__init__(self.kind_def, msg)
@@ -720,6 +796,7 @@ class Canvas2DReq(MessageBase):
 
 class Canvas2DRes(MessageBase):
     kind_def = 70
+    component_float_array_keys = ("gp",)
 
     def __init__(self, msg: dict) -> None:
         super().__init__(self.kind_def, msg)
@@ -780,43 +857,62 @@ class Canvas2DEntry(MessageBase):
 
 
 def c3b_to_c3d(vb: "Dict[str, webcface.canvas3d_base.Canvas3DComponentBase]") -> dict:
-    """Canvas3dComponentBaseクラスからメッセージに変換"""
+    """Canvas3dComponentBaseクラスからメッセージに変換
+
+    (ver3.2〜) 変換したdictはコンポーネントにキャッシュされる。
+    リストはコピーして保持する。
+    """
     vd = {}
     for i, b in vb.items():
-        vd[i] = {
-            "t": b._type,
-            "op": b._origin_pos,
-            "or": b._origin_rot,
-            "c": b._color,
-            "gt": b._geometry_type,
-            "gp": b._geometry_properties,
-            "fm": b._field_member,
-            "ff": b._field_field,
-            "a": b._angles,
-        }
+        d = b._msg
+        if d is None:
+            d = {
+                "t": b._type,
+                "op": list(b._origin_pos),
+                "or": list(b._origin_rot),
+                "c": b._color,
+                "gt": b._geometry_type,
+                "gp": copy.copy(b._geometry_properties),
+                "fm": b._field_member,
+                "ff": b._field_field,
+                "a": dict(b._angles),
+            }
+            b._msg = d
+        vd[i] = d
     return vd
 
 
+def _c3d_to_c3b_one(d: dict) -> "webcface.canvas3d_base.Canvas3DComponentBase":
+    return webcface.canvas3d_base.Canvas3DComponentBase(
+        type=d["t"],
+        origin_pos=d["op"],
+        origin_rot=d["or"],
+        color=d["c"],
+        geometry_type=d["gt"],
+        geometry_properties=d["gp"],
+        field_member=d["fm"],
+        field_field=d["ff"],
+        angles=d["a"],
+    )
+
+
+class _LazyCanvas3DComponentBase(
+    _LazyComponent, webcface.canvas3d_base.Canvas3DComponentBase
+):
+    _decode = staticmethod(_c3d_to_c3b_one)
+
+
 def c3d_to_c3b(vd: dict) -> "Dict[str, webcface.canvas3d_base.Canvas3DComponentBase]":
-    """メッセージからCanvas2DComponentBaseクラスに変換"""
-    vb = {}
-    for i, d in vd.items():
-        vb[i] = webcface.canvas3d_base.Canvas3DComponentBase(
-            type=d["t"],
-            origin_pos=d["op"],
-            origin_rot=d["or"],
-            color=d["c"],
-            geometry_type=d["gt"],
-            geometry_properties=d["gp"],
-            field_member=d["fm"],
-            field_field=d["ff"],
-            angles=d["a"],
-        )
-    return vb
+    """メッセージからCanvas3DComponentBaseクラスに変換
+
+    (ver3.2〜) 各要素の変換は最初にプロパティを参照したときまで遅延される
+    """
+    return {i: _LazyCanvas3DComponentBase(d) for i, d in vd.items()}
 
 
 class Canvas3D(MessageBase):
     kind_def = 11
+    component_float_array_keys = ("gp",)
 
     def __init__(self, msg: dict) -> None:
         super().__init__(self.kind_def, msg)
@@ -867,6 +963,7 @@ class Canvas3DReq(MessageBase):
 
 class Canvas3DRes(MessageBase):
     kind_def = 71
+    component_float_array_keys = ("gp",)
 
     def __init__(self, msg: dict) -> None:
         super().__init__(self.kind_def, msg)
@@ -1179,26 +1276,255 @@ message_classes_recv = [
     LogEntry,
     LogRes,
 ]
+# unpack() はここにないkindのメッセージを読み飛ばす。
+# メッセージはすべてサーバーを経由するので、新しいkindを追加するには
+# サーバー側の対応が必要。
+_message_classes_recv_kind: Dict[int, type] = {
+    C.kind_def: C for C in message_classes_recv
+}
+
+
+def _array_header(n: int) -> bytes:
+    if n < 16:
+        return struct.pack("B", 0x90 | n)
+    elif n < 2**16:
+        return b"\xdc" + struct.pack(">H", n)
+    else:
+        return b"\xdd" + struct.pack(">I", n)
+
+
+def _map_header(n: int) -> bytes:
+    if n < 16:
+        return struct.pack("B", 0x80 | n)
+    elif n < 2**16:
+        return b"\xde" + struct.pack(">H", n)
+    else:
+        return b"\xdf" + struct.pack(">I", n)
+
+
+def _bin_header(n: int) -> bytes:
+    if n < 2**8:
+        return b"\xc4" + struct.pack("B", n)
+    elif n < 2**16:
+        return b"\xc5" + struct.pack(">H", n)
+    else:
+        return b"\xc6" + struct.pack(">I", n)
+
+
+def _pack_float_array(a: "array.array", chunks: List[Union[bytes, bytearray]]) -> None:
+    """float64のarrayを、要素ごとにfloatオブジェクトを作らずに
+    msgpackのfloat64のarrayとして書き出す
+
+    (ver3.2〜) array('f')の場合はfloat32のarrayとして書き出す
+    """
+    n = len(a)
+    chunks.append(_array_header(n))
+    if n == 0:
+        return
+    size = a.itemsize
+    if sys.byteorder == "little":
+        be = array.array(a.typecode, a)
+        be.byteswap()
+        raw = be.tobytes()
+    else:
+        raw = a.tobytes()
+    out = bytearray((size + 1) * n)
+    out[0 :: size + 1] = (b"\xca" if size == 4 else b"\xcb") * n
+    for j in range(size):
+        out[1 + j :: size + 1] = raw[j::size]
+    chunks.append(out)
+
+
+def _pack_msg(
+    msg: dict,
+    chunks: List[Union[bytes, bytearray, memoryview]],
+    float_array_keys: Tuple[str, ...] = (),
+    component_float_array_keys: Tuple[str, ...] = (),
+) -> None:
+    chunks.append(_map_header(len(msg)))
+    for k, v in msg.items():
+        chunks.append(umsgpack.packb(k))
+        if k == "d" and component_float_array_keys and isinstance(v, dict):
+            chunks.append(_map_header(len(v)))
+            for i, c in v.items():
+                chunks.append(umsgpack.packb(i))
+                _pack_msg(c, chunks, component_float_array_keys)
+            continue
+        if isinstance(v, list) and k in float_array_keys:
+            try:
+                v = array.array("d", v)
+            except TypeError:
+                pass
+        if isinstance(v, array.array):
+            _pack_float_array(v, chunks)
+        elif isinstance(v, (bytes, bytearray)):
+            # 画像データなど大きいバイナリはここでコピーせずにjoinで1回だけコピーする
+            chunks.append(_bin_header(len(v)))
+            chunks.append(v)
+        elif isinstance(v, memoryview):
+            # len()は要素数なので、バイト数はnbytesを使う
+            chunks.append(_bin_header(v.nbytes))
+            chunks.append(v if v.format == "B" and v.ndim == 1 else v.cast("B"))
+        else:
+            chunks.append(umsgpack.packb(v))
 
 
 def pack(msgs: List[MessageBase]) -> bytes:
-    send_msgs: List[Union[int, dict]] = []
+    chunks: List[Union[bytes, bytearray, memoryview]] = [_array_header(len(msgs) * 2)]
     for m in msgs:
-        send_msgs.append(m.kind)
-        send_msgs.append(m.msg)
-    return umsgpack.packb(send_msgs)
+        chunks.append(umsgpack.packb(m.kind))
+        _pack_msg(m.msg, chunks, m.float_array_keys, m.component_float_array_keys)
+    return b"".join(chunks)
+
+
+def _unpack_len(fp: io.BytesIO, fix: int, b16: int, b32: int) -> Optional[int]:
+    """arrayまたはmapのヘッダーを読み要素数を返す、それ以外の型ならNone"""
+    h = fp.read(1)[0]
+    if fix <= h < fix + 16:
+        return h - fix
+    if h == b16:
+        return struct.unpack(">H", fp.read(2))[0]
+    if h == b32:
+        return struct.unpack(">I", fp.read(4))[0]
+    return None
+
+
+def _unpack_obj(fp: io.BytesIO):
+    """よく使われる短い文字列と正の整数だけは直接読み、それ以外はumsgpackで読む"""
+    h = fp.read(1)[0]
+    if h < 0x80:
+        return h
+    if 0xA0 <= h < 0xC0:
+        return fp.read(h - 0xA0).decode("utf-8")
+    fp.seek(-1, io.SEEK_CUR)
+    return umsgpack.unpack(fp, strict_map_key=False)
+
+
+def _unpack_float_array(fp: io.BytesIO, packed: bytes) -> "Optional[array.array]":
+    """float64のみからなるarrayであれば要素ごとのfloatオブジェクトを作らずに
+    array('d')として読み込む
+
+    (ver3.2〜) float32のみからなるarrayはarray('f')として読み込む
+
+    それ以外の場合は読み込み位置を戻してNoneを返す
+    """
+    pos = fp.tell()
+    n = _unpack_len(fp, 0x90, 0xDC, 0xDD)
+    begin = fp.tell()
+    h = packed[begin] if n and begin < len(packed) else None
+    if h == 0xCA:
+        size, typecode = 4, "f"
+    elif h == 0xCB:
+        size, typecode = 8, "d"
+    else:
+        fp.seek(pos)
+        return None
+    src = packed[begin : begin + (size + 1) * n]
+    if len(src) != (size + 1) * n or src[0 :: size + 1] != bytes([h]) * n:
+        fp.seek(pos)
+        return None
+    raw = bytearray(size * n)
+    for j in range(size):
+        raw[j::size] = src[1 + j :: size + 1]
+    a = array.array(typecode)
+    a.frombytes(raw)
+    if sys.byteorder == "little":
+        a.byteswap()
+    fp.seek(begin + (size + 1) * n)
+    return a
+
+
+def _unpack_bin(fp: io.BytesIO, packed: bytes) -> Optional[memoryview]:
+    """binであればコピーせずにpackedの一部を参照するmemoryviewとして読み込む
+
+    それ以外の場合は読み込み位置を戻してNoneを返す
+    """
+    pos = fp.tell()
+    h = fp.read(1)[0]
+    if h == 0xC4:
+        n = fp.read(1)[0]
+    elif h == 0xC5:
+        n = struct.unpack(">H", fp.read(2))[0]
+    elif h == 0xC6:
+        n = struct.unpack(">I", fp.read(4))[0]
+    else:
+        fp.seek(pos)
+        return None
+    begin = fp.tell()
+    fp.seek(begin + n)
+    return memoryview(packed)[begin : begin + n]
+
+
+def _unpack_components(
+    fp: io.BytesIO, packed: bytes, float_array_keys: Tuple[str, ...]
+) -> Optional[dict]:
+    """要素ごとのmapを読み込む、mapでなければ読み込み位置を戻してNoneを返す"""
+    pos = fp.tell()
+    n = _unpack_len(fp, 0x80, 0xDE, 0xDF)
+    if n is None:
+        fp.seek(pos)
+        return None
+    components = {}
+    for _ in range(n):
+        i = _unpack_obj(fp)
+        components[i] = _unpack_msg(fp, packed, float_array_keys)
+    return components
+
+
+def _unpack_msg(
+    fp: io.BytesIO,
+    packed: bytes,
+    float_array_keys: Tuple[str, ...] = (),
+    bin_keys: Tuple[str, ...] = (),
+    component_float_array_keys: Tuple[str, ...] = (),
+) -> dict:
+    if (
+        len(float_array_keys) == 0
+        and len(bin_keys) == 0
+        and len(component_float_array_keys) == 0
+    ):
+        return umsgpack.unpack(fp, strict_map_key=False)
+    pos = fp.tell()
+    n = _unpack_len(fp, 0x80, 0xDE, 0xDF)
+    if n is None:
+        fp.seek(pos)
+        return umsgpack.unpack(fp, strict_map_key=False)
+    msg = {}
+    for _ in range(n):
+        k = _unpack_obj(fp)
+        v = None
+        if k in float_array_keys:
+            v = _unpack_float_array(fp, packed)
+        elif k in bin_keys:
+            v = _unpack_bin(fp, packed)
+        elif k == "d" and component_float_array_keys:
+            v = _unpack_components(fp, packed, component_float_array_keys)
+        if v is None:
+            v = _unpack_obj(fp)
+        msg[k] = v
+    return msg
 
 
 def unpack(packed: bytes) -> List[MessageBase]:
-    unpack_obj = umsgpack.unpackb(packed, strict_map_key=False)
-    assert len(unpack_obj) % 2 == 0
+    fp = io.BytesIO(packed)
+    n = _unpack_len(fp, 0x90, 0xDC, 0xDD)
+    assert n is not None and n % 2 == 0
     msg_ret = []
-    for i in range(0, len(unpack_obj), 2):
-        kind = unpack_obj[i]
-        msg = unpack_obj[i + 1]
+    for i in range(0, n, 2):
+        kind = umsgpack.unpack(fp, strict_map_key=False)
         assert isinstance(kind, int)
+        C = _message_classes_recv_kind.get(kind)
+        if C is not None:
+            msg = _unpack_msg(
+                fp,
+                packed,
+                C.float_array_keys,
+                C.bin_keys,
+                C.component_float_array_keys,
+            )
+        else:
+            msg = _unpack_msg(fp, packed)
         assert isinstance(msg, dict)
-        for C in message_classes_recv:
-            if kind == C.kind_def:
-                msg_ret.append(C(msg))
+        if C is not None:
+            msg_ret.append(C(msg))
     return msg_ret
@@ -15,6 +15,7 @@ class TemporalComponent:
     _data: "Optional[webcface.client_data.ClientData]"
     _id: Optional[str]
     _on_click_func_tmp: Optional[Callable]
+    _on_click_key: Optional[object]
     _bind_tmp: "Optional[webcface.text.InputRef]"
     _init: Optional[Union[float, bool, str]]
 
@@ -172,6 +173,7 @@ class TemporalComponent:
 
         self._data = None
         self._on_click_func_tmp = None
+        self._on_click_key = None
         if init is None:
             self._init = None
         elif isinstance(init, bool):
@@ -215,6 +217,14 @@ class TemporalComponent:
             self._on_click_func = on_click._base
         elif callable(on_click):
             self._on_click_func_tmp = on_click
+            # on_changeやbindから作ったon_clickは毎回新しい関数になるので、
+            # 元のon_changeやbindが同じかどうかで登録済みの関数を使いまわせるか判断する
+            if on_change is not None:
+                self._on_click_key = ("on_change", on_change)
+            elif bind is not None:
+                self._on_click_key = ("bind", bind)
+            else:
+                self._on_click_key = ("on_click", on_click)
         if (
             isinstance(on_click, webcface.func.Func)
             or isinstance(on_click, webcface.func_listener.FuncListener)
@@ -252,7 +262,18 @@ class TemporalComponent:
                 webcface.field.Field(data, data.self_member_name),
                 ".." + data_type + field_name + "." + self._id,
             )
-            on_click.set(self._on_click_func_tmp)
+            func_key = data.func_tmp_keys.get(on_click._base._field)
+            if (
+                func_key is None
+                or func_key != self._on_click_key
+                or data.func_store.get_recv(
+                    data.self_member_name, on_click._base._field
+                )
+                is None
+            ):
+                # 前回のsync時と同じ関数であればFuncInfoを作り直さない
+                on_click.set(self._on_click_func_tmp)
+                data.func_tmp_keys[on_click._base._field] = self._on_click_key
             self._on_click_func = on_click._base
         if self._bind_tmp is not None:
             text_ref = webcface.text.Variant(
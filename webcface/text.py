@@ -4,6 +4,15 @@ import webcface.member
 from webcface.typing import convertible_to_float
 
 
+def to_text_data(data: Union[SupportsFloat, bool, str]) -> Union[float, bool, str]:
+    """Variant.set() に渡された値をtext_storeに保持する形式に変換する"""
+    if isinstance(data, bool):
+        return data
+    if convertible_to_float(data):
+        return float(data)
+    return str(data)
+
+
 class Variant:
     _base: "webcface.field.Field"
 
@@ -58,6 +67,12 @@ class Variant:
                 ]
             )
 
+    def unrequest(self) -> None:
+        """値の受信リクエストを解除する (ver3.2〜)"""
+        self._base._data_check().text_store.unset_req(
+            self._base._member, self._base._field
+        )
+
     def try_get(self) -> Optional[Union[float, bool, str]]:
         """データまたはNoneを返す、まだリクエストされてなければ自動でリクエストされる"""
         self.request()
@@ -77,8 +92,8 @@ class Variant:
         try_get() などとは違って、実際のデータを受信しない。
         リクエストもしない。
         """
-        return self._base._field in self._base._data_check().text_store.get_entry(
-            self._base._member
+        return self._base._data_check().text_store.has_entry(
+            self._base._member, self._base._field
         )
 
     def __str__(self) -> str:
@@ -92,13 +107,9 @@ class Variant:
 
     def set(self, data: Union[SupportsFloat, bool, str]) -> "Variant":
         """値をセットする"""
-        if isinstance(data, bool):
-            data2: Union[float, bool, str] = data
-        elif convertible_to_float(data):
-            data2 = float(data)
-        else:
-            data2 = str(data)
-        self._base._set_check().text_store.set_send(self._base._field, data2)
+        self._base._set_check().text_store.set_send(
+            self._base._field, to_text_data(data)
+        )
         on_change = (
             self._base._data_check()
             .on_text_change.get(self._base._member, {})
@@ -1,9 +1,63 @@
 from typing import Optional, List, Callable, SupportsFloat, Union
+import array
+import datetime
 import webcface.field
 import webcface.member
 import webcface.message
+import webcface.value_history
 from webcface.typing import convertible_to_float
 
+try:
+    import numpy
+except ModuleNotFoundError:
+    pass
+
+
+def to_float_array(data) -> "Optional[array.array]":
+    """numpy配列などバッファプロトコルに対応したオブジェクトをarray('d')に変換する
+
+    float64の連続したバッファであれば要素ごとのfloatオブジェクトを作らずにコピーする。
+    バッファプロトコルに対応していない場合はNoneを返す。
+    """
+    if isinstance(data, (str, bytes, bytearray)):
+        return None
+    try:
+        mv = memoryview(data)
+    except TypeError:
+        return None
+    a = array.array("d")
+    if mv.format == "d" and mv.c_contiguous:
+        a.frombytes(mv.cast("B"))
+        return a
+    try:
+        import numpy
+
+        a.frombytes(
+            memoryview(numpy.ascontiguousarray(mv, dtype=numpy.float64)).cast("B")
+        )
+    except ModuleNotFoundError:
+        if mv.ndim != 1:
+            raise TypeError("multi-dimensional buffer requires numpy")
+        a.extend(float(v) for v in mv.tolist())
+    return a
+
+
+def to_value_data(
+    data: "Union[List[SupportsFloat], SupportsFloat, numpy.ndarray]",
+) -> "Union[List[float], array.array]":
+    """Value.set() に渡された値をvalue_storeに保持する形式に変換する
+
+    変換できない場合はTypeError
+    """
+    if isinstance(data, list):
+        return [float(v) for v in data]
+    if convertible_to_float(data) and getattr(data, "ndim", 0) == 0:
+        return [float(data)]
+    a = to_float_array(data)
+    if a is None:
+        raise TypeError("unsupported data type for value.set(): " + str(data))
+    return a
+
 
 class Value:
     _base: "webcface.field.Field"
@@ -49,6 +103,27 @@ class Value:
         """「(thisの名前).(追加の名前)」を新しい名前とするValue"""
         return Value(self._base.child(field))
 
+    def history(self, maxlen: int = 1000) -> "webcface.value_history.ValueHistory":
+        """受信した値の履歴を返す (ver3.2〜)
+
+        * 初めて呼び出したときにmaxlen個分のバッファを確保し、それ以降に受信した値が記録される。
+        * 以前と異なるmaxlenを指定した場合はバッファを確保しなおし、それまでの履歴は破棄される。
+        * 自分自身のValueの場合はset()した値が記録される。
+        * numpyが必要。
+        * まだリクエストされてなければ自動でリクエストされる
+
+        詳細は ValueHistory を参照
+        """
+        self.request()
+        data = self._base._data_check()
+        h = data.value_history.get(self._base._member, {}).get(self._base._field)
+        if h is None or h.maxlen != maxlen:
+            h = webcface.value_history.ValueHistory(maxlen)
+            if self._base._member not in data.value_history:
+                data.value_history[self._base._member] = {}
+            data.value_history[self._base._member][self._base._field] = h
+        return h
+
     def request(self) -> None:
         """値の受信をリクエストする"""
         req = self._base._data_check().value_store.add_req(
@@ -63,13 +138,55 @@ class Value:
                 ]
             )
 
-    def try_get_vec(self) -> Optional[List[float]]:
-        """値をlistまたはNoneで返す、まだリクエストされてなければ自動でリクエストされる"""
+    def _try_get_raw(self) -> "Optional[Union[List[float], array.array]]":
         self.request()
         return self._base._data_check().value_store.get_recv(
             self._base._member, self._base._field
         )
 
+    def try_get_vec(self) -> Optional[List[float]]:
+        """値をlistまたはNoneで返す、まだリクエストされてなければ自動でリクエストされる"""
+        v = self._try_get_raw()
+        if isinstance(v, array.array):
+            return v.tolist()
+        return v
+
+    def try_get_array(self) -> "Optional[numpy.ndarray]":
+        """値をnumpy配列またはNoneで返す、まだリクエストされてなければ自動でリクエストされる
+        (ver3.2〜)
+
+        * numpy配列をset()した値の場合、コピーせずに内部のデータを参照するビューを返す。
+        * 返される配列は書き込み不可。
+        """
+        import numpy
+
+        v = self._try_get_raw()
+        if v is None:
+            return None
+        if isinstance(v, array.array):
+            a = numpy.frombuffer(v, dtype=numpy.float64)
+        else:
+            a = numpy.array(v, dtype=numpy.float64)
+        a.flags.writeable = False
+        return a
+
+    def get_array(self) -> "numpy.ndarray":
+        """値をnumpy配列で返す、まだリクエストされてなければ自動でリクエストされる
+        (ver3.2〜)
+
+        詳細は try_get_array() を参照
+        """
+        import numpy
+
+        v = self.try_get_array()
+        return v if v is not None else numpy.zeros(0, dtype=numpy.float64)
+
+    def unrequest(self) -> None:
+        """値の受信リクエストを解除する (ver3.2〜)"""
+        self._base._data_check().value_store.unset_req(
+            self._base._member, self._base._field
+        )
+
     def try_get(self) -> Optional[float]:
         """値をfloatまたはNoneで返す、まだリクエストされてなければ自動でリクエストされる"""
         v = self.try_get_vec()
@@ -92,8 +209,8 @@ class Value:
         try_get() などとは違って、実際のデータを受信しない。
         リクエストもしない。
         """
-        return self._base._field in self._base._data_check().value_store.get_entry(
-            self._base._member
+        return self._base._data_check().value_store.has_entry(
+            self._base._member, self._base._field
         )
 
     def __str__(self) -> str:
@@ -103,19 +220,29 @@ class Value:
         """
         return f'<member("{self.member.name}").value("{self.name}") = {self.try_get_vec()}>'
 
-    def set(self, data: Union[List[SupportsFloat], SupportsFloat]) -> "Value":
-        """値をセットする"""
-        self._base._set_check()
-        if convertible_to_float(data):
-            self._base._set_check().value_store.set_send(
-                self._base._field, [float(data)]
-            )
-        elif isinstance(data, list):
-            self._base._set_check().value_store.set_send(
-                self._base._field, [float(v) for v in data]
+    def set(
+        self, data: "Union[List[SupportsFloat], SupportsFloat, numpy.ndarray]"
+    ) -> "Value":
+        """値をセットする
+
+        (ver3.2〜) numpy配列や array('d') などバッファプロトコルに対応したオブジェクトも渡すことができ、
+        その場合は要素ごとにfloatに変換せず array('d') としてそのまま保持・送信される。
+        """
+        self._base._set_check().value_store.set_send(
+            self._base._field, to_value_data(data)
+        )
+        history = (
+            self._base._data_check()
+            .value_history.get(self._base._member, {})
+            .get(self._base._field)
+        )
+        if history is not None:
+            history.push(
+                datetime.datetime.now(),
+                self._base._data_check().value_store.get_recv(
+                    self._base._member, self._base._field
+                ),
             )
-        else:
-            raise TypeError("unsupported data type for value.set(): " + str(data))
         on_change = (
             self._base._data_check()
             .on_value_change.get(self._base._member, {})
@@ -0,0 +1,150 @@
+from typing import Optional, Tuple, Union, Sequence, SupportsFloat
+import datetime
+import threading
+
+try:
+    import numpy
+except ModuleNotFoundError:
+    pass
+
+
+def _to_timestamp(t: Union[datetime.datetime, SupportsFloat]) -> float:
+    if isinstance(t, datetime.datetime):
+        return t.timestamp()
+    return float(t)
+
+
+class ValueHistory:
+    """Valueの値の時系列データ (ver3.2〜)
+
+    このコンストラクタを直接使わず、 Value.history() を使うこと
+
+    * 確保済みのnumpy配列をリングバッファとして使い、
+      値を受信するたびにコールバックを経由せず直接記録される。
+    * 時刻はその値を送信したメンバーのsync時刻 (Member.sync_time) で、
+      unix時間 (秒) のfloatとして扱う。
+    * 各アクセサは古い順に並んだ (時刻の配列, 値の配列) のコピーを返す。
+      値の配列は (サンプル数, 値の要素数) の2次元配列になる。
+    * 値の要素数が変わった場合はそれまでの履歴は破棄される。
+    """
+
+    _maxlen: int
+    _times: "numpy.ndarray"
+    _values: "Optional[numpy.ndarray]"
+    _count: int
+    _lock: threading.Lock
+
+    def __init__(self, maxlen: int) -> None:
+        import numpy
+
+        if maxlen <= 0:
+            raise ValueError(f"Invalid history length {maxlen}")
+        self._maxlen = maxlen
+        self._times = numpy.zeros(maxlen, dtype=numpy.float64)
+        self._values = None
+        self._count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def maxlen(self) -> int:
+        """保持するサンプル数の上限"""
+        return self._maxlen
+
+    def __len__(self) -> int:
+        """保持しているサンプル数"""
+        return min(self._count, self._maxlen)
+
+    def push(
+        self,
+        time: Union[datetime.datetime, SupportsFloat],
+        data: Sequence[SupportsFloat],
+    ) -> None:
+        """値を1つ記録する"""
+        import numpy
+
+        v = numpy.asarray(data, dtype=numpy.float64)
+        with self._lock:
+            if self._values is None or self._values.shape[1] != len(v):
+                self._values = numpy.zeros((self._maxlen, len(v)), dtype=numpy.float64)
+                self._count = 0
+            i = self._count % self._maxlen
+            self._times[i] = _to_timestamp(time)
+            self._values[i, :] = v
+            self._count += 1
+
+    def clear(self) -> None:
+        """履歴を空にする (バッファは解放しない)"""
+        with self._lock:
+            self._count = 0
+
+    def _ordered(self) -> "Tuple[numpy.ndarray, numpy.ndarray]":
+        import numpy
+
+        with self._lock:
+            if self._values is None:
+                return (
+                    numpy.zeros(0, dtype=numpy.float64),
+                    numpy.zeros((0, 0), dtype=numpy.float64),
+                )
+            if self._count <= self._maxlen:
+                return (
+                    self._times[: self._count].copy(),
+                    self._values[: self._count].copy(),
+                )
+            i = self._count % self._maxlen
+            return (
+                numpy.concatenate((self._times[i:], self._times[:i])),
+                numpy.concatenate((self._values[i:], self._values[:i])),
+            )
+
+    def get(self) -> "Tuple[numpy.ndarray, numpy.ndarray]":
+        """保持しているすべてのサンプルを返す"""
+        return self._ordered()
+
+    def last(self, n: int) -> "Tuple[numpy.ndarray, numpy.ndarray]":
+        """最新のn個のサンプルを返す"""
+        times, values = self._ordered()
+        if n <= 0:
+            return times[:0], values[:0]
+        return times[-n:], values[-n:]
+
+    def range(
+        self,
+        start: Optional[Union[datetime.datetime, SupportsFloat]] = None,
+        end: Optional[Union[datetime.datetime, SupportsFloat]] = None,
+    ) -> "Tuple[numpy.ndarray, numpy.ndarray]":
+        """時刻が start 以上 end 未満のサンプルを返す
+
+        :arg start: 開始時刻 (datetimeまたはunix時間)、Noneの場合最初から
+        :arg end: 終了時刻 (datetimeまたはunix時間)、Noneの場合最後まで
+        """
+        import numpy
+
+        times, values = self._ordered()
+        begin_i = 0
+        end_i = len(times)
+        if start is not None:
+            begin_i = int(numpy.searchsorted(times, _to_timestamp(start), "left"))
+        if end is not None:
+            end_i = int(numpy.searchsorted(times, _to_timestamp(end), "left"))
+        return times[begin_i:end_i], values[begin_i:end_i]
+
+    def resample(
+        self, times: "Union[numpy.ndarray, Sequence[SupportsFloat]]"
+    ) -> "numpy.ndarray":
+        """指定した時刻(unix時間の配列)での値を線形補間して返す
+
+        履歴の範囲外の時刻では最初または最後の値になる。
+
+        :return: (len(times), 値の要素数) の配列
+        """
+        import numpy
+
+        t_src, v_src = self._ordered()
+        t_dst = numpy.asarray(times, dtype=numpy.float64)
+        if len(t_src) == 0:
+            return numpy.zeros((len(t_dst), 0), dtype=numpy.float64)
+        ret = numpy.empty((len(t_dst), v_src.shape[1]), dtype=numpy.float64)
+        for c in range(v_src.shape[1]):
+            ret[:, c] = numpy.interp(t_dst, t_src, v_src[:, c])
+        return ret
@@ -1,4 +1,4 @@
-from typing import Optional, List, Callable, SupportsFloat, Union, Dict
+from typing import Optional, List, Callable, SupportsFloat, Union, Dict, Tuple, Set
 from copy import deepcopy
 import webcface.field
 import webcface.text
@@ -14,11 +14,25 @@ class ViewData:
     tmp_components: "List[webcface.temporal_component.TemporalComponent]"
     components: "Dict[str, webcface.view_base.ViewComponentBase]"
     ids: List[str]
+    fingerprint: Optional[Tuple]
+    base: "Optional[ViewData]"
+    dirty: Optional[Set[str]]
 
     def __init__(self) -> None:
         self.tmp_components = []
         self.components = {}
         self.ids = []
+        self.fingerprint = None
+        self.base = None
+        self.dirty = None
+
+    def make_fingerprint(self) -> Tuple:
+        """ids と全コンポーネントの内容をまとめたtupleを作り fingerprint にセットする"""
+        self.fingerprint = (
+            tuple(self.ids),
+            tuple(self.components[i]._fingerprint() for i in self.ids),
+        )
+        return self.fingerprint
 
 
 class ViewComponent(webcface.view_base.ViewComponentBase):
@@ -237,6 +251,12 @@ class View:
                 ]
             )
 
+    def unrequest(self) -> None:
+        """値の受信リクエストを解除する (ver3.2〜)"""
+        self._base._data_check().view_store.unset_req(
+            self._base._member, self._base._field
+        )
+
     def try_get(self) -> Optional[List[ViewComponent]]:
         """ViewをlistまたはNoneで返す、まだリクエストされてなければ自動でリクエストされる"""
         self.request()
@@ -263,8 +283,8 @@ class View:
         try_get() などとは違って、実際のデータを受信しない。
         リクエストもしない。
         """
-        return self._base._field in self._base._data_check().view_store.get_entry(
-            self._base._member
+        return self._base._data_check().view_store.has_entry(
+            self._base._member, self._base._field
         )
 
     def set(
@@ -315,6 +335,16 @@ class View:
                 c.lock_tmp(data, "v", self._base._field, f"..{c._view_type}.{idx}")
                 self._vdata.components[c.id] = c.to_view()
                 self._vdata.ids.append(c.id)
+            v_prev = data.view_store.get_recv(self._base._member, self._base._field)
+            fingerprint = self._vdata.make_fingerprint()
+            if (
+                v_prev is not None
+                and v_prev is not self._vdata
+                and v_prev.fingerprint == fingerprint
+            ):
+                # 前回と内容が同じなら送信もon_changeもしない
+                self._modified = False
+                return self
             data.view_store.set_send(self._base._field, self._vdata)
             on_change = data.on_view_change.get(self._base._member, {}).get(
                 self._base._field
@@ -324,6 +354,85 @@ class View:
             self._modified = False
         return self
 
+    def update(
+        self,
+        id: str,
+        text: Optional[str] = None,
+        text_color: Optional[int] = None,
+        bg_color: Optional[int] = None,
+        min: Optional[SupportsFloat] = None,
+        max: Optional[SupportsFloat] = None,
+        step: Optional[SupportsFloat] = None,
+        option: Optional[List[Union[SupportsFloat, bool, str]]] = None,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+    ) -> "View":
+        """sync済みのViewの要素1つのプロパティを変更する (ver3.2〜)
+
+        * Viewを作り直さずに、次の Client.sync() でその要素だけが送信される。
+        * Noneを指定したプロパティは変更しない。
+        * on_click, bind などの関数や要素の種類は変更できない。
+
+        :arg id: 変更する要素のid (ViewComponent.id)
+        """
+        data = self._base._set_check()
+        with data.view_store.lock:
+            prev = data.view_store.get_recv(self._base._member, self._base._field)
+            if prev is None or id not in prev.components:
+                raise ValueError(f"View component '{id}' not found")
+            c = prev.components[id]
+            new_data = ViewData()
+            new_data.ids = prev.ids
+            new_data.components = dict(prev.components)
+            new_data.components[id] = webcface.view_base.ViewComponentBase(
+                c._type,
+                c._text if text is None else str(text),
+                c._on_click_func,
+                c._text_ref,
+                c._text_color if text_color is None else text_color,
+                c._bg_color if bg_color is None else bg_color,
+                c._min if min is None else float(min),
+                c._max if max is None else float(max),
+                c._step if step is None else float(step),
+                c._option if option is None else list(option),
+                c._width if width is None else width,
+                c._height if height is None else height,
+            )
+            new_data.make_fingerprint()
+            new_data.tmp_components = prev.tmp_components
+            data.view_store.set_send_dirty(self._base._field, prev, new_data, {id})
+        # 次にsync()したときに変更が元に戻らないよう、addした要素にも反映する
+        tmp_components = list(prev.tmp_components)
+        if self._vdata is not None and self._vdata is not prev:
+            tmp_components.extend(self._vdata.tmp_components)
+        for tc in tmp_components:
+            if tc._id != id:
+                continue
+            if text is not None:
+                tc._text = str(text)
+            if text_color is not None:
+                tc._text_color = text_color
+            if bg_color is not None:
+                tc._bg_color = bg_color
+            if min is not None:
+                tc._min = float(min)
+            if max is not None:
+                tc._max = float(max)
+            if step is not None:
+                tc._step = float(step)
+            if option is not None:
+                tc._option = list(option)
+            if width is not None:
+                tc._width = width
+            if height is not None:
+                tc._height = height
+        on_change = data.on_view_change.get(self._base._member, {}).get(
+            self._base._field
+        )
+        if on_change is not None:
+            on_change(self)
+        return self
+
     def add(
         self,
         *args: Union[
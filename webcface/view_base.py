@@ -1,4 +1,4 @@
-from typing import Optional, List, Union, Dict
+from typing import Optional, List, Union, Dict, Tuple
 from enum import IntEnum
 import webcface.field
 
@@ -46,6 +46,9 @@ class ViewComponentBase:
     _option: List[Union[float, bool, str]]
     _width: int
     _height: int
+    _fp: Optional[Tuple]
+    _fp_hash: int
+    _msg: Optional[dict]
 
     def __init__(
         self,
@@ -74,39 +77,51 @@ class ViewComponentBase:
         self._option = option or []
         self._width = width
         self._height = height
+        self._fp = None
+        self._fp_hash = 0
+        self._msg = None
 
-    def __eq__(self, other) -> bool:
-        return (
-            isinstance(other, ViewComponentBase)
-            and self._type == other._type
-            and self._text == other._text
-            and (
-                (self._on_click_func is None and other._on_click_func is None)
-                or (
-                    self._on_click_func is not None
-                    and other._on_click_func is not None
-                    and self._on_click_func._member == other._on_click_func._member
-                    and self._on_click_func._field == other._on_click_func._field
-                )
-            )
-            and (
-                (self._text_ref is None and other._text_ref is None)
-                or (
-                    self._text_ref is not None
-                    and other._text_ref is not None
-                    and self._text_ref._member == other._text_ref._member
-                    and self._text_ref._field == other._text_ref._field
-                )
+    def _fingerprint(self) -> Tuple:
+        """全プロパティをまとめたtuple (ver3.2〜)
+
+        コンポーネントは作成後に変更されないので、初回に計算したものをキャッシュする。
+        """
+        fp = self._fp
+        if fp is None:
+            fp = (
+                self._type,
+                self._text,
+                (
+                    None
+                    if self._on_click_func is None
+                    else (self._on_click_func._member, self._on_click_func._field)
+                ),
+                (
+                    None
+                    if self._text_ref is None
+                    else (self._text_ref._member, self._text_ref._field)
+                ),
+                self._text_color,
+                self._bg_color,
+                self._min,
+                self._max,
+                self._step,
+                tuple(self._option),
+                self._width,
+                self._height,
             )
-            and self._text_color == other._text_color
-            and self._bg_color == other._bg_color
-            and self._min == other._min
-            and self._max == other._max
-            and self._step == other._step
-            and self._option == other._option
-            and self._width == other._width
-            and self._height == other._height
-        )
+            self._fp_hash = hash(fp)
+            self._fp = fp
+        return fp
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ViewComponentBase):
+            return False
+        if self is other:
+            return True
+        fp = self._fingerprint()
+        fp_other = other._fingerprint()
+        return self._fp_hash == other._fp_hash and fp == fp_other
 
     def __ne__(self, other) -> bool:
         return not self == other